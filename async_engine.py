@@ -0,0 +1,276 @@
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
+import time
+import aiohttp
+from aiohttp_socks import ProxyConnector
+from capture import record_response
+from metrics import REGISTRY, call_with_metrics, observe_fetch, stage_timer, start_metrics
+from rate_limiter import get_limiter
+from snapshot_store import SnapshotStore
+from tick_scheduler import TickScheduler, stagger_offsets
+
+
+class AsyncCollectionEngine:
+    def __init__(self, collectors, interval_seconds=15, request_timeout=10, max_connections=100,
+                 processing_workers=4, stagger_seconds=1.0, analytics_processes=None, queue_size=4,
+                 consolidated_book=None, connections_per_exchange=None, concurrency_caps=None):
+        self.collectors = collectors
+        self.interval_seconds = interval_seconds
+        self.stagger_seconds = stagger_seconds
+        self.schedulers = {}
+        self.request_timeout = aiohttp.ClientTimeout(total=request_timeout)
+        self.max_connections = max_connections
+        # Symbols of one exchange share this many keep-alive connections to its host (EXCHANGE_CONNECTIONS).
+        if connections_per_exchange is None:
+            connections_per_exchange = int(os.getenv("EXCHANGE_CONNECTIONS", "4"))
+        self.connections_per_exchange = connections_per_exchange
+        self.processing_workers = processing_workers
+        # exchange -> how many of its symbols are processed at once; by default one per processing worker,
+        # so a large universe queues on the fixed pool instead of growing it.
+        self.concurrency_caps = concurrency_caps or {}
+        self.semaphores = {}
+        # ANALYTICS_PROCESSES=0 keeps parsing and analytics on the processing threads.
+        if analytics_processes is None:
+            analytics_processes = int(os.getenv("ANALYTICS_PROCESSES", str(os.cpu_count() or 1)))
+        self.analytics_processes = analytics_processes
+        self.queue_size = queue_size
+        self.consolidated_book = consolidated_book
+        self.queues = {}
+        self.stats = {}
+
+    def proxy_url(self, collector):
+        proxies = getattr(collector, 'proxies', None) or {}
+        return proxies.get('https') or proxies.get('http')
+
+    def create_session(self, proxy):
+        if proxy:
+            connector = ProxyConnector.from_url(proxy, limit=self.max_connections,
+                                                limit_per_host=self.connections_per_exchange)
+        else:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.connections_per_exchange)
+        return aiohttp.ClientSession(connector=connector, timeout=self.request_timeout)
+
+    def collector_labels(self, collector):
+        exchange = collector.__class__.__name__.replace('OrderBookCollector', '').lower()
+        symbol = getattr(collector, 'symbols', None) or getattr(collector, 'token', None) or 'all'
+        return exchange, symbol
+
+    async def fetch(self, session, collector):
+        depth_stream = getattr(collector, 'depth_stream', None)
+        if depth_stream is not None:
+            return depth_stream.get_order_book(collector.symbols)
+
+        url = collector.order_book_url()
+        exchange, symbol = self.collector_labels(collector)
+        limiter = get_limiter(exchange)
+        try:
+            # Collectors asking for the same URL in the same tick share one request.
+            body = await limiter.coalesce_async(url, lambda: self.request(session, url, exchange, symbol, limiter))
+            return json.loads(body) if body is not None else None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            print(f"Failed to fetch data from {url}: {e}")
+            return None
+
+    async def request(self, session, url, exchange, symbol, limiter):
+        # A request that would wait for tokens longer than a tick is skipped rather than queued behind the next one.
+        if not await limiter.acquire_async(url, max_wait=self.interval_seconds):
+            print(f"{exchange}: rate limit reached, skipping {url} this tick.")
+            return None
+
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                body = await response.read()
+                limiter.feedback(response.status, response.headers)
+                record_response(url, response.status, body)
+                observe_fetch(exchange, symbol, started, len(body), response.status)
+                response.raise_for_status()
+                return body
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            observe_fetch(exchange, symbol, started)
+            raise
+
+    async def analyze(self, collector, args, executor, pool):
+        loop = asyncio.get_running_loop()
+        if pool is None:
+            return await loop.run_in_executor(executor, collector.analyze, *args)
+        result, metrics = await loop.run_in_executor(pool, call_with_metrics, collector.analyze, *args)
+        REGISTRY.merge(metrics)
+        return result
+
+    async def process(self, collector, now, data, executor, pool):
+        # prepare/complete touch collector state and run on threads; analyze is pure and may run in a process.
+        exchange = self.collector_labels(collector)[0]
+        semaphore = self.semaphores.get(exchange)
+        if semaphore is None:
+            semaphore = self.semaphores[exchange] = asyncio.Semaphore(
+                self.concurrency_caps.get(exchange, self.processing_workers))
+        async with semaphore:
+            await self.process_stages(collector, exchange, now, data, executor, pool)
+
+    async def process_stages(self, collector, exchange, now, data, executor, pool):
+        loop = asyncio.get_running_loop()
+        try:
+            with stage_timer(exchange, 'prepare'):
+                args = await loop.run_in_executor(executor, collector.prepare, now, data)
+            with stage_timer(exchange, 'analyze'):
+                result = await self.analyze(collector, args, executor, pool)
+            with stage_timer(exchange, 'complete'):
+                await loop.run_in_executor(executor, collector.complete, now, result)
+        except Exception as e:
+            print(f"An error occurred for {collector.order_book_url()}: {e}")
+
+    def collector_groups(self):
+        groups = {}
+        for collector in self.collectors:
+            groups.setdefault(collector.__class__.__name__, []).append(collector)
+        return groups
+
+    async def run_tick(self, name, collectors, now, sessions):
+        results = await asyncio.gather(*[
+            self.fetch(sessions[self.proxy_url(collector)], collector) for collector in collectors
+        ])
+        batch = [(collector, data) for collector, data in zip(collectors, results) if data is not None]
+
+        # Fetchers never wait for analytics: when the queue is full the tick is dropped and counted.
+        queue, stats = self.queues[name], self.stats[name]
+        if queue.full():
+            stats['dropped'] += 1
+            print(f"{name}: analytics queue full, dropped tick {now.isoformat()} ({stats['dropped']} dropped so far).")
+            return
+        queue.put_nowait((now, time.monotonic(), batch))
+        stats['enqueued'] += 1
+        stats['max_queue_depth'] = max(stats['max_queue_depth'], queue.qsize())
+
+    async def run_group(self, name, collectors, scheduler, sessions):
+        while True:
+            now = await scheduler.wait_async()
+            await self.run_tick(name, collectors, now, sessions)
+
+    async def analyze_group(self, name, executor, pool):
+        # One consumer per group keeps each collector's ticks in order.
+        queue, stats = self.queues[name], self.stats[name]
+        while True:
+            now, fetched_at, batch = await queue.get()
+            started = time.monotonic()
+            await asyncio.gather(*[
+                self.process(collector, now, data, executor, pool) for collector, data in batch
+            ])
+            finished = time.monotonic()
+            stats['processed'] += 1
+            stats['processing_seconds'] += finished - started
+            stats['last_lag_seconds'] = finished - fetched_at
+            queue.task_done()
+
+    async def run_consolidation(self, scheduler, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = await scheduler.wait_async()
+            try:
+                await loop.run_in_executor(executor, self.consolidated_book.run_iteration, now)
+            except Exception as e:
+                print(f"An error occurred while consolidating order books: {e}")
+
+    def pipeline_stats(self):
+        return {
+            name: dict(stats, queue_depth=self.queues[name].qsize())
+            for name, stats in self.stats.items()
+        }
+
+    def update_gauges(self, registry):
+        for name, stats in self.pipeline_stats().items():
+            registry.gauge('orderbook_queue_depth', 'Ticks waiting for analytics.').set(stats['queue_depth'], group=name)
+            registry.gauge('orderbook_ticks_dropped', 'Ticks dropped because the analytics queue was full.').set(
+                stats['dropped'], group=name)
+            registry.gauge('orderbook_ticks_processed', 'Ticks that completed analytics.').set(
+                stats['processed'], group=name)
+            registry.gauge('orderbook_pipeline_lag_seconds', 'Fetch-to-stored delay of the latest tick.').set(
+                stats['last_lag_seconds'], group=name)
+
+        # Memory held by every snapshot store and rolling statistics window, per collector.
+        for collector in self.collectors:
+            exchange, symbol = self.collector_labels(collector)
+            for attribute, value in vars(collector).items():
+                if isinstance(value, SnapshotStore):
+                    usage = value.memory_usage()
+                    labels = {'exchange': exchange, 'symbol': symbol, 'store': attribute}
+                    registry.gauge('orderbook_store_rows', 'Rows held in memory by a snapshot store.').set(
+                        usage['rows'], **labels)
+                    registry.gauge('orderbook_store_bytes', 'Bytes allocated by a snapshot store.').set(
+                        usage['bytes_allocated'], **labels)
+            rolling_stats = getattr(collector, 'rolling_stats', None)
+            if rolling_stats is not None:
+                registry.gauge('orderbook_rolling_stats_bytes', 'Bytes held by rolling statistics.').set(
+                    rolling_stats.memory_usage(), exchange=exchange, symbol=symbol)
+
+    async def run(self):
+        start_metrics()
+        REGISTRY.register_callback(self.update_gauges)
+        for collector in self.collectors:
+            collector.restore()
+        if self.consolidated_book is not None:
+            self.consolidated_book.restore()
+            for collector in self.collectors:
+                collector.consolidated_book = self.consolidated_book
+
+        sessions = {}
+        for collector in self.collectors:
+            proxy = self.proxy_url(collector)
+            if proxy not in sessions:
+                sessions[proxy] = self.create_session(proxy)
+
+        streams = []
+        for collector in self.collectors:
+            depth_stream = getattr(collector, 'depth_stream', None)
+            if depth_stream is not None and not depth_stream.running and depth_stream not in streams:
+                streams.append(depth_stream)
+        stream_tasks = [asyncio.create_task(depth_stream.run()) for depth_stream in streams]
+
+        executor = ThreadPoolExecutor(max_workers=self.processing_workers)
+        pool = None
+        if self.analytics_processes > 0:
+            pool = ProcessPoolExecutor(max_workers=self.analytics_processes,
+                                       mp_context=multiprocessing.get_context('spawn'))
+        groups = self.collector_groups()
+        offsets = stagger_offsets(len(groups), self.stagger_seconds)
+        self.schedulers = {
+            name: TickScheduler(self.interval_seconds, offset, name=name)
+            for name, offset in zip(groups, offsets)
+        }
+
+        for name in groups:
+            self.queues[name] = asyncio.Queue(maxsize=self.queue_size)
+            self.stats[name] = {'enqueued': 0, 'processed': 0, 'dropped': 0, 'max_queue_depth': 0,
+                                'processing_seconds': 0.0, 'last_lag_seconds': 0.0}
+
+        # The consolidated book is emitted half a tick after the fetches, once the latest books are in.
+        consolidation = []
+        if self.consolidated_book is not None:
+            self.schedulers['consolidated'] = TickScheduler(self.interval_seconds, self.interval_seconds / 2,
+                                                            name='consolidated')
+            consolidation.append(self.run_consolidation(self.schedulers['consolidated'], executor))
+
+        try:
+            await asyncio.gather(*[
+                self.run_group(name, collectors, self.schedulers[name], sessions)
+                for name, collectors in groups.items()
+            ] + [
+                self.analyze_group(name, executor, pool) for name in groups
+            ] + consolidation)
+        finally:
+            for task in stream_tasks:
+                task.cancel()
+            for session in sessions.values():
+                await session.close()
+            executor.shutdown(wait=False)
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            print("Data collection interrupted by user.")
@@ -0,0 +1,181 @@
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from capture import capture_files, read_capture
+from delta_codec import DeltaDecoder, DeltaEncoder
+from storage import arrow_table
+
+
+DEPTHS = [20, 100, 1000]
+TICK_SIZE = 0.01
+START_MS = 1735603200000
+
+
+def simulated_books(depth, snapshots, interval_ms=15_000, seed=0):
+    # A BTCUSDT-like book sampled every interval: the mid drifts a few ticks, about a fifth of the
+    # resting levels change size and a few are cancelled or added, the rest stay where they are.
+    rng = np.random.default_rng(seed)
+    mid = 95_000.0 / TICK_SIZE
+    grid = np.arange(1, depth * 4)
+    bids = {int(mid) - int(step): round(float(rng.lognormal(-1, 1.5)) + 1e-5, 5) for step in grid[:depth * 2]}
+    asks = {int(mid) + int(step): round(float(rng.lognormal(-1, 1.5)) + 1e-5, 5) for step in grid[:depth * 2]}
+
+    for index in range(snapshots):
+        mid += rng.normal(0, 3)
+        for side, is_bid in ((bids, True), (asks, False)):
+            for price in [price for price in side if (price >= mid) == is_bid]:
+                del side[price]
+            prices = list(side)
+            for price in rng.choice(prices, size=len(prices) // 5, replace=False):
+                side[int(price)] = round(float(rng.lognormal(-1, 1.5)) + 1e-5, 5)
+            for price in rng.choice(prices, size=max(1, len(prices) // 50), replace=False):
+                side.pop(int(price), None)
+            while len(side) < depth * 2:
+                offset = int(rng.integers(1, depth * 3))
+                side[int(mid) - offset if is_bid else int(mid) + offset + 1] = round(
+                    float(rng.lognormal(-1, 1.5)) + 1e-5, 5)
+
+        bid_ticks = sorted(bids, reverse=True)[:depth]
+        ask_ticks = sorted(asks)[:depth]
+        yield (START_MS + index * interval_ms,
+               np.round(np.array(bid_ticks) * TICK_SIZE, 2), np.array([bids[tick] for tick in bid_ticks]),
+               np.round(np.array(ask_ticks) * TICK_SIZE, 2), np.array([asks[tick] for tick in ask_ticks]))
+
+
+def captured_books(directory):
+    # Binance depth responses recorded with CAPTURE_DIR, grouped by symbol.
+    books = {}
+    for record in read_capture(capture_files(directory)):
+        parts = urlsplit(record['url'])
+        if not parts.path.endswith('/api/v3/depth') or record['status'] != 200:
+            continue
+        payload = json.loads(record['body'])
+        symbol = dict(parse_qsl(parts.query)).get('symbol', 'unknown')
+        books.setdefault(symbol, []).append((
+            int(record['received_at'] * 1000),
+            np.array([float(level[0]) for level in payload['bids']]),
+            np.array([float(level[1]) for level in payload['bids']]),
+            np.array([float(level[0]) for level in payload['asks']]),
+            np.array([float(level[1]) for level in payload['asks']]),
+        ))
+    return books
+
+
+def level_frame(books, item):
+    # The frame collectors write per tick: ask and bid level i on one row plus the per-snapshot columns.
+    frames = []
+    for timestamp, bid_prices, bid_volumes, ask_prices, ask_volumes in books:
+        levels = max(len(bid_prices), len(ask_prices))
+        padded = [np.concatenate((values, np.full(levels - len(values), np.nan)))
+                  for values in (ask_prices, ask_volumes, bid_prices, bid_volumes)]
+        seconds = timestamp / 1000
+        frames.append(pd.DataFrame({
+            'Item': item,
+            'Timestamp': seconds,
+            'DateTime': pd.Timestamp(seconds, unit='s').strftime('%Y-%m-%dT%H:%M:%S.%f'),
+            'Date': pd.Timestamp(seconds, unit='s').strftime('%Y-%m-%d'),
+            'Ask_Price': padded[0],
+            'Ask_Volume': padded[1],
+            'Bid_Price': padded[2],
+            'Bid_Volume': padded[3],
+            'Total_Ask_Volume': ask_volumes.sum(),
+            'Total_Bid_Volume': bid_volumes.sum(),
+            'Best_Bid_Price': bid_prices[0],
+            'Best_Ask_Price': ask_prices[0],
+            'Spread': ask_prices[0] - bid_prices[0],
+            'Reference_Price': np.median(np.concatenate((ask_prices, bid_prices))),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def measure(name, books, keyframe_interval, work_dir):
+    frame = level_frame(books, name)
+    csv_bytes = len(frame.to_csv(index=False).encode())
+    parquet = io.BytesIO()
+    pq.write_table(arrow_table(frame), parquet, compression='zstd')
+
+    path = os.path.join(work_dir, f"{name}.obd")
+    started = time.perf_counter()
+    encoder = DeltaEncoder(path, keyframe_interval)
+    for book in books:
+        encoder.append(*book)
+    encoder.close()
+    encode_seconds = time.perf_counter() - started
+
+    decoder = DeltaDecoder(path)
+    started = time.perf_counter()
+    for snapshot, book in zip(decoder.snapshots(), books):
+        for key, values in zip(('bid_prices', 'bid_volumes', 'ask_prices', 'ask_volumes'), book[1:]):
+            if not np.array_equal(snapshot[key], values):
+                raise AssertionError(f"{name}: snapshot {snapshot['timestamp']} decoded {key} differently")
+    decode_seconds = time.perf_counter() - started
+
+    # Random seeks pay for at most one block replay each.
+    rng = np.random.default_rng(1)
+    targets = rng.integers(books[0][0], books[-1][0] + 1, size=200)
+    started = time.perf_counter()
+    for target in targets:
+        DeltaDecoder(path).snapshot_at(int(target))
+    seek_ms = (time.perf_counter() - started) * 1000 / len(targets)
+
+    delta_bytes = os.path.getsize(path)
+    return {
+        'book': name,
+        'snapshots': len(books),
+        'rows': len(frame),
+        'csv_bytes': csv_bytes,
+        'parquet_bytes': parquet.getbuffer().nbytes,
+        'delta_bytes': delta_bytes,
+        'ratio_vs_csv': csv_bytes / delta_bytes,
+        'ratio_vs_parquet': parquet.getbuffer().nbytes / delta_bytes,
+        'encode_us_per_snapshot': encode_seconds * 1e6 / len(books),
+        'decode_us_per_snapshot': decode_seconds * 1e6 / len(books),
+        'seek_ms': seek_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare delta-encoded order book storage with CSV and zstd Parquet of the same level rows "
+                    "and check that every snapshot decodes back exactly.")
+    parser.add_argument('--snapshots', type=int, default=960, help="Snapshots per simulated book (960 = 4h at 15s).")
+    parser.add_argument('--depths', type=int, nargs='+', default=DEPTHS)
+    parser.add_argument('--keyframe-interval', type=int, default=240)
+    parser.add_argument('--capture', help="CAPTURE_DIR with recorded Binance depth responses to measure as well.")
+    parser.add_argument('--output', default='delta_benchmark.json')
+    args = parser.parse_args()
+
+    books = {f"simulated-{depth}": list(simulated_books(depth, args.snapshots)) for depth in args.depths}
+    if args.capture:
+        books.update({f"captured-{symbol}": snapshots for symbol, snapshots in captured_books(args.capture).items()})
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = [measure(name, snapshots, args.keyframe_interval, work_dir) for name, snapshots in books.items()]
+
+    with open(args.output, 'w') as target:
+        json.dump({'keyframe_interval': args.keyframe_interval, 'results': results}, target, indent=2)
+
+    print(f"{'book':>22} {'snaps':>6} {'csv KB':>9} {'parquet KB':>11} {'delta KB':>9} {'vs csv':>7} "
+          f"{'vs pq':>6} {'enc us':>7} {'dec us':>7} {'seek ms':>8}")
+    for result in results:
+        print(f"{result['book']:>22} {result['snapshots']:>6} {result['csv_bytes'] / 1024:>9.1f} "
+              f"{result['parquet_bytes'] / 1024:>11.1f} {result['delta_bytes'] / 1024:>9.1f} "
+              f"{result['ratio_vs_csv']:>6.1f}x {result['ratio_vs_parquet']:>5.1f}x "
+              f"{result['encode_us_per_snapshot']:>7.0f} {result['decode_us_per_snapshot']:>7.0f} "
+              f"{result['seek_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import gzip
+import json
+import os
+import numpy as np
+
+
+EXCHANGES = ['binance', 'okx', 'coinex', 'bitpin', 'nobitex', 'wallex']
+MULTI_MARKET_EXCHANGES = ['nobitex', 'wallex']
+FULL_MARKETS = 300
+FIXTURE_TIMESTAMP_MS = 1735603200000
+
+BASE_ASSETS = ['BTC', 'ETH', 'USDT', 'BNB', 'SOL', 'XRP', 'DOGE', 'TON', 'ADA', 'TRX', 'AVAX', 'SHIB', 'DOT',
+               'LINK', 'BCH', 'NEAR', 'LTC', 'MATIC', 'UNI', 'PEPE', 'ICP', 'ETC', 'APT', 'FIL', 'ATOM', 'XLM']
+QUOTE_ASSETS = {'nobitex': ['IRT', 'USDT'], 'wallex': ['TMN', 'USDT']}
+
+
+def market_names(exchange, count):
+    quotes = QUOTE_ASSETS[exchange]
+    names = []
+    for index in range(count):
+        base = BASE_ASSETS[index % len(BASE_ASSETS)]
+        # Past the real asset list, numbered stand-ins keep every market name unique.
+        if index >= len(BASE_ASSETS) * len(quotes):
+            base = f"{base}{index // (len(BASE_ASSETS) * len(quotes))}"
+        names.append(f"{base}{quotes[(index // len(BASE_ASSETS)) % len(quotes)]}")
+    return names
+
+
+def book_side(rng, mid, depth, is_bid):
+    # Prices step away from the mid by a few ticks per level; volumes are heavy-tailed like real books.
+    tick = 10 ** np.floor(np.log10(mid) - 4)
+    steps = np.cumsum(rng.integers(1, 6, size=depth)) + rng.integers(0, 3)
+    prices = mid - steps * tick if is_bid else mid + steps * tick
+    prices = np.maximum(prices, tick)
+    volumes = np.round(rng.lognormal(-1.0, 1.5, size=depth), 6) + 1e-6
+    return np.round(prices, 8), volumes
+
+
+def level_strings(prices, volumes):
+    return [[f"{price:.8f}".rstrip('0').rstrip('.'), f"{volume:.6f}"] for price, volume in zip(prices, volumes)]
+
+
+def market_book(rng, depth):
+    mid = float(10 ** rng.uniform(-2, 5))
+    bid_prices, bid_volumes = book_side(rng, mid, depth, True)
+    ask_prices, ask_volumes = book_side(rng, mid, depth, False)
+    return mid, (bid_prices, bid_volumes), (ask_prices, ask_volumes)
+
+
+def binance_payload(rng, depth, markets):
+    mid, bids, asks = market_book(rng, depth)
+    return {'lastUpdateId': int(rng.integers(1e10, 1e11)), 'bids': level_strings(*bids), 'asks': level_strings(*asks)}
+
+
+def okx_payload(rng, depth, markets):
+    mid, bids, asks = market_book(rng, depth)
+    return {'code': '0', 'msg': '', 'data': [{
+        'asks': [level + ['0', str(int(rng.integers(1, 20)))] for level in level_strings(*asks)],
+        'bids': [level + ['0', str(int(rng.integers(1, 20)))] for level in level_strings(*bids)],
+        'ts': str(FIXTURE_TIMESTAMP_MS)
+    }]}
+
+
+def coinex_payload(rng, depth, markets):
+    mid, bids, asks = market_book(rng, depth)
+    return {'code': 0, 'message': 'OK', 'data': {
+        'asks': level_strings(*asks),
+        'bids': level_strings(*bids),
+        'last': f"{mid:.8f}",
+        'time': FIXTURE_TIMESTAMP_MS
+    }}
+
+
+def bitpin_payload(rng, depth, markets):
+    mid, bids, asks = market_book(rng, depth)
+    return {'asks': level_strings(*asks), 'bids': level_strings(*bids), 'event_time': FIXTURE_TIMESTAMP_MS / 1000}
+
+
+def nobitex_payload(rng, depth, markets):
+    payload = {'status': 'ok'}
+    for index, name in enumerate(market_names('nobitex', markets)):
+        mid, bids, asks = market_book(rng, depth)
+        payload[name] = {
+            'lastUpdate': FIXTURE_TIMESTAMP_MS - index * 37,
+            'lastTradePrice': f"{mid:.8f}",
+            'asks': level_strings(*asks),
+            'bids': level_strings(*bids),
+        }
+    return payload
+
+
+def wallex_payload(rng, depth, markets):
+    result = {}
+    for name in market_names('wallex', markets):
+        mid, bids, asks = market_book(rng, depth)
+        result[name] = {
+            'ask': [{'price': float(price), 'quantity': float(volume), 'sum': float(price * volume)}
+                    for price, volume in zip(*asks)],
+            'bid': [{'price': float(price), 'quantity': float(volume), 'sum': float(price * volume)}
+                    for price, volume in zip(*bids)],
+        }
+    return {'result': result, 'message': 'The operation was successful', 'success': True}
+
+
+PAYLOADS = {
+    'binance': binance_payload,
+    'okx': okx_payload,
+    'coinex': coinex_payload,
+    'bitpin': bitpin_payload,
+    'nobitex': nobitex_payload,
+    'wallex': wallex_payload,
+}
+
+
+def fixture_name(exchange, depth, markets):
+    return f"{exchange}_depth{depth}_markets{markets}.json.gz"
+
+
+def fixture(exchange, depth, markets=1, seed=0, directory=None):
+    # A recorded payload dropped into directory under the same name wins over the generated one.
+    if directory:
+        path = os.path.join(directory, fixture_name(exchange, depth, markets))
+        if os.path.exists(path):
+            with gzip.open(path, 'rt') as source:
+                return json.load(source)
+    rng = np.random.default_rng([seed, EXCHANGES.index(exchange), depth, markets])
+    return PAYLOADS[exchange](rng, depth, markets)
+
+
+def write_fixture(directory, exchange, depth, markets, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, fixture_name(exchange, depth, markets))
+    with gzip.open(path, 'wt') as target:
+        json.dump(fixture(exchange, depth, markets, seed), target)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write order book payload fixtures for every exchange format.")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'fixtures'))
+    parser.add_argument('--depths', default='10,100,1000,5000')
+    parser.add_argument('--markets', default=f'1,10,100,{FULL_MARKETS}')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    depths = [int(depth) for depth in args.depths.split(',')]
+    market_counts = [int(count) for count in args.markets.split(',')]
+    for exchange in EXCHANGES:
+        for depth in depths:
+            for markets in (market_counts if exchange in MULTI_MARKET_EXCHANGES else [1]):
+                path = write_fixture(args.output, exchange, depth, markets, args.seed)
+                print(f"{path}: {os.path.getsize(path)} bytes")
+
+
+if __name__ == '__main__':
+    main()
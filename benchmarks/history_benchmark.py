@@ -0,0 +1,131 @@
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from delta_benchmark import START_MS, level_frame, simulated_books
+from history_query import HistoryQuery, to_ms
+from parser_benchmarks import peak_rss_kb, proc_status_kb, reset_peak_rss
+from storage import ArrowStorage, CsvStorage, timestamp_ms
+
+
+MARKETS = [('okx', 'BTC-USDT'), ('binance', 'BTCUSDT'), ('okx', 'ETH-USDT')]
+BTC_MARKETS = [('okx', 'BTC-USDT'), ('binance', 'BTCUSDT')]
+DATE = pd.Timestamp(START_MS, unit='ms').strftime('%Y-%m-%d')
+SPREAD_COLUMNS = ['Item', 'Timestamp', 'Best_Bid_Price', 'Best_Ask_Price', 'Spread']
+WINDOW_START = pd.Timestamp(START_MS, unit='ms', tz='UTC') + pd.Timedelta(hours=10)
+FIVE_MINUTES = (to_ms(WINDOW_START), to_ms(WINDOW_START + pd.Timedelta(minutes=5)))
+ONE_HOUR = (to_ms(WINDOW_START), to_ms(WINDOW_START + pd.Timedelta(hours=1)))
+
+
+def write_day(root, backend, snapshots, depth):
+    # One day of 15s snapshots per market, written through the same storage backends the collectors use.
+    storage = CsvStorage(root) if backend == 'csv' else ArrowStorage(root)
+    for seed, (exchange, symbol) in enumerate(MARKETS):
+        frame = level_frame(list(simulated_books(depth, snapshots, seed=seed)), symbol)
+        if backend == 'csv':
+            storage.write(exchange, symbol, frame, date=DATE)
+            continue
+        # The storage buffers ticks into row groups anyway; writing 20 ticks per call keeps this quick.
+        ticks = frame['Timestamp'].factorize()[0] // 20
+        for _, chunk in frame.groupby(ticks, sort=False):
+            storage.write(exchange, symbol, chunk, date=DATE)
+    storage.close()
+
+
+def full_load(root, backend, markets, start_ms, end_ms, columns=None):
+    # What analysis did before: load whole day files and filter in pandas.
+    frames = []
+    for exchange, symbol in markets:
+        if backend == 'csv':
+            frame = CsvStorage(root).read_day(exchange, symbol, DATE)
+            frame['Timestamp'] = timestamp_ms(frame['Timestamp'])
+        else:
+            frame = ArrowStorage(root).read_day(exchange, symbol, DATE)
+        frame = frame[(frame['Timestamp'] >= start_ms) & (frame['Timestamp'] <= end_ms)]
+        frames.append(frame[columns].drop_duplicates('Timestamp') if columns else frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+CASES = {
+    'okx BTC 5 min': (
+        lambda query: query.books('okx', 'BTC-USDT', *FIVE_MINUTES),
+        lambda root, backend: full_load(root, backend, [('okx', 'BTC-USDT')], *FIVE_MINUTES)),
+    'BTC spread 1 h, all exchanges': (
+        lambda query: query.spread_series('BTCUSDT', *ONE_HOUR),
+        lambda root, backend: full_load(root, backend, BTC_MARKETS, *ONE_HOUR, columns=SPREAD_COLUMNS)),
+}
+
+
+def measure(root, backend, case, method, repeats):
+    # Runs in a fresh process so the first call is cold and the peak RSS, which also counts memory-mapped
+    # pages and Arrow buffers, covers only this query.
+    indexed, baseline = CASES[case]
+    query = HistoryQuery(root)
+    function = (lambda: indexed(query)) if method == 'indexed' else (lambda: baseline(root, backend))
+
+    gc.collect()
+    rss_before = proc_status_kb('VmRSS')
+    reset_peak_rss()
+    started = time.perf_counter()
+    rows = len(function())
+    first_seconds = time.perf_counter() - started
+    rss_growth = peak_rss_kb() - rss_before
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return {'backend': backend, 'query': case, 'method': method, 'rows': rows, 'first_ms': first_seconds * 1000,
+            'ms': min(timings) * 1000, 'peak_rss_growth_mb': rss_growth / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time range queries through history_query against loading whole day files.")
+    parser.add_argument('--depth', type=int, default=20)
+    parser.add_argument('--snapshots', type=int, default=5760, help="Snapshots per market (5760 = one day at 15s).")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', default='history_benchmark.json')
+    args = parser.parse_args()
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as work_dir:
+        for backend in ('csv', 'parquet'):
+            root = os.path.join(work_dir, backend)
+            started = time.perf_counter()
+            write_day(root, backend, args.snapshots, args.depth)
+            print(f"Wrote {backend} data in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            if backend == 'csv':
+                started = time.perf_counter()
+                count = HistoryQuery(root).build_indexes()
+                print(f"Indexed {count} CSV files in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+            for case in CASES:
+                for method in ('indexed', 'full load'):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        results.append(executor.submit(measure, root, backend, case, method, args.repeats).result())
+
+    with open(args.output, 'w') as target:
+        json.dump(results, target, indent=2)
+
+    print(f"{'backend':>8} {'query':>30} {'method':>10} {'rows':>7} {'first ms':>9} {'ms':>8} {'RSS MB':>7}")
+    for result in results:
+        print(f"{result['backend']:>8} {result['query']:>30} {result['method']:>10} {result['rows']:>7} "
+              f"{result['first_ms']:>9.1f} {result['ms']:>8.1f} {result['peak_rss_growth_mb']:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
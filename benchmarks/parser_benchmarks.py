@@ -0,0 +1,346 @@
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Benchmarks must never touch the write-ahead log or the storage directory of a running deployment.
+os.environ['WAL_ENABLED'] = 'false'
+
+import numpy as np
+import pandas as pd
+from fixtures import FULL_MARKETS, MULTI_MARKET_EXCHANGES, fixture
+
+
+BOT_TOKEN = '123456:benchmark'
+CHAT_ID = 'benchmark'
+DEPTHS = [10, 100, 1000, 5000]
+MARKET_COUNTS = [1, 10, 100, FULL_MARKETS]
+QUICK_DEPTHS = [10, 1000]
+QUICK_MARKET_COUNTS = [1, FULL_MARKETS]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def binance_process(depth, markets, fixtures_dir):
+    from binance_orderbook import OrderBookCollectorBinance
+    collector = OrderBookCollectorBinance('BTCUSDT', BOT_TOKEN, CHAT_ID)
+    payload = fixture('binance', depth, markets, directory=fixtures_dir)
+    return payload, lambda: collector.process_order_book_data('BTCUSDT', payload)
+
+
+def okx_process(depth, markets, fixtures_dir):
+    from okx_order_book import OrderBookCollectorOKX
+    collector = OrderBookCollectorOKX('BTC-USDT', BOT_TOKEN, CHAT_ID)
+    payload = fixture('okx', depth, markets, directory=fixtures_dir)
+    return payload, lambda: collector.process_order_book_data('BTC-USDT', payload)
+
+
+def coinex_process(depth, markets, fixtures_dir):
+    from coinex_orderbook_btc_eth import OrderBookCollectorCoinex
+    collector = OrderBookCollectorCoinex('BTCUSDT', BOT_TOKEN, CHAT_ID)
+    payload = fixture('coinex', depth, markets, directory=fixtures_dir)
+    return payload, lambda: collector.process_order_book_data('BTCUSDT', payload)
+
+
+def bitpin_process(depth, markets, fixtures_dir):
+    from bitpin_orderbook import OrderBookCollectorBitpin
+    collector = OrderBookCollectorBitpin('https://api.bitpin.ir/api/v1/mth/orderbook/BTC_USDT/', 'BTC_USDT',
+                                         BOT_TOKEN, CHAT_ID)
+    payload = fixture('bitpin', depth, markets, directory=fixtures_dir)
+    return payload, lambda: collector.process_orderbook(payload)
+
+
+def nobitex_collector(depth, markets, fixtures_dir):
+    from nobitex_order_book import OrderBookCollectorNobitex
+    collector = OrderBookCollectorNobitex(BOT_TOKEN, CHAT_ID)
+    payload = fixture('nobitex', depth, markets, directory=fixtures_dir)
+    changed = {key: value for key, value in payload.items() if key != 'status'}
+    return collector, payload, changed
+
+
+def nobitex_extract(depth, markets, fixtures_dir):
+    collector, payload, changed = nobitex_collector(depth, markets, fixtures_dir)
+    return payload, lambda: collector.extract_ask_bid(changed)
+
+
+def nobitex_depth(depth, markets, fixtures_dir):
+    collector, payload, changed = nobitex_collector(depth, markets, fixtures_dir)
+    arrays, markets_df = collector.extract_ask_bid(changed)
+    return payload, lambda: collector.calculate_depth_with_percentages(arrays, markets_df)
+
+
+def nobitex_analyze(depth, markets, fixtures_dir):
+    collector, payload, changed = nobitex_collector(depth, markets, fixtures_dir)
+    unchanged_df = pd.DataFrame(columns=['Item', 'Timestamp', 'Poll_Timestamp'])
+    return payload, lambda: collector.analyze(changed, unchanged_df)
+
+
+def wallex_collector(depth, markets, fixtures_dir):
+    from wallex_order_book import OrderBookCollectorWallex
+    collector = OrderBookCollectorWallex(BOT_TOKEN, CHAT_ID)
+    return collector, fixture('wallex', depth, markets, directory=fixtures_dir)
+
+
+def wallex_extract(depth, markets, fixtures_dir):
+    collector, payload = wallex_collector(depth, markets, fixtures_dir)
+    return payload, lambda: collector.extract_ask_bid(payload)
+
+
+def wallex_depth(depth, markets, fixtures_dir):
+    collector, payload = wallex_collector(depth, markets, fixtures_dir)
+    arrays, markets_df = collector.extract_ask_bid(payload)
+    return payload, lambda: collector.calculate_depth_with_percentages(arrays, markets_df)
+
+
+def wallex_analyze(depth, markets, fixtures_dir):
+    collector, payload = wallex_collector(depth, markets, fixtures_dir)
+    return payload, lambda: collector.analyze(payload)
+
+
+# case name -> (exchange, setup); setup returns the payload and a zero-argument call that processes one snapshot.
+CASES = {
+    'binance.process_order_book_data': ('binance', binance_process),
+    'okx.process_order_book_data': ('okx', okx_process),
+    'coinex.process_order_book_data': ('coinex', coinex_process),
+    'bitpin.process_orderbook': ('bitpin', bitpin_process),
+    'nobitex.extract_ask_bid': ('nobitex', nobitex_extract),
+    'nobitex.calculate_depth_with_percentages': ('nobitex', nobitex_depth),
+    'nobitex.analyze': ('nobitex', nobitex_analyze),
+    'wallex.extract_ask_bid': ('wallex', wallex_extract),
+    'wallex.calculate_depth_with_percentages': ('wallex', wallex_depth),
+    'wallex.analyze': ('wallex', wallex_analyze),
+}
+
+
+def proc_status_kb(field):
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux >= 4.0) so the peak covers only the measured calls.
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_kb():
+    peak = proc_status_kb('VmHWM')
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(case, depth, markets, repeat=7, min_batch_seconds=0.05, fixtures_dir=None):
+    exchange, setup = CASES[case]
+    payload, call = setup(depth, markets, fixtures_dir)
+
+    started = time.perf_counter()
+    call()
+    single = time.perf_counter() - started
+    number = max(1, math.ceil(min_batch_seconds / max(single, 1e-9)))
+
+    gc.collect()
+    rss_before = proc_status_kb('VmRSS')
+    peak_reset = reset_peak_rss()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        timings.append((time.perf_counter() - started) / number)
+    rss_peak = peak_rss_kb()
+
+    # Allocations are traced in a separate call because tracing slows every allocation down.
+    gc.collect()
+    tracemalloc.start()
+    result = call()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    timings = np.asarray(timings) * 1000
+    levels = depth * (markets if exchange in MULTI_MARKET_EXCHANGES else 1)
+    return {
+        'case': case,
+        'exchange': exchange,
+        'depth': depth,
+        'markets': markets,
+        'levels_per_side': levels,
+        'payload_bytes': len(json.dumps(payload)),
+        'calls_per_repeat': number,
+        'repeat': repeat,
+        'wall_ms_median': float(np.median(timings)),
+        'wall_ms_min': float(timings.min()),
+        'wall_ms_max': float(timings.max()),
+        'wall_us_per_level': float(np.median(timings) * 1000 / levels),
+        'alloc_peak_kb': peak / 1024,
+        'alloc_retained_kb': retained / 1024,
+        'rss_peak_kb': rss_peak,
+        'rss_growth_kb': rss_peak - rss_before if peak_reset and rss_before is not None else None,
+    }
+
+
+def case_key(result):
+    return f"{result['case']}[depth={result['depth']},markets={result['markets']}]"
+
+
+def benchmark_grid(cases, depths, market_counts, max_levels):
+    grid = []
+    for case in cases:
+        exchange = CASES[case][0]
+        for depth in depths:
+            for markets in (market_counts if exchange in MULTI_MARKET_EXCHANGES else [1]):
+                if depth * markets <= max_levels:
+                    grid.append((case, depth, markets))
+    return grid
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(grid, repeat, min_batch_seconds, fixtures_dir, isolate=True):
+    # Every case runs in a fresh spawned process so peak RSS is not inherited from earlier cases.
+    results = []
+    if isolate:
+        context = multiprocessing.get_context('spawn')
+        for case, depth, markets in grid:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(measure, case, depth, markets, repeat, min_batch_seconds, fixtures_dir).result()
+            print_result(result)
+            results.append(result)
+    else:
+        for case, depth, markets in grid:
+            result = measure(case, depth, markets, repeat, min_batch_seconds, fixtures_dir)
+            print_result(result)
+            results.append(result)
+    return results
+
+
+def print_result(result):
+    growth = result['rss_growth_kb']
+    print(f"{case_key(result):70s} {result['wall_ms_median']:10.3f} ms  "
+          f"alloc peak {result['alloc_peak_kb']:10.1f} KiB  "
+          f"rss +{growth if growth is not None else '?'} KiB", flush=True)
+
+
+def compare(results, baseline, time_threshold, alloc_threshold):
+    # Wall time is compared on the fastest repeat, the least noisy estimate; allocations are nearly
+    # deterministic, so each has its own tolerance.
+    previous = {case_key(result): result for result in baseline['results']}
+    regressions = []
+    print(f"\n{'case':70s} {'time':>8s} {'alloc':>8s}")
+    for result in results:
+        key = case_key(result)
+        if key not in previous:
+            print(f"{key:70s} {'new':>8s}")
+            continue
+        time_ratio = result['wall_ms_min'] / previous[key]['wall_ms_min']
+        alloc_ratio = result['alloc_peak_kb'] / max(previous[key]['alloc_peak_kb'], 1e-9)
+        flags = []
+        if time_ratio > 1 + time_threshold:
+            flags.append('slower')
+        if alloc_ratio > 1 + alloc_threshold:
+            flags.append('more memory')
+        if flags:
+            regressions.append((key, flags))
+        print(f"{key:70s} {time_ratio:7.2f}x {alloc_ratio:7.2f}x {' '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the order book parsers and depth functions.")
+    parser.add_argument('--cases', default='', help="Comma-separated case name prefixes, e.g. nobitex,wallex.analyze")
+    parser.add_argument('--depths', default=None)
+    parser.add_argument('--markets', default=None)
+    parser.add_argument('--max-levels', type=int, default=None,
+                        help="Skip combinations whose depth * markets exceeds this many levels per side")
+    parser.add_argument('--quick', action='store_true', help="Small grid and fewer repeats, for CI")
+    parser.add_argument('--repeat', type=int, default=None)
+    parser.add_argument('--min-batch-seconds', type=float, default=0.05)
+    parser.add_argument('--fixtures', default=None, help="Directory of recorded payloads overriding generated ones")
+    parser.add_argument('--in-process', action='store_true', help="Run every case in this process (RSS not isolated)")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Write the results to --baseline as well")
+    parser.add_argument('--time-threshold', type=float, default=0.25)
+    parser.add_argument('--alloc-threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    depths = [int(depth) for depth in args.depths.split(',')] if args.depths else (
+        QUICK_DEPTHS if args.quick else DEPTHS)
+    market_counts = [int(count) for count in args.markets.split(',')] if args.markets else (
+        QUICK_MARKET_COUNTS if args.quick else MARKET_COUNTS)
+    max_levels = args.max_levels or (100_000 if args.quick else 300_000)
+    repeat = args.repeat or (3 if args.quick else 7)
+    prefixes = [prefix for prefix in args.cases.split(',') if prefix]
+    cases = [case for case in CASES if not prefixes or any(case.startswith(prefix) for prefix in prefixes)]
+
+    grid = benchmark_grid(cases, depths, market_counts, max_levels)
+    results = run_benchmarks(grid, repeat, args.min_batch_seconds, args.fixtures, isolate=not args.in_process)
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as output:
+            json.dump(report, output, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as source:
+        baseline = json.load(source)
+    regressions = compare(results, baseline, args.time_threshold, args.alloc_threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against the baseline from commit {baseline['meta'].get('commit')}.")
+        return 1
+    print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
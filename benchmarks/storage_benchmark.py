@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from delta_benchmark import START_MS, level_frame, simulated_books
+from storage import ArrowStorage, CsvStorage, DeltaStorage
+
+
+EXCHANGE = 'binance'
+SYMBOL = 'BTCUSDT'
+DATE = pd.Timestamp(START_MS, unit='ms').strftime('%Y-%m-%d')
+
+
+def create_storage(backend, root):
+    if backend == 'csv':
+        return CsvStorage(root)
+    if backend == 'delta':
+        return DeltaStorage(root)
+    return ArrowStorage(root, file_format=backend)
+
+
+def write_day(storage, frame):
+    # One write per tick, as the collectors do.
+    for _, tick in frame.groupby('Timestamp', sort=False):
+        storage.write(EXCHANGE, SYMBOL, tick, date=DATE)
+    storage.close()
+
+
+def typed_csv_read(storage):
+    # What analysis of a CSV day needs before it can filter on time: the text DateTime parsed as well.
+    frame = storage.read_day(EXCHANGE, SYMBOL, DATE)
+    frame['DateTime'] = pd.to_datetime(frame['DateTime'], format='ISO8601')
+    return frame
+
+
+def measure(backend, root, frame, repeats):
+    storage = create_storage(backend, root)
+    started = time.perf_counter()
+    write_day(storage, frame)
+    write_seconds = time.perf_counter() - started
+
+    storage = create_storage(backend, root)
+    reads = {'read_ms': lambda: storage.read_day(EXCHANGE, SYMBOL, DATE)}
+    if backend == 'csv':
+        reads['typed_read_ms'] = lambda: typed_csv_read(storage)
+
+    size = sum(os.path.getsize(os.path.join(directory, name))
+               for directory, _, names in os.walk(root) for name in names)
+    result = {'backend': backend, 'bytes': size, 'write_s': write_seconds}
+    for name, read in reads.items():
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result['rows'] = len(read())
+            timings.append(time.perf_counter() - started)
+        result[name] = min(timings) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write one day of order book level rows through each storage backend and time reading it back.")
+    parser.add_argument('--depth', type=int, default=20)
+    parser.add_argument('--snapshots', type=int, default=5760, help="Snapshots per day (5760 = one day at 15s).")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--backends', nargs='+', default=['csv', 'parquet', 'arrow', 'delta'])
+    parser.add_argument('--output', default='storage_benchmark.json')
+    args = parser.parse_args()
+
+    frame = level_frame(list(simulated_books(args.depth, args.snapshots)), SYMBOL)
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = [measure(backend, os.path.join(work_dir, backend), frame, args.repeats) for backend in args.backends]
+
+    csv = next((result for result in results if result['backend'] == 'csv'), None)
+    for result in results:
+        if csv is not None:
+            result['speedup_vs_csv_text'] = csv['read_ms'] / result['read_ms']
+            result['speedup_vs_csv_typed'] = csv['typed_read_ms'] / result['read_ms']
+
+    with open(args.output, 'w') as target:
+        json.dump({'depth': args.depth, 'snapshots': args.snapshots, 'results': results}, target, indent=2)
+
+    # "vs csv text" leaves DateTime and Date as strings, "vs csv typed" also parses DateTime the way
+    # the other backends already return it.
+    print(f"{'backend':>8} {'rows':>8} {'MB':>7} {'write s':>8} {'read ms':>8} {'vs csv text':>12} {'vs csv typed':>13}")
+    for result in results:
+        speedups = (f"{result['speedup_vs_csv_text']:>11.1f}x {result['speedup_vs_csv_typed']:>12.1f}x"
+                    if csv is not None else f"{'-':>12} {'-':>13}")
+        print(f"{result['backend']:>8} {result['rows']:>8} {result['bytes'] / 2 ** 20:>7.2f} "
+              f"{result['write_s']:>8.1f} {result['read_ms']:>8.1f} {speedups}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import fixture
+
+
+SYMBOL_COUNTS = [2, 10, 50, 100, 250, 500]
+QUICK_SYMBOL_COUNTS = [2, 100, 500]
+
+
+def serve_binance(port_queue):
+    # Stand-in for GET /api/v3/depth, run in its own process so its threads and memory are not measured.
+    bodies = {}
+
+    class DepthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path != '/api/v3/depth':
+                self.send_error(404)
+                return
+            limit = int(dict(parse_qsl(parts.query)).get('limit', 100))
+            body = bodies.get(limit)
+            if body is None:
+                body = bodies[limit] = json.dumps(fixture('binance', limit)).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DepthHandler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def process_usage():
+    usage = {'threads': threading.active_count(), 'open_fds': len(os.listdir('/proc/self/fd'))}
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(('VmRSS:', 'VmHWM:', 'Threads:')):
+                name, value = line.split(':', 1)
+                usage[name] = int(value.split()[0])
+    return {'threads': usage['Threads'], 'python_threads': usage['threads'], 'open_fds': usage['open_fds'],
+            'rss_mb': usage['VmRSS'] / 1024, 'peak_rss_mb': usage['VmHWM'] / 1024}
+
+
+def run_child(seconds):
+    # Goes through the production runner, so the universe comes from BINANCE_SYMBOLS via symbol_universe.
+    before = process_usage()
+    import international_exchange_run as runner
+    from async_engine import AsyncCollectionEngine
+    from symbol_universe import concurrency_caps
+
+    collectors = runner.binance_collectors()
+    engine = AsyncCollectionEngine(collectors, interval_seconds=runner.TICK_INTERVAL_SECONDS,
+                                   concurrency_caps=concurrency_caps(runner.UNIVERSE))
+    samples = []
+
+    async def sample():
+        while True:
+            await asyncio.sleep(1)
+            samples.append(process_usage())
+
+    async def run():
+        sampler = asyncio.create_task(sample())
+        try:
+            await asyncio.wait_for(engine.run(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            sampler.cancel()
+
+    asyncio.run(run())
+    after = process_usage()
+    stats = engine.pipeline_stats().get('OrderBookCollectorBinance', {})
+    # The first samples still include start-up; steady state is the second half of the run.
+    steady = samples[len(samples) // 2:] or [after]
+    result = {
+        'symbols': len(collectors),
+        'baseline_rss_mb': before['rss_mb'],
+        'max_threads': max(sample['threads'] for sample in steady),
+        'max_open_fds': max(sample['open_fds'] for sample in steady),
+        'rss_mb': after['rss_mb'],
+        'peak_rss_mb': after['peak_rss_mb'],
+        'ticks_enqueued': stats.get('enqueued', 0),
+        'ticks_processed': stats.get('processed', 0),
+        'ticks_dropped': stats.get('dropped', 0),
+        'mean_processing_seconds': stats.get('processing_seconds', 0.0) / max(stats.get('processed', 0), 1),
+    }
+    print(json.dumps(result))
+
+
+def measure(symbol_count, api_url, interval, seconds, work_dir):
+    env = dict(os.environ)
+    env.update({
+        'BINANCE_SYMBOLS': ','.join(f"SYM{index:04d}USDT" for index in range(symbol_count)),
+        'BINANCE_API_URL': api_url,
+        'TELEGRAM_BOT_TOKEN': '123456:benchmark',
+        'TELEGRAM_CHAT_ID': 'benchmark',
+        'TICK_INTERVAL_SECONDS': str(interval),
+        'RATE_LIMIT_BINANCE': '1000000/1',
+        'EXCHANGE_PROXY_URL': '',
+        'METRICS_PORT': '',
+        'WAL_ROOT': os.path.join(work_dir, f"wal-{symbol_count}"),
+        'STORAGE_ROOT': os.path.join(work_dir, f"data-{symbol_count}"),
+        'SYMBOLS_CONFIG': os.path.join(work_dir, 'missing.yaml'),
+    })
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--seconds', str(seconds)],
+                            env=env, cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_table(results):
+    print(f"{'symbols':>8} {'threads':>8} {'fds':>6} {'rss MB':>8} {'peak MB':>8} {'KB/symbol':>10} "
+          f"{'processed':>10} {'dropped':>8} {'tick s':>7}")
+    first = results[0]
+    for result in results:
+        extra = result['symbols'] - first['symbols']
+        per_symbol = (result['rss_mb'] - first['rss_mb']) * 1024 / extra if extra else 0.0
+        print(f"{result['symbols']:>8} {result['max_threads']:>8} {result['max_open_fds']:>6} "
+              f"{result['rss_mb']:>8.1f} {result['peak_rss_mb']:>8.1f} {per_symbol:>10.1f} "
+              f"{result['ticks_processed']:>10} {result['ticks_dropped']:>8} "
+              f"{result['mean_processing_seconds']:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the collection engine over a growing Binance symbol universe against a local "
+                    "stand-in server and report threads, open files, memory and dropped ticks.")
+    parser.add_argument('--symbols', type=int, nargs='+', help="Symbol counts to measure.")
+    parser.add_argument('--quick', action='store_true', help=f"Only measure {QUICK_SYMBOL_COUNTS} symbols.")
+    parser.add_argument('--interval', type=float, default=2.0, help="Tick interval in seconds.")
+    parser.add_argument('--seconds', type=float, default=20.0, help="How long each symbol count runs.")
+    parser.add_argument('--output', default='universe_benchmark.json')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.seconds)
+        return
+
+    symbol_counts = args.symbols or (QUICK_SYMBOL_COUNTS if args.quick else SYMBOL_COUNTS)
+    port_queue = multiprocessing.get_context('spawn').Queue()
+    server = multiprocessing.get_context('spawn').Process(target=serve_binance, args=(port_queue,), daemon=True)
+    server.start()
+    api_url = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for symbol_count in symbol_counts:
+                started = time.perf_counter()
+                results.append(measure(symbol_count, api_url, args.interval, args.seconds, work_dir))
+                print(f"{symbol_count} symbols measured in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        server.terminate()
+
+    with open(args.output, 'w') as target:
+        json.dump({'interval_seconds': args.interval, 'seconds': args.seconds, 'results': results}, target,
+                  indent=2)
+    print_table(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import asyncio
+import json
+from threading import Thread, Lock
+import aiohttp
+from aiohttp_socks import ProxyConnector
+from capture import record_response
+from local_order_book import LocalOrderBook
+from rate_limiter import get_limiter
+
+
+class BinanceDepthStream:
+    def __init__(self, symbols, ws_url="wss://stream.binance.com:9443", rest_url="https://api.binance.com",
+                 proxy=None, snapshot_limit=1000, update_speed="100ms", reconnect_seconds=5):
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.ws_url = ws_url.rstrip('/')
+        self.rest_url = rest_url.rstrip('/')
+        self.proxy = proxy
+        self.snapshot_limit = snapshot_limit
+        self.update_speed = update_speed
+        self.reconnect_seconds = reconnect_seconds
+
+        self.books = {symbol: LocalOrderBook() for symbol in self.symbols}
+        self.last_update_id = {symbol: None for symbol in self.symbols}
+        self.buffers = {symbol: [] for symbol in self.symbols}
+        self.resync_tasks = {}
+        self.resync_count = {symbol: 0 for symbol in self.symbols}
+        self.lock = Lock()
+        self.running = False
+
+    def stream_url(self):
+        streams = '/'.join(f"{symbol.lower()}@depth@{self.update_speed}" for symbol in self.symbols)
+        return f"{self.ws_url}/stream?streams={streams}"
+
+    def get_order_book(self, symbol, depth=10):
+        symbol = symbol.upper()
+        with self.lock:
+            book = self.books.get(symbol)
+            if book is None or self.last_update_id[symbol] is None or book.is_empty():
+                return None
+            return {
+                "lastUpdateId": self.last_update_id[symbol],
+                "bids": book.top('bids', depth),
+                "asks": book.top('asks', depth),
+            }
+
+    def create_session(self):
+        connector = ProxyConnector.from_url(self.proxy) if self.proxy else aiohttp.TCPConnector()
+        return aiohttp.ClientSession(connector=connector)
+
+    async def fetch_snapshot(self, session, symbol):
+        url = f"{self.rest_url}/api/v3/depth?symbol={symbol}&limit={self.snapshot_limit}"
+        limiter = get_limiter("binance")
+        await limiter.acquire_async(url)
+        async with session.get(url) as response:
+            body = await response.read()
+            limiter.feedback(response.status, response.headers)
+            record_response(url, response.status, body)
+            response.raise_for_status()
+            return json.loads(body)
+
+    def apply_event(self, symbol, event):
+        first_id, final_id = event['U'], event['u']
+        last_id = self.last_update_id[symbol]
+
+        if final_id <= last_id:
+            return True
+        if first_id > last_id + 1:
+            return False
+
+        book = self.books[symbol]
+        for price, quantity in event['b']:
+            book.set_level('bids', price, quantity)
+        for price, quantity in event['a']:
+            book.set_level('asks', price, quantity)
+        self.last_update_id[symbol] = final_id
+        return True
+
+    async def resync(self, session, symbol):
+        # The task entry is always released, so a failed or malformed snapshot never blocks later resyncs;
+        # the symbol stays unsynced and the next event schedules another attempt.
+        in_sync = True
+        try:
+            snapshot = await self.fetch_snapshot(session, symbol)
+            with self.lock:
+                self.books[symbol].load(snapshot['bids'], snapshot['asks'])
+                self.last_update_id[symbol] = snapshot['lastUpdateId']
+                buffered, self.buffers[symbol] = self.buffers[symbol], []
+                in_sync = all(self.apply_event(symbol, event) for event in buffered)
+                if not in_sync:
+                    self.last_update_id[symbol] = None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Failed to fetch depth snapshot for {symbol}: {e}")
+            await asyncio.sleep(self.reconnect_seconds)
+        except Exception as e:
+            print(f"Failed to load depth snapshot for {symbol}: {e}")
+            with self.lock:
+                self.last_update_id[symbol] = None
+            await asyncio.sleep(self.reconnect_seconds)
+        finally:
+            self.resync_tasks.pop(symbol, None)
+        if not in_sync:
+            self.start_resync(session, symbol)
+
+    def start_resync(self, session, symbol):
+        if symbol not in self.resync_tasks:
+            self.resync_count[symbol] += 1
+            self.resync_tasks[symbol] = asyncio.create_task(self.resync(session, symbol))
+
+    def handle_event(self, session, event):
+        symbol = event['s']
+        if symbol not in self.books:
+            return
+
+        with self.lock:
+            if self.last_update_id[symbol] is None:
+                self.buffers[symbol].append(event)
+                in_sync = False
+            else:
+                in_sync = self.apply_event(symbol, event)
+                if not in_sync:
+                    print(f"Sequence gap detected for {symbol}. Resyncing order book.")
+                    self.last_update_id[symbol] = None
+                    self.buffers[symbol] = [event]
+
+        if not in_sync:
+            self.start_resync(session, symbol)
+
+    async def run(self):
+        self.running = True
+        async with self.create_session() as session:
+            while True:
+                try:
+                    async with session.ws_connect(self.stream_url(), heartbeat=30) as ws:
+                        async for message in ws:
+                            if message.type == aiohttp.WSMsgType.TEXT:
+                                payload = message.json()
+                                self.handle_event(session, payload.get('data', payload))
+                            elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    print(f"Binance depth stream disconnected: {e}")
+
+                with self.lock:
+                    for symbol in self.symbols:
+                        self.last_update_id[symbol] = None
+                        self.buffers[symbol] = []
+                await asyncio.sleep(self.reconnect_seconds)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        thread = Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        thread.start()
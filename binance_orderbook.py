@@ -1,49 +1,52 @@
-from threading import Thread
 from datetime import datetime
+import os
 import pytz
-import requests
 import pandas as pd
-from telegram import Bot
-import time
-import io
+from metrics import stage_timer
+from tick_scheduler import is_last_tick_of_hour
+from slippage import store_slippage_frame
+from snapshot_store import SnapshotStore, LEVEL_COLUMNS
+from snapshot_wal import open_wal
+from rolling_stats import RollingStats
+from rollups import get_rollups
+from telegram_export import TelegramExporter, create_bot
+from storage import get_storage
 
 
 class OrderBookCollectorBinance:
-    def __init__(self, token, telegram_bot_token, telegram_chat_id, interval_seconds=15):
+    def __init__(self, token, telegram_bot_token, telegram_chat_id, interval_seconds=15, depth_stream=None):
 
-        self.name_exchange = "biance"
+        self.name_exchange = "binance"
         self.symbols = token
-        self.telegram_bot = Bot(token=telegram_bot_token)
+        self.telegram_bot = create_bot(telegram_bot_token)
         self.telegram_chat_id = telegram_chat_id
+        self.exporter = TelegramExporter(self.telegram_bot, telegram_chat_id)
         self.interval_seconds = interval_seconds
-        self.data_list = []
+        self.storage = get_storage()
+        self.store = SnapshotStore(LEVEL_COLUMNS, timestamp_unit='s',
+                                   wal=open_wal(f"binance_order_book_{self.symbols}"))
         self.current_date = datetime.now(pytz.utc).date()
-
+        self.consolidated_book = None
+        self.rolling_stats = RollingStats(initial_symbols=1)
+        self.rollups = get_rollups("binance")
+        self.depth_stream = depth_stream
+
+        self.api_url = os.getenv("BINANCE_API_URL", "https://api.binance.com").rstrip('/')
+        # EXCHANGE_PROXY_URL set to an empty value connects directly, e.g. to a local replay server.
+        proxy = os.getenv("EXCHANGE_PROXY_URL", "socks5://127.0.0.1:2080")
         self.proxies = {
-            'http': 'socks5://127.0.0.1:2080',
-            'https': 'socks5://127.0.0.1:2080',
-        }
-
-    def fetch_order_book(self, symbol):
-        url = f"https://api.binance.com/api/v3/depth?limit=10&symbol={symbol}"
-        try:
-            response = requests.get(url, proxies=self.proxies)
-            response.raise_for_status()
-            return symbol, response.json()
-        except requests.RequestException as e:
-            print(f"Failed to fetch data for {symbol}: {e}")
-            return symbol, None
+            'http': proxy,
+            'https': proxy,
+        } if proxy else {}
 
+    def order_book_url(self, symbol=None):
+        return f"{self.api_url}/api/v3/depth?limit=10&symbol={symbol or self.symbols}"
 
     def save_data(self, data, name_exchange, symbol):
-        today_date = datetime.today().strftime('%Y-%m-%d')
-        filename = f'order_book_data/{name_exchange.lower()}/order_book_{name_exchange.lower()}_{symbol}_{today_date}.csv'
-        data.to_csv(filename, index=False)
+        self.storage.write(name_exchange, symbol, data)
 
 
-    def process_order_book_data(self, symbol):
-
-        symbol, order_book_data = self.fetch_order_book(symbol)
+    def process_order_book_data(self, symbol, order_book_data):
         if order_book_data:
             max_len = max(len(order_book_data["asks"]), len(order_book_data["bids"]))
             asks = order_book_data["asks"] + [['', '']] * (max_len - len(order_book_data["asks"]))
@@ -82,66 +85,68 @@ class OrderBookCollectorBinance:
 
             reference_price = pd.Series(all_prices).median()
             iteration_data["Reference_Price"] = reference_price
-            iteration_data.drop_duplicates(subset=["Timestamp", "Item"], inplace=True)
 
             return iteration_data
 
     def send_to_telegram(self):
         try:
-            if self.data_list:
-                df = pd.concat(self.data_list, ignore_index=True)
-
-                csv_buffer = io.BytesIO()
-                df.to_csv(csv_buffer, index=False, encoding='utf-8')
-                csv_buffer.seek(0)
-
-                file_name = f"binance_order_book_{self.symbols}_{datetime.now(pytz.utc).strftime('%Y-%m-%d')}.csv"
-                self.telegram_bot.send_document(
-                    chat_id=self.telegram_chat_id,
-                    document=csv_buffer,
-                    filename=file_name
-                )
+            if self.exporter.export(f"binance_order_book_{self.symbols}", self.store, str(self.current_date)):
                 print(f"Data sent to Telegram for {self.symbols}.")
+            self.store.compact()
 
         except Exception as e:
             print(f"Failed to send data to Telegram: {e}")
 
-    def start(self):
-        while True:
-            try:
-                now = datetime.now(pytz.utc)
-                if now.second % 15 == 0:
-                    if now.date() != self.current_date:
-                        print(f"New day detected: {now.date()}. Resetting data.")
-                        self.current_date = now.date()
-                        self.data_list = []
-
-                    iteration_data = self.process_order_book_data(self.symbols)
-
-                    self.data_list.append(iteration_data)
-
-                    if now.minute == 59 and now.second >= (60 - self.interval_seconds):
-                        self.send_to_telegram()
-
-                time.sleep(1)
-            except Exception as e:
-                print(f"An error occurred for {self.symbols}: {e}")
-                time.sleep(1)
-
+    def send_daily_to_telegram(self):
+        try:
+            if self.exporter.export_daily(f"binance_order_book_{self.symbols}", self.store, str(self.current_date)):
+                print(f"Daily data sent to Telegram for {self.symbols}.")
 
-class OrderBookManagerBinance:
-    def __init__(self, collectors):
-        self.collectors = collectors
+        except Exception as e:
+            print(f"Failed to send daily data to Telegram: {e}")
 
-    def start(self):
-        threads = []
+    def save_daily_slippage(self):
         try:
-            for collector in self.collectors:
-                thread = Thread(target=collector.start)
-                threads.append(thread)
-                thread.start()
-
-            for thread in threads:
-                thread.join()
-        except KeyboardInterrupt:
-            print("Data collection interrupted by user.")
+            self.storage.write(self.name_exchange, f"{self.symbols}_slippage", store_slippage_frame(self.store),
+                               date=str(self.current_date))
+        except Exception as e:
+            print(f"Failed to save daily slippage for {self.symbols}: {e}")
+
+    def restore(self):
+        if self.store.restore():
+            self.current_date = datetime.fromtimestamp(self.store.last_ingest_time(), pytz.utc).date()
+            print(f"Restored {len(self.store)} rows for {self.symbols} from the write-ahead log.")
+
+    def __getstate__(self):
+        # Only configuration crosses into the analytics process pool, never the store or the bot.
+        return {'symbols': self.symbols, 'name_exchange': self.name_exchange, 'api_url': self.api_url, 'proxies': self.proxies, 'depth_stream': None}
+
+    def prepare(self, now, order_book_data):
+        if now.date() != self.current_date:
+            print(f"New day detected: {now.date()}. Resetting data.")
+            self.save_daily_slippage()
+            self.send_daily_to_telegram()
+            self.current_date = now.date()
+            self.store.clear()
+
+        return self.symbols, order_book_data
+
+    def analyze(self, symbol, order_book_data):
+        with stage_timer("binance", 'parse'):
+            return self.process_order_book_data(symbol, order_book_data)
+
+    def complete(self, now, iteration_data):
+        if iteration_data is not None:
+            self.save_data(iteration_data, self.name_exchange, self.symbols)
+        if self.consolidated_book is not None:
+            self.consolidated_book.update_frame(self.name_exchange, iteration_data)
+        self.store.append_frame(iteration_data)
+        self.rolling_stats.update_frame(iteration_data, now.timestamp())
+        if self.rollups is not None:
+            self.rollups.update_frame(iteration_data, now.timestamp())
+
+        if is_last_tick_of_hour(now, self.interval_seconds):
+            self.send_to_telegram()
+
+    def run_iteration(self, now, order_book_data):
+        self.complete(now, self.analyze(*self.prepare(now, order_book_data)))
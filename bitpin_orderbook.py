@@ -1,32 +1,38 @@
-from threading import Thread
 from datetime import datetime
 import pytz
-import requests
 import pandas as pd
-from telegram import Bot
-import time
-import io
+from metrics import stage_timer
+from tick_scheduler import is_last_tick_of_hour
+from slippage import store_slippage_frame
+from snapshot_store import SnapshotStore, LEVEL_COLUMNS
+from snapshot_wal import open_wal
+from rolling_stats import RollingStats
+from rollups import get_rollups
+from telegram_export import TelegramExporter, create_bot
+from storage import get_storage
 
 
 class OrderBookCollectorBitpin:
     def __init__(self, url, token, telegram_bot_token, telegram_chat_id, interval_seconds=15):
         self.url = url
         self.token = token
-        self.telegram_bot = Bot(token=telegram_bot_token)
+        self.telegram_bot = create_bot(telegram_bot_token)
         self.telegram_chat_id = telegram_chat_id
+        self.exporter = TelegramExporter(self.telegram_bot, telegram_chat_id)
         self.interval_seconds = interval_seconds
-        self.data_list = []
+        self.storage = get_storage()
+        self.store = SnapshotStore(LEVEL_COLUMNS, timestamp_unit='s',
+                                   wal=open_wal(f"bitpin_order_book_{self.token}"))
         self.current_date = datetime.now(pytz.utc).date()
+        self.consolidated_book = None
+        self.rolling_stats = RollingStats(initial_symbols=1)
+        self.rollups = get_rollups("bitpin")
 
-    def fetch_orderbook(self):
-        try:
-            response = requests.get(self.url)
-            response.raise_for_status()
-            data = response.json()
-            return data
-        except requests.RequestException as e:
-            print(f"Failed to fetch data from {self.url}: {e}")
-            return None
+    def order_book_url(self):
+        return self.url
+
+    def save_data(self, data, name_exchange, symbol):
+        self.storage.write(name_exchange, symbol, data)
 
     def process_orderbook(self, data):
         max_len = max(len(data.get("asks", [])), len(data.get("bids", [])))
@@ -65,68 +71,69 @@ class OrderBookCollectorBitpin:
             "Reference_Price": [reference_price] * max_len
         })
 
-        iteration_data.drop_duplicates(subset=["Timestamp", "Item"], inplace=True)
-
         return iteration_data
 
     def send_to_telegram(self):
         try:
-            if self.data_list:
-                df = pd.concat(self.data_list, ignore_index=True)
-
-                csv_buffer = io.BytesIO()
-                df.to_csv(csv_buffer, index=False, encoding='utf-8')
-                csv_buffer.seek(0)
-
-                file_name = f"bitpin_order_book_{self.token}_{datetime.now(pytz.utc).strftime('%Y-%m-%d')}.csv"
-                self.telegram_bot.send_document(
-                    chat_id=self.telegram_chat_id,
-                    document=csv_buffer,
-                    filename=file_name
-                )
+            if self.exporter.export(f"bitpin_order_book_{self.token}", self.store, str(self.current_date)):
                 print(f"Data sent to Telegram for {self.token}.")
+            self.store.compact()
 
         except Exception as e:
             print(f"Failed to send data to Telegram: {e}")
 
-    def start(self):
-        while True:
-            try:
-                now = datetime.now(pytz.utc)
-
-                if now.second % 15 == 0:
-                    if now.date() != self.current_date:
-                        print(f"New day detected: {now.date()}. Resetting data.")
-                        self.current_date = now.date()
-                        self.data_list = []
-
-                    data = self.fetch_orderbook()
-                    if data:
-                        iteration_data = self.process_orderbook(data)
-                        self.data_list.append(iteration_data)
-
-                    if now.minute == 59 and now.second >= (60 - self.interval_seconds):
-                        self.send_to_telegram()
-
-                time.sleep(1)
-            except Exception as e:
-                print(f"An error occurred for {self.token}: {e}")
-                time.sleep(1)
-
+    def send_daily_to_telegram(self):
+        try:
+            if self.exporter.export_daily(f"bitpin_order_book_{self.token}", self.store, str(self.current_date)):
+                print(f"Daily data sent to Telegram for {self.token}.")
 
-class OrderBookManagerBitpin:
-    def __init__(self, collectors):
-        self.collectors = collectors
+        except Exception as e:
+            print(f"Failed to send daily data to Telegram: {e}")
 
-    def start(self):
-        threads = []
+    def save_daily_slippage(self):
         try:
-            for collector in self.collectors:
-                thread = Thread(target=collector.start)
-                threads.append(thread)
-                thread.start()
-
-            for thread in threads:
-                thread.join()
-        except KeyboardInterrupt:
-            print("Data collection interrupted by user.")
+            self.storage.write("bitpin", f"{self.token}_slippage", store_slippage_frame(self.store),
+                               date=str(self.current_date))
+        except Exception as e:
+            print(f"Failed to save daily slippage for {self.token}: {e}")
+
+    def restore(self):
+        if self.store.restore():
+            self.current_date = datetime.fromtimestamp(self.store.last_ingest_time(), pytz.utc).date()
+            print(f"Restored {len(self.store)} rows for {self.token} from the write-ahead log.")
+
+    def __getstate__(self):
+        # Only configuration crosses into the analytics process pool, never the store or the bot.
+        return {'url': self.url, 'token': self.token}
+
+    def prepare(self, now, data):
+        if now.date() != self.current_date:
+            print(f"New day detected: {now.date()}. Resetting data.")
+            self.save_daily_slippage()
+            self.send_daily_to_telegram()
+            self.current_date = now.date()
+            self.store.clear()
+
+        return (data,)
+
+    def analyze(self, data):
+        if data:
+            with stage_timer("bitpin", 'parse'):
+                return self.process_orderbook(data)
+        return None
+
+    def complete(self, now, iteration_data):
+        if iteration_data is not None:
+            self.save_data(iteration_data, "bitpin", self.token)
+        if self.consolidated_book is not None:
+            self.consolidated_book.update_frame("bitpin", iteration_data)
+        self.store.append_frame(iteration_data)
+        self.rolling_stats.update_frame(iteration_data, now.timestamp())
+        if self.rollups is not None:
+            self.rollups.update_frame(iteration_data, now.timestamp())
+
+        if is_last_tick_of_hour(now, self.interval_seconds):
+            self.send_to_telegram()
+
+    def run_iteration(self, now, data):
+        self.complete(now, self.analyze(*self.prepare(now, data)))
@@ -0,0 +1,98 @@
+from datetime import datetime
+from threading import Lock
+import atexit
+import glob
+import gzip
+import json
+import os
+import time
+import zlib
+import pytz
+
+
+class CaptureRecorder:
+    def __init__(self, directory, flush_seconds=1.0):
+        # One gzipped JSON line per response, in hourly files so a day of captures can be replayed piecewise.
+        # The gzip stream is sync-flushed at most every flush_seconds, so a crash loses at most that much.
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.lock = Lock()
+        self.file = None
+        self.hour = None
+        self.last_flush = time.monotonic()
+
+    def path(self, hour):
+        return os.path.join(self.directory, f"capture-{hour}-{os.getpid()}.jsonl.gz")
+
+    def record(self, url, status, body, received_at=None):
+        received_at = time.time() if received_at is None else received_at
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', errors='replace')
+        line = json.dumps({'received_at': received_at, 'url': url, 'status': status, 'body': body}) + '\n'
+        hour = datetime.fromtimestamp(received_at, pytz.utc).strftime('%Y%m%d%H')
+
+        with self.lock:
+            if hour != self.hour:
+                self.close_file()
+                os.makedirs(self.directory, exist_ok=True)
+                self.file = gzip.open(self.path(hour), 'at')
+                self.hour = hour
+            self.file.write(line)
+            now = time.monotonic()
+            if now - self.last_flush >= self.flush_seconds:
+                self.file.flush()
+                self.last_flush = now
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        with self.lock:
+            self.close_file()
+
+
+def capture_files(directory):
+    return sorted(glob.glob(os.path.join(directory, "capture-*.jsonl.gz")))
+
+
+def read_capture(paths):
+    # Records from every file, ordered by receive time. A file cut off mid-write keeps its complete lines.
+    records = []
+    for path in paths:
+        try:
+            with gzip.open(path, 'rt') as source:
+                for line in source:
+                    if line.endswith('\n'):
+                        records.append(json.loads(line))
+        except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+            print(f"Capture file {path} is truncated ({e}); keeping {len(records)} records read so far.")
+    records.sort(key=lambda record: record['received_at'])
+    return records
+
+
+RECORDER = None
+RECORDER_LOCK = Lock()
+
+
+def get_recorder():
+    # CAPTURE_DIR turns capture on for every fetch in the process; unset means no recording.
+    global RECORDER
+    directory = os.getenv("CAPTURE_DIR")
+    if not directory:
+        return None
+    with RECORDER_LOCK:
+        if RECORDER is None:
+            RECORDER = CaptureRecorder(directory, flush_seconds=float(os.getenv("CAPTURE_FLUSH_SECONDS", "1.0")))
+            atexit.register(RECORDER.close)
+        return RECORDER
+
+
+def record_response(url, status, body):
+    recorder = get_recorder()
+    if recorder is not None:
+        try:
+            recorder.record(url, status, body)
+        except Exception as e:
+            print(f"Failed to record response from {url}: {e}")
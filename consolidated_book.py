@@ -0,0 +1,197 @@
+from datetime import datetime
+from threading import Lock
+import heapq
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+import pytz
+from metrics import stage_timer
+from order_book_arrays import DEFAULT_PERCENTAGES, OrderBookArrays
+from snapshot_store import SnapshotStore
+from snapshot_wal import open_wal
+from tick_scheduler import is_last_tick_of_hour
+
+
+CONSOLIDATED_COLUMNS = [
+    ('Item', 'symbol'),
+    ('Timestamp', 'f8'),
+    ('DateTime', 'datetime'),
+    ('Date', 'date'),
+    ('Best_Bid_Price', 'f8'),
+    ('Best_Bid_Venue', 'symbol'),
+    ('Best_Ask_Price', 'f8'),
+    ('Best_Ask_Venue', 'symbol'),
+    ('Reference_Price', 'f8'),
+    ('Arbitrage_Spread', 'f8'),
+    ('Arbitrage_Spread_Bps', 'f8'),
+    ('Venue_Count', 'f8'),
+    ('Stale_Venue_Count', 'f8'),
+] + [(f'Total_{side}_Volume_{percentage}', 'f8') for percentage in DEFAULT_PERCENTAGES for side in ('Bid', 'Ask')]
+
+
+def normalize_asset(symbol):
+    # BTCUSDT, BTC-USDT, BTC_USDT and btc/usdt all name the same market.
+    return re.sub(r'[-_/ ]', '', str(symbol)).upper()
+
+
+class ConsolidatedBook:
+    def __init__(self, max_age_seconds=None, min_venues=2, percentages=DEFAULT_PERCENTAGES, exporter=None,
+                 interval_seconds=15):
+        # books[asset][venue] = (received_at, bids best-first, asks best-first) with levels as (price, volume).
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("CONSOLIDATED_MAX_AGE_SECONDS", "30"))
+        self.max_age_seconds = max_age_seconds
+        self.min_venues = min_venues
+        self.percentages = list(percentages)
+        self.exporter = exporter
+        self.interval_seconds = interval_seconds
+
+        self.lock = Lock()
+        self.books = {}
+        self.cache = {}
+        self.store = SnapshotStore(CONSOLIDATED_COLUMNS, wal=open_wal("consolidated_book"))
+        self.current_date = None
+
+    def update(self, venue, symbol, bids, asks, received_at=None):
+        asset = normalize_asset(symbol)
+        received_at = received_at if received_at is not None else time.time()
+        with self.lock:
+            self.books.setdefault(asset, {})[venue] = (received_at, bids, asks)
+            self.cache.pop(asset, None)
+
+    def touch(self, venue, symbols, received_at=None):
+        # Markets a venue reported as unchanged keep their book but count as fresh.
+        received_at = received_at if received_at is not None else time.time()
+        with self.lock:
+            for symbol in symbols:
+                asset = normalize_asset(symbol)
+                book = self.books.get(asset, {}).get(venue)
+                if book is not None:
+                    self.books[asset][venue] = (received_at, book[1], book[2])
+
+    def update_frame(self, venue, df, received_at=None):
+        # Per-level frames as produced by the Binance/OKX/CoinEx/Bitpin collectors: every level of every
+        # side goes into the merge, not just the touch.
+        if df is None or df.empty:
+            return
+        self.update_arrays(venue, OrderBookArrays.from_frame(df), received_at)
+
+    def update_arrays(self, venue, arrays, received_at=None):
+        # OrderBookArrays levels are already best-first per market.
+        for index, symbol in enumerate(arrays.items):
+            bid_slice = slice(arrays.bid_offsets[index], arrays.bid_offsets[index + 1])
+            ask_slice = slice(arrays.ask_offsets[index], arrays.ask_offsets[index + 1])
+            self.update(venue, symbol,
+                        list(zip(arrays.bid_prices[bid_slice].tolist(), arrays.bid_volumes[bid_slice].tolist())),
+                        list(zip(arrays.ask_prices[ask_slice].tolist(), arrays.ask_volumes[ask_slice].tolist())),
+                        received_at)
+
+    def fresh_venues(self, asset, now):
+        venues = self.books.get(asset, {})
+        fresh = {venue: book for venue, book in venues.items() if now - book[0] <= self.max_age_seconds}
+        return fresh, len(venues) - len(fresh)
+
+    def merged_levels(self, fresh):
+        # Each venue's side is already sorted, so a k-way heap merge is O(levels * log venues).
+        bids = list(heapq.merge(*[[(-price, volume, venue) for price, volume in book[1]]
+                                  for venue, book in fresh.items()]))
+        asks = list(heapq.merge(*[[(price, volume, venue) for price, volume in book[2]]
+                                  for venue, book in fresh.items()]))
+        return [(-price, volume, venue) for price, volume, venue in bids], asks
+
+    def band_depth(self, levels, reference_price, is_bid):
+        if not levels or np.isnan(reference_price):
+            return [0.0] * len(self.percentages)
+        prices = np.fromiter((level[0] for level in levels), dtype=np.float64, count=len(levels))
+        cumulative = np.cumsum(np.fromiter((level[1] for level in levels), dtype=np.float64, count=len(levels)))
+        bands = np.asarray(self.percentages, dtype=np.float64) / 100.0
+        if is_bid:
+            ends = np.searchsorted(-prices, -(reference_price * (1 - bands)), side='right')
+        else:
+            ends = np.searchsorted(prices, reference_price * (1 + bands), side='right')
+        # A 0% band is reported as the volume at the touch, as in OrderBookArrays.side_depth.
+        ends = np.where(bands == 0, np.maximum(ends, 1), ends)
+        return [float(cumulative[end - 1]) if end else 0.0 for end in ends]
+
+    def consolidate(self, asset, now):
+        fresh, stale_count = self.fresh_venues(asset, now)
+        key = tuple(sorted(fresh))
+        cached = self.cache.get(asset)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        bids, asks = self.merged_levels(fresh)
+        best_bid, best_bid_venue = (bids[0][0], bids[0][2]) if bids else (np.nan, '')
+        best_ask, best_ask_venue = (asks[0][0], asks[0][2]) if asks else (np.nan, '')
+        reference_price = (best_bid + best_ask) / 2
+
+        row = {
+            'Item': asset,
+            'Best_Bid_Price': best_bid,
+            'Best_Bid_Venue': best_bid_venue,
+            'Best_Ask_Price': best_ask,
+            'Best_Ask_Venue': best_ask_venue,
+            'Reference_Price': reference_price,
+            # Positive when one venue's bid is above another venue's ask.
+            'Arbitrage_Spread': best_bid - best_ask,
+            'Arbitrage_Spread_Bps': (best_bid - best_ask) / reference_price * 10_000,
+            'Venue_Count': len(fresh),
+            'Stale_Venue_Count': stale_count,
+        }
+        for percentage, bid_depth, ask_depth in zip(self.percentages,
+                                                    self.band_depth(bids, reference_price, True),
+                                                    self.band_depth(asks, reference_price, False)):
+            row[f'Total_Bid_Volume_{percentage}'] = bid_depth
+            row[f'Total_Ask_Volume_{percentage}'] = ask_depth
+
+        self.cache[asset] = (key, row)
+        return row
+
+    def tick(self, now):
+        timestamp = now.timestamp()
+        with self.lock:
+            rows = [
+                dict(self.consolidate(asset, timestamp), Timestamp=timestamp)
+                for asset in self.books
+                if len(self.books[asset]) >= self.min_venues
+            ]
+        return pd.DataFrame(rows)
+
+    def send_to_telegram(self):
+        try:
+            if self.exporter is not None:
+                self.exporter.export("consolidated_book", self.store, str(self.current_date))
+            self.store.compact()
+
+        except Exception as e:
+            print(f"Failed to send consolidated book to Telegram: {e}")
+
+    def send_daily_to_telegram(self):
+        try:
+            if self.exporter is not None:
+                self.exporter.export_daily("consolidated_book", self.store, str(self.current_date))
+
+        except Exception as e:
+            print(f"Failed to send daily consolidated book to Telegram: {e}")
+
+    def restore(self):
+        if self.store.restore():
+            self.current_date = datetime.fromtimestamp(self.store.last_ingest_time(), pytz.utc).date()
+
+    def run_iteration(self, now):
+        if self.current_date is None:
+            self.current_date = now.date()
+        if now.date() != self.current_date:
+            self.send_daily_to_telegram()
+            self.current_date = now.date()
+            self.store.clear()
+
+        with stage_timer("consolidated", 'consolidate'):
+            consolidated = self.tick(now)
+        self.store.append_frame(consolidated)
+
+        if is_last_tick_of_hour(now, self.interval_seconds):
+            self.send_to_telegram()
+        return consolidated
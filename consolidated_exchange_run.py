@@ -0,0 +1,27 @@
+from async_engine import AsyncCollectionEngine
+from consolidated_book import ConsolidatedBook
+from symbol_universe import concurrency_caps, raise_open_file_limit
+from telegram_export import TelegramExporter, create_bot
+from international_exchange_run import (TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TICK_INTERVAL_SECONDS, UNIVERSE,
+                                        binance_collectors, coinex_collectors, okx_collectors)
+from local_exchange_run import bitpin_collectors, nobitex_collectors, wallex_collectors
+
+
+# Run all six exchanges on one event loop and merge their books into one consolidated book per asset
+def main():
+    raise_open_file_limit()
+    consolidated_book = ConsolidatedBook(
+        exporter=TelegramExporter(create_bot(TELEGRAM_BOT_TOKEN), TELEGRAM_CHAT_ID),
+        interval_seconds=TICK_INTERVAL_SECONDS
+    )
+    engine = AsyncCollectionEngine(
+        binance_collectors() + coinex_collectors() + okx_collectors() +
+        bitpin_collectors() + nobitex_collectors() + wallex_collectors(),
+        interval_seconds=TICK_INTERVAL_SECONDS,
+        consolidated_book=consolidated_book,
+        concurrency_caps=concurrency_caps(UNIVERSE)
+    )
+    engine.start()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import pandas as pd
+import pyarrow.parquet as pq
+from storage import arrow_table
+
+
+CSV_EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst')
+# order_book_<exchange>_<symbol>_<date>.csv from CsvStorage, and the Telegram exports
+# <exchange>_order_book_<symbol>_<date>[_HHMM|_daily] and <exchange>_<table>_<date>[_HHMM|_daily].
+FILE_NAMES = [
+    re.compile(r'^order_book_(?P<exchange>[a-z0-9]+)_(?P<symbol>.+)_(?P<date>\d{4}-\d{2}-\d{2})(?P<part>)$'),
+    re.compile(r'^(?P<exchange>[a-z0-9]+)_order_book_(?P<symbol>.+?)_(?P<date>\d{4}-\d{2}-\d{2})(?:_(?P<part>\d{4}|daily))?$'),
+    re.compile(r'^(?P<exchange>[a-z0-9]+)_(?P<symbol>.+?)_(?P<date>\d{4}-\d{2}-\d{2})(?:_(?P<part>\d{4}|daily))?$'),
+]
+MANIFEST_NAME = '_manifest.jsonl'
+
+
+def parse_name(path):
+    name = os.path.basename(path)
+    for extension in CSV_EXTENSIONS:
+        if name.endswith(extension):
+            stem = name[:-len(extension)]
+            break
+    else:
+        return None
+    for pattern in FILE_NAMES:
+        match = pattern.match(stem)
+        if match:
+            return match['exchange'], match['symbol'], match['date'], match['part'] or ''
+    return None
+
+
+def scan(directory, output):
+    # Every CSV under directory whose name says which exchange, symbol and day it holds. A Telegram
+    # _daily file repeats that day's _HHMM deltas, so the deltas are skipped when the daily file exists.
+    files = []
+    unrecognized = 0
+    output = os.path.abspath(output)
+    for root, directories, names in os.walk(directory):
+        if os.path.abspath(root).startswith(output):
+            directories[:] = []
+            continue
+        for name in names:
+            if not name.endswith(CSV_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            parsed = parse_name(path)
+            if parsed is None:
+                unrecognized += 1
+            else:
+                files.append((path,) + parsed)
+
+    daily = {(exchange, symbol, date) for _, exchange, symbol, date, part in files if part == 'daily'}
+    selected = [entry for entry in files
+                if entry[4] in ('', 'daily') or (entry[1], entry[2], entry[3]) not in daily]
+    return sorted(selected), unrecognized, len(files) - len(selected)
+
+
+def normalize(df):
+    # Index columns left by to_csv(index=True) are dropped, names trimmed, Timestamp derived from DateTime
+    # when missing, and text columns kept as strings; arrow_table types the rest.
+    df = df.rename(columns=lambda name: str(name).strip())
+    df = df.loc[:, [not name.startswith('Unnamed:') for name in df.columns]]
+    df = df.loc[:, ~df.columns.duplicated()]
+    if 'Timestamp' not in df.columns and 'DateTime' in df.columns:
+        datetimes = pd.to_datetime(df['DateTime'], utc=True, errors='coerce')
+        df = df.assign(Timestamp=(datetimes.astype('int64') // 1_000_000).where(datetimes.notna()))
+
+    string_columns = []
+    for name in df.columns:
+        if name in ('Timestamp', 'DateTime', 'Date'):
+            continue
+        values = df[name]
+        if values.dtype == object and pd.to_numeric(values, errors='coerce').isna().sum() > values.isna().sum():
+            string_columns.append(name)
+    return df, tuple(string_columns)
+
+
+def output_path(output, source, exchange, symbol, date):
+    # Named after the source file so a rerun overwrites its own part instead of adding a duplicate.
+    digest = hashlib.sha1(os.path.abspath(source).encode()).hexdigest()[:16]
+    return os.path.join(output, f"exchange={exchange}", f"symbol={symbol}", f"date={date}", f"part-{digest}.parquet")
+
+
+def convert_file(task):
+    path, exchange, symbol, date, output, compression, row_group_rows = task
+    started = time.perf_counter()
+    result = {'source': path, 'size': os.path.getsize(path), 'mtime': os.path.getmtime(path)}
+    try:
+        df, string_columns = normalize(pd.read_csv(path, low_memory=False))
+        target = output_path(output, path, exchange, symbol, date)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temporary_path = f"{target}.tmp"
+        pq.write_table(arrow_table(df, string_columns=string_columns), temporary_path, compression=compression,
+                       row_group_size=row_group_rows)
+        os.replace(temporary_path, target)
+        result.update(status='done', output=target, rows=len(df), output_size=os.path.getsize(target))
+    except Exception as e:
+        result.update(status='error', error=f"{type(e).__name__}: {e}", rows=0)
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def convert_batch(tasks):
+    return [convert_file(task) for task in tasks]
+
+
+def load_manifest(path):
+    # The latest record per source wins; a source is done while its size and mtime are unchanged.
+    done = {}
+    try:
+        with open(path) as manifest:
+            for line in manifest:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[record['source']] = record
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def is_converted(record, path):
+    return (record is not None and record.get('status') == 'done'
+            and record.get('size') == os.path.getsize(path) and record.get('mtime') == os.path.getmtime(path)
+            and os.path.exists(record.get('output', '')))
+
+
+def format_rate(value):
+    for unit in ('', 'k', 'M', 'G'):
+        if abs(value) < 1000:
+            return f"{value:.1f}{unit}"
+        value /= 1000
+    return f"{value:.1f}T"
+
+
+class Progress:
+    def __init__(self, total_files, total_bytes, interval=2.0):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.printed = self.started
+        self.files = self.bytes = self.rows = self.output_bytes = self.errors = 0
+
+    def add(self, result):
+        self.files += 1
+        self.bytes += result['size']
+        self.rows += result['rows']
+        self.output_bytes += result.get('output_size', 0)
+        self.errors += result['status'] != 'done'
+        if time.perf_counter() - self.printed >= self.interval:
+            self.print()
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        rate = self.bytes / elapsed
+        eta = (self.total_bytes - self.bytes) / rate if rate else 0
+        return (f"{self.files}/{self.total_files} files, {self.files / elapsed:.1f} files/s, "
+                f"{rate / 1024 / 1024:.1f} MB/s, {format_rate(self.rows / elapsed)} rows/s, "
+                f"{self.errors} errors, ETA {eta:.0f}s")
+
+    def print(self):
+        self.printed = time.perf_counter()
+        print(self.line(), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert collector and Telegram CSV files into typed, zstd-compressed Parquet partitions "
+                    "(exchange=/symbol=/date=) that ArrowStorage and history_query read.")
+    parser.add_argument('directory', help="Directory tree to scan for CSV, CSV.gz and CSV.zst files")
+    parser.add_argument('output', help="Output root; the manifest is kept here as _manifest.jsonl")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=16, help="Files handed to a worker at a time")
+    parser.add_argument('--compression', default='zstd')
+    parser.add_argument('--row-group-rows', type=int, default=int(os.getenv("STORAGE_ROW_GROUP_ROWS", "10000")))
+    parser.add_argument('--retry-errors', action='store_true', help="Also redo files that failed before")
+    parser.add_argument('--progress-seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    files, unrecognized, superseded = scan(args.directory, args.output)
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    pending = []
+    skipped = 0
+    for path, exchange, symbol, date, part in files:
+        record = manifest.get(path)
+        if is_converted(record, path) or (record is not None and record.get('status') == 'error'
+                                          and not args.retry_errors and record.get('size') == os.path.getsize(path)):
+            skipped += 1
+            continue
+        pending.append((path, exchange, symbol, date, args.output, args.compression, args.row_group_rows))
+    print(f"Found {len(files) + superseded} files in {time.perf_counter() - started:.1f}s: {len(pending)} to convert, "
+          f"{skipped} already in the manifest, {superseded} superseded by daily files, "
+          f"{unrecognized} with unrecognized names.")
+    if not pending:
+        return
+
+    # Larger files first so one big file does not finish alone at the end.
+    pending.sort(key=lambda task: -os.path.getsize(task[0]))
+    batches = [pending[index:index + args.batch_size] for index in range(0, len(pending), args.batch_size)]
+    progress = Progress(len(pending), sum(os.path.getsize(task[0]) for task in pending), args.progress_seconds)
+    with open(manifest_path, 'a') as manifest_file, ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(convert_batch, batch) for batch in batches]
+        try:
+            for future in as_completed(futures):
+                for result in future.result():
+                    manifest_file.write(json.dumps(result) + '\n')
+                    if result['status'] != 'done':
+                        print(f"Failed to convert {result['source']}: {result['error']}")
+                    progress.add(result)
+                manifest_file.flush()
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("Interrupted; rerun the same command to resume.")
+            raise
+
+    progress.print()
+    ratio = progress.bytes / progress.output_bytes if progress.output_bytes else float('nan')
+    print(f"Converted {progress.files - progress.errors} files ({format_rate(progress.rows)} rows) in "
+          f"{time.perf_counter() - progress.started:.1f}s; output is {ratio:.1f}x smaller than the CSV input.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+from threading import Lock
+import io
+import os
+import struct
+import tempfile
+import zlib
+import numpy as np
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAGIC = b'OBDELTA1'
+# first timestamp (ms), last timestamp (ms), frame count, payload bytes, payload codec
+BLOCK_HEADER = struct.Struct('<qqIIB')
+ARRAY_HEADER = struct.Struct('<cI')
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+MAX_DECIMALS = 12
+INTEGER_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def decimals(values):
+    # Smallest number of decimal places that represents every value exactly; exchange prices and
+    # volumes are decimal strings, so this is lossless for them. Capped so scaled values fit int64.
+    values = np.abs(values[np.isfinite(values)])
+    if not len(values):
+        return 0
+    limit = MAX_DECIMALS
+    largest = float(values.max())
+    if largest > 0:
+        limit = max(0, min(limit, int(np.floor(np.log10(2 ** 62 / largest)))))
+    for places in range(limit + 1):
+        scaled = values * 10 ** places
+        if np.all(np.abs(scaled - np.round(scaled)) <= 1e-7 + scaled * 1e-12):
+            return places
+    return limit
+
+
+def scale(values, places):
+    return np.round(values * 10 ** places).astype(np.int64)
+
+
+def unscale(values, places):
+    # Dividing by an exact power of ten returns the same double as parsing the decimal string.
+    return values / 10 ** places
+
+
+def clean_side(prices, volumes):
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    valid = np.isfinite(prices) & np.isfinite(volumes) & (prices > 0) & (volumes > 0)
+    prices, volumes = prices[valid], volumes[valid]
+    prices, first = np.unique(prices, return_index=True)
+    return prices, volumes[first]
+
+
+def side_changes(previous_prices, previous_volumes, prices, volumes):
+    # Inserts and updates carry the new volume, deletes carry volume 0; all sorted by price.
+    same, previous_index, index = np.intersect1d(previous_prices, prices, assume_unique=True, return_indices=True)
+    changed = np.ones(len(prices), dtype=bool)
+    changed[index[previous_volumes[previous_index] == volumes[index]]] = False
+    deleted = np.setdiff1d(previous_prices, prices, assume_unique=True)
+
+    change_prices = np.concatenate((prices[changed], deleted))
+    change_volumes = np.concatenate((volumes[changed], np.zeros(len(deleted), dtype=np.int64)))
+    order = np.argsort(change_prices, kind='stable')
+    return change_prices[order], change_volumes[order]
+
+
+def apply_changes(prices, volumes, change_prices, change_volumes):
+    keep = ~np.isin(prices, change_prices, assume_unique=True)
+    inserted = change_volumes > 0
+    prices = np.concatenate((prices[keep], change_prices[inserted]))
+    volumes = np.concatenate((volumes[keep], change_volumes[inserted]))
+    order = np.argsort(prices, kind='stable')
+    return prices[order], volumes[order]
+
+
+def pack_arrays(arrays):
+    # Each array is stored in the narrowest integer type that holds it; the block is compressed as a whole.
+    parts = []
+    for values in arrays:
+        values = np.asarray(values, dtype=np.int64)
+        low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+        dtype = next(dtype for dtype in INTEGER_TYPES
+                     if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max)
+        parts.append(ARRAY_HEADER.pack(np.dtype(dtype).char.encode(), len(values)))
+        parts.append(values.astype(dtype).astype(np.dtype(dtype).newbyteorder('<')).tobytes())
+    return b''.join(parts)
+
+
+def unpack_arrays(payload):
+    arrays = []
+    position = 0
+    while position < len(payload):
+        char, count = ARRAY_HEADER.unpack_from(payload, position)
+        position += ARRAY_HEADER.size
+        dtype = np.dtype(char.decode()).newbyteorder('<')
+        arrays.append(np.frombuffer(payload, dtype=dtype, count=count, offset=position).astype(np.int64))
+        position += count * dtype.itemsize
+    return arrays
+
+
+def segment_offsets(counts):
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def segment_cumsum(deltas, offsets):
+    total = np.cumsum(deltas)
+    before = np.concatenate(([0], total))[offsets[:-1]]
+    return total - np.repeat(before, np.diff(offsets))
+
+
+def tail_path(path):
+    return f"{path}.tail"
+
+
+def read_headers(source, name):
+    # (first, last, frames, offset, length, codec) of every complete block in a binary file object.
+    if source.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{name} is not a delta-encoded order book file.")
+    size = source.seek(0, os.SEEK_END)
+    source.seek(len(MAGIC))
+    blocks = []
+    while True:
+        header = source.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            break
+        first, last, frames, length, codec = BLOCK_HEADER.unpack(header)
+        offset = source.tell()
+        if offset + length > size:
+            print(f"{name} ends with a truncated block; ignoring it.")
+            break
+        blocks.append((first, last, frames, offset, length, codec))
+        source.seek(length, os.SEEK_CUR)
+    return blocks
+
+
+def tail_is_sealed(path, tail):
+    # The writer may stop between sealing a block and removing its tail; the block is then the
+    # last one in path, byte for byte.
+    if not os.path.exists(path):
+        return False
+    block = tail[len(MAGIC):]
+    with open(path, 'rb') as source:
+        size = os.fstat(source.fileno()).st_size
+        if size < len(MAGIC) + len(block):
+            return False
+        source.seek(size - len(block))
+        return source.read() == block
+
+
+class DeltaEncoder:
+    def __init__(self, path, keyframe_interval=240, compression_level=6):
+        # Snapshots of one book are written in blocks: a keyframe with every level followed by up to
+        # keyframe_interval - 1 frames holding only the levels inserted, updated or deleted since the
+        # previous snapshot. Prices are integer ticks (10^-decimals) relative to the keyframe's best bid,
+        # consecutive levels as tick differences. Blocks are independent and only appended, so a reader
+        # seeks to a keyframe without decoding what came before and a restart simply starts a new block.
+        # The open block is kept durable in a sidecar (see write_tail) until it is sealed into path.
+        self.path = path
+        self.tail_path = tail_path(path)
+        self.keyframe_interval = keyframe_interval
+        self.compression_level = compression_level
+        self.frames = []
+        self.previous = None
+        self.price_decimals = 0
+        self.volume_decimals = 0
+        self.reference = 0
+        self.last_timestamp = None
+        self.seal_tail()
+
+    def seal_tail(self):
+        # A tail left by a process that stopped mid-block is appended as a block of its own.
+        if not os.path.exists(self.tail_path):
+            return
+        with open(self.tail_path, 'rb') as source:
+            tail = source.read()
+        if len(tail) > len(MAGIC) and not tail_is_sealed(self.path, tail):
+            self.append_block(tail[len(MAGIC):])
+        os.remove(self.tail_path)
+
+    def append(self, timestamp_ms, bid_prices, bid_volumes, ask_prices, ask_volumes):
+        timestamp_ms = int(timestamp_ms)
+        if self.last_timestamp is not None and timestamp_ms < self.last_timestamp:
+            raise ValueError(f"Snapshot at {timestamp_ms} is older than the last one at {self.last_timestamp}.")
+
+        sides = [clean_side(bid_prices, bid_volumes), clean_side(ask_prices, ask_volumes)]
+        price_decimals = max(self.price_decimals, decimals(np.concatenate([prices for prices, _ in sides])))
+        volume_decimals = max(self.volume_decimals, decimals(np.concatenate([volumes for _, volumes in sides])))
+        if (len(self.frames) >= self.keyframe_interval or price_decimals != self.price_decimals
+                or volume_decimals != self.volume_decimals):
+            self.flush()
+            self.price_decimals, self.volume_decimals = price_decimals, volume_decimals
+
+        scaled = [(scale(prices, price_decimals), scale(volumes, volume_decimals)) for prices, volumes in sides]
+        if not self.frames:
+            bids, asks = scaled
+            self.reference = int(bids[0][-1]) if len(bids[0]) else int(asks[0][0]) if len(asks[0]) else 0
+            changes = scaled
+        else:
+            changes = [side_changes(*previous, *current) for previous, current in zip(self.previous, scaled)]
+
+        self.frames.append((timestamp_ms, changes))
+        self.previous = scaled
+        self.last_timestamp = timestamp_ms
+
+    def encode_block(self):
+        timestamps = np.fromiter((timestamp for timestamp, _ in self.frames), dtype=np.int64, count=len(self.frames))
+        counts = []
+        price_deltas = []
+        volumes = []
+        for _, changes in self.frames:
+            for prices, side_volumes in changes:
+                counts.append(len(prices))
+                price_deltas.append(np.diff(prices - self.reference, prepend=0))
+                volumes.append(side_volumes)
+
+        payload = pack_arrays([
+            [self.price_decimals, self.volume_decimals, self.reference],
+            np.diff(timestamps, prepend=timestamps[0]),
+            counts,
+            np.concatenate(price_deltas),
+            np.concatenate(volumes),
+        ])
+        if zstandard is not None:
+            codec, payload = CODEC_ZSTD, zstandard.ZstdCompressor(level=self.compression_level).compress(payload)
+        else:
+            codec, payload = CODEC_ZLIB, zlib.compress(payload, self.compression_level)
+        return BLOCK_HEADER.pack(int(timestamps[0]), int(timestamps[-1]), len(self.frames), len(payload), codec) + payload
+
+    def append_block(self, block):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'ab') as target:
+            if target.tell() == 0:
+                target.write(MAGIC)
+            target.write(block)
+
+    def write_tail(self):
+        # Rewrites the open block, compressed as it will be sealed, next to path and swaps it in
+        # atomically; a crash then loses no frame that was written, and the block keeps its ratio.
+        if not self.frames:
+            return
+        self.append_block(b'')
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(self.path) or '.',
+                                         prefix=f"{os.path.basename(self.path)}.", suffix='.tmp',
+                                         delete=False) as target:
+            target.write(MAGIC + self.encode_block())
+        os.replace(target.name, self.tail_path)
+
+    def flush(self):
+        # Seals the open block into path; the tail is removed only once the block is there.
+        if not self.frames:
+            return
+        self.append_block(self.encode_block())
+        if os.path.exists(self.tail_path):
+            os.remove(self.tail_path)
+        self.frames = []
+        self.previous = None
+
+    def close(self):
+        self.flush()
+
+
+class DeltaDecoder:
+    def __init__(self, path):
+        # Only block headers are read up front; a block is decoded when a query first touches it.
+        self.path = path
+        self.lock = Lock()
+        self.cached_block = None
+        # The open block is in the encoder's tail, which the writer swaps at every write, so it is read
+        # once and kept in memory. It is read before path so that a block sealed meanwhile is seen in both.
+        self.tail = b''
+        try:
+            with open(tail_path(path), 'rb') as source:
+                self.tail = source.read()
+        except FileNotFoundError:
+            pass
+        with open(path, 'rb') as source:
+            self.blocks = [block + (False,) for block in read_headers(source, path)]
+        if self.tail and not tail_is_sealed(path, self.tail):
+            self.blocks.extend(block + (True,) for block in read_headers(io.BytesIO(self.tail), tail_path(path)))
+        self.first_timestamps = np.array([block[0] for block in self.blocks], dtype=np.int64)
+        self.last_timestamps = np.array([block[1] for block in self.blocks], dtype=np.int64)
+
+    def __len__(self):
+        return sum(block[2] for block in self.blocks)
+
+    def read_block(self, index):
+        with self.lock:
+            if self.cached_block is not None and self.cached_block[0] == index:
+                return self.cached_block[1]
+
+        first, last, frames, offset, length, codec, in_tail = self.blocks[index]
+        if in_tail:
+            payload = self.tail[offset:offset + length]
+        else:
+            with open(self.path, 'rb') as source:
+                source.seek(offset)
+                payload = source.read(length)
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise ValueError("Decoding this file requires the zstandard package.")
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        else:
+            payload = zlib.decompress(payload)
+
+        scales, timestamp_deltas, counts, price_deltas, volumes = unpack_arrays(payload)
+        price_decimals, volume_decimals, reference = (int(value) for value in scales)
+        offsets = segment_offsets(counts)
+        block = {
+            'price_decimals': price_decimals,
+            'volume_decimals': volume_decimals,
+            'timestamps': first + np.cumsum(timestamp_deltas),
+            'offsets': offsets,
+            'prices': segment_cumsum(price_deltas, offsets) + reference,
+            'volumes': volumes,
+        }
+        with self.lock:
+            self.cached_block = (index, block)
+        return block
+
+    def block_snapshots(self, index, start_ms=None, end_ms=None):
+        # Replays the block from its keyframe and yields the snapshots inside [start_ms, end_ms].
+        block = self.read_block(index)
+        timestamps, offsets = block['timestamps'], block['offsets']
+        stop = len(timestamps) if end_ms is None else int(np.searchsorted(timestamps, end_ms, side='right'))
+        first_wanted = 0 if start_ms is None else int(np.searchsorted(timestamps, start_ms, side='left'))
+        sides = None
+        for frame in range(stop):
+            segments = [(block['prices'][offsets[2 * frame + side]:offsets[2 * frame + side + 1]],
+                         block['volumes'][offsets[2 * frame + side]:offsets[2 * frame + side + 1]])
+                        for side in (0, 1)]
+            if frame == 0:
+                sides = segments
+            else:
+                sides = [apply_changes(*current, *changes) for current, changes in zip(sides, segments)]
+            if frame >= first_wanted:
+                yield self.snapshot(int(timestamps[frame]), sides, block)
+
+    def snapshot(self, timestamp_ms, sides, block):
+        (bid_prices, bid_volumes), (ask_prices, ask_volumes) = sides
+        price_decimals, volume_decimals = block['price_decimals'], block['volume_decimals']
+        return {
+            'timestamp': timestamp_ms,
+            'bid_prices': unscale(bid_prices[::-1], price_decimals),
+            'bid_volumes': unscale(bid_volumes[::-1], volume_decimals),
+            'ask_prices': unscale(ask_prices, price_decimals),
+            'ask_volumes': unscale(ask_volumes, volume_decimals),
+        }
+
+    def snapshot_at(self, timestamp_ms):
+        # The latest snapshot taken at or before timestamp_ms, or None when there is none.
+        index = int(np.searchsorted(self.first_timestamps, timestamp_ms, side='right')) - 1
+        if index < 0:
+            return None
+        block = self.read_block(index)
+        frame = int(np.searchsorted(block['timestamps'], timestamp_ms, side='right')) - 1
+        snapshot = None
+        for snapshot in self.block_snapshots(index, int(block['timestamps'][frame]), int(block['timestamps'][frame])):
+            pass
+        return snapshot
+
+    def snapshots(self, start_ms=None, end_ms=None):
+        for index in range(len(self.blocks)):
+            if start_ms is not None and self.last_timestamps[index] < start_ms:
+                continue
+            if end_ms is not None and self.first_timestamps[index] > end_ms:
+                break
+            yield from self.block_snapshots(index, start_ms, end_ms)
+
+    def to_frame(self, item, start_ms=None, end_ms=None):
+        # Level rows in the collectors' layout: ask and bid level i share a row, the shorter side padded.
+        frames = []
+        for snapshot in self.snapshots(start_ms, end_ms):
+            bid_prices, ask_prices = snapshot['bid_prices'], snapshot['ask_prices']
+            levels = max(len(bid_prices), len(ask_prices))
+
+            def padded(values):
+                return np.concatenate((values, np.full(levels - len(values), np.nan)))
+
+            best_bid = bid_prices[0] if len(bid_prices) else np.nan
+            best_ask = ask_prices[0] if len(ask_prices) else np.nan
+            frames.append(pd.DataFrame({
+                'Item': item,
+                'Timestamp': snapshot['timestamp'],
+                'Ask_Price': padded(ask_prices),
+                'Ask_Volume': padded(snapshot['ask_volumes']),
+                'Bid_Price': padded(bid_prices),
+                'Bid_Volume': padded(snapshot['bid_volumes']),
+                'Total_Ask_Volume': snapshot['ask_volumes'].sum(),
+                'Total_Bid_Volume': snapshot['bid_volumes'].sum(),
+                'Best_Bid_Price': best_bid,
+                'Best_Ask_Price': best_ask,
+                'Spread': best_ask - best_bid,
+                'Reference_Price': np.median(np.concatenate((ask_prices, bid_prices))) if levels else np.nan,
+            }))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
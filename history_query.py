@@ -0,0 +1,315 @@
+from threading import Lock
+import argparse
+import glob
+import io
+import mmap
+import os
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from consolidated_book import normalize_asset
+from delta_codec import DeltaDecoder
+from rollups import read_rollups
+from storage import timestamp_ms
+
+
+CSV_NAME = re.compile(r'order_book_(?P<exchange>[a-z0-9]+)_(?P<symbol>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.csv$')
+PARTITION = re.compile(r'exchange=(?P<exchange>[^/\\]+)[/\\]symbol=(?P<symbol>[^/\\]+)[/\\]date=(?P<date>[\d-]+)$')
+SPREAD_COLUMNS = ['Item', 'Timestamp', 'Best_Bid_Price', 'Best_Ask_Price', 'Spread']
+
+
+def to_ms(value):
+    # None, epoch seconds or milliseconds, ISO strings and datetimes (naive ones are UTC) to epoch ms.
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(timestamp_ms([value])[0])
+    value = pd.Timestamp(value)
+    if value.tzinfo is None:
+        value = value.tz_localize('UTC')
+    return value.value // 1_000_000
+
+
+def ms_date(value):
+    return None if value is None else pd.Timestamp(value, unit='ms').strftime('%Y-%m-%d')
+
+
+def map_file(path):
+    with open(path, 'rb') as source:
+        if os.fstat(source.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CsvIndex:
+    def __init__(self, path):
+        # The sidecar <file>.idx.npz holds each row's timestamp (ms) and byte range. Collectors keep
+        # appending to today's file, so only complete lines are indexed and a grown file is indexed
+        # from where the previous pass stopped.
+        self.path = path
+        self.index_path = f"{path}.idx.npz"
+        self.header = b''
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.starts = np.empty(0, dtype=np.int64)
+        self.ends = np.empty(0, dtype=np.int64)
+        self.indexed_bytes = 0
+        self.lock = Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with np.load(self.index_path) as index:
+                self.header = index['header'].tobytes()
+                self.timestamps, self.starts, self.ends = index['timestamps'], index['starts'], index['ends']
+                self.indexed_bytes = int(index['indexed_bytes'])
+        except (OSError, KeyError, ValueError):
+            return
+        if self.indexed_bytes > os.path.getsize(self.path):
+            # The file was replaced by a shorter one; start over.
+            self.header, self.indexed_bytes = b'', 0
+            self.timestamps = self.starts = self.ends = np.empty(0, dtype=np.int64)
+
+    def save(self):
+        temporary_path = f"{self.index_path}.tmp"
+        try:
+            with open(temporary_path, 'wb') as target:
+                np.savez(target, header=np.frombuffer(self.header, dtype=np.uint8), timestamps=self.timestamps,
+                         starts=self.starts, ends=self.ends, indexed_bytes=self.indexed_bytes)
+            os.replace(temporary_path, self.index_path)
+        except OSError as e:
+            print(f"Could not write the index for {self.path}: {e}")
+
+    def refresh(self):
+        with self.lock:
+            size = os.path.getsize(self.path)
+            if size <= self.indexed_bytes:
+                return
+            mapped = map_file(self.path)
+            if mapped is None:
+                return
+            with mapped:
+                data = np.frombuffer(mapped, dtype=np.uint8, count=size)
+                start = self.indexed_bytes
+                if not self.header:
+                    header_end = mapped.find(b'\n')
+                    if header_end < 0:
+                        return
+                    self.header = mapped[:header_end + 1]
+                    start = header_end + 1
+
+                newlines = np.flatnonzero(data[start:] == 10) + start
+                del data
+                if not len(newlines):
+                    return
+                starts = np.concatenate(([start], newlines[:-1] + 1)).astype(np.int64)
+                ends = (newlines + 1).astype(np.int64)
+                rows = ends - starts > 1
+                starts, ends = starts[rows], ends[rows]
+                columns = pd.read_csv(io.BytesIO(self.header + mapped[start:int(newlines[-1]) + 1]),
+                                      usecols=['Timestamp'])
+
+            if len(columns) != len(starts):
+                raise ValueError(f"{self.path}: found {len(starts)} lines but parsed {len(columns)} rows.")
+            self.timestamps = np.concatenate((self.timestamps, timestamp_ms(columns['Timestamp'])))
+            self.starts = np.concatenate((self.starts, starts))
+            self.ends = np.concatenate((self.ends, ends))
+            self.indexed_bytes = int(newlines[-1]) + 1
+            self.save()
+
+    def read(self, start_ms=None, end_ms=None, columns=None):
+        self.refresh()
+        selected = np.ones(len(self.timestamps), dtype=bool)
+        if start_ms is not None:
+            selected &= self.timestamps >= start_ms
+        if end_ms is not None:
+            selected &= self.timestamps <= end_ms
+        rows = np.flatnonzero(selected)
+        if not self.header:
+            return pd.DataFrame()
+        if not len(rows):
+            return pd.read_csv(io.BytesIO(self.header), usecols=columns)
+
+        # Rows are appended in time order, so a range is usually one run of consecutive lines.
+        breaks = np.flatnonzero(np.diff(rows) != 1)
+        run_starts = rows[np.concatenate(([0], breaks + 1))]
+        run_ends = rows[np.concatenate((breaks, [len(rows) - 1]))]
+        mapped = map_file(self.path)
+        with mapped:
+            chunks = [mapped[self.starts[first]:self.ends[last]] for first, last in zip(run_starts, run_ends)]
+        return pd.read_csv(io.BytesIO(self.header + b''.join(chunks)), usecols=columns)
+
+
+class HistoryQuery:
+    def __init__(self, root='order_book_data'):
+        # Answers time-range queries over everything the storage backends wrote under root: CSV files
+        # through their sidecar indexes, Parquet through its row-group statistics, Arrow streams through
+        # memory-mapped batches and delta files through their block headers. Only partitions whose date
+        # overlaps the query are opened.
+        self.root = root
+        self.lock = Lock()
+        self.csv_indexes = {}
+
+    def partitions(self, exchange=None, symbol=None, start_ms=None, end_ms=None):
+        first_date, last_date = ms_date(start_ms), ms_date(end_ms)
+        found = []
+        for path in glob.glob(os.path.join(self.root, '*', 'order_book_*.csv')):
+            match = CSV_NAME.search(os.path.basename(path))
+            if match:
+                found.append((match['exchange'], match['symbol'], match['date'], [path]))
+        for directory in glob.glob(os.path.join(self.root, 'exchange=*', 'symbol=*', 'date=*')):
+            match = PARTITION.search(directory)
+            paths = sorted(glob.glob(os.path.join(directory, 'part-*.*')) + glob.glob(os.path.join(directory, '*.obd')))
+            if match and paths:
+                found.append((match['exchange'], match['symbol'], match['date'], paths))
+
+        return sorted(
+            (partition for partition in found
+             if (exchange is None or partition[0] == exchange.lower())
+             and (symbol is None or normalize_asset(partition[1]) == normalize_asset(symbol))
+             and (first_date is None or partition[2] >= first_date)
+             and (last_date is None or partition[2] <= last_date)),
+            key=lambda partition: (partition[2], partition[0], partition[1])
+        )
+
+    def csv_index(self, path):
+        with self.lock:
+            index = self.csv_indexes.get(path)
+            if index is None:
+                index = self.csv_indexes[path] = CsvIndex(path)
+            return index
+
+    def read_parquet(self, path, start_ms, end_ms, columns):
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        metadata = parquet_file.metadata
+        timestamp_column = parquet_file.schema_arrow.get_field_index('Timestamp')
+        row_groups = []
+        for index in range(metadata.num_row_groups):
+            statistics = metadata.row_group(index).column(timestamp_column).statistics
+            if statistics is not None and statistics.has_min_max and (
+                    (start_ms is not None and statistics.max < start_ms) or
+                    (end_ms is not None and statistics.min > end_ms)):
+                continue
+            row_groups.append(index)
+        if columns is not None and 'Timestamp' not in columns:
+            columns = list(columns) + ['Timestamp']
+        return self.filter_table(parquet_file.read_row_groups(row_groups, columns=columns), start_ms, end_ms)
+
+    def read_arrow_stream(self, path, start_ms, end_ms, columns):
+        # Stream files have no footer to seek with; batches are memory-mapped, so skipping one is cheap.
+        batches = []
+        with pa.memory_map(path) as source:
+            for batch in ipc.open_stream(source):
+                if columns is not None:
+                    batch = batch.select([name for name in batch.schema.names
+                                          if name in columns or name == 'Timestamp'])
+                batches.append(self.filter_table(pa.Table.from_batches([batch]), start_ms, end_ms))
+        return pa.concat_tables(batches, promote_options='permissive') if batches else None
+
+    def filter_table(self, table, start_ms, end_ms):
+        timestamps = table.column('Timestamp')
+        mask = None
+        if start_ms is not None:
+            mask = pc.greater_equal(timestamps, start_ms)
+        if end_ms is not None:
+            upper = pc.less_equal(timestamps, end_ms)
+            mask = upper if mask is None else pc.and_(mask, upper)
+        return table if mask is None else table.filter(mask)
+
+    def read_partition(self, symbol, paths, start_ms, end_ms, columns):
+        frames = []
+        for path in paths:
+            if path.endswith('.csv'):
+                frame = self.csv_index(path).read(start_ms, end_ms, columns)
+                if 'Timestamp' in frame.columns:
+                    frame['Timestamp'] = timestamp_ms(frame['Timestamp'])
+            elif path.endswith('.obd'):
+                frame = DeltaDecoder(path).to_frame(symbol, start_ms, end_ms)
+            else:
+                table = (self.read_parquet if path.endswith('.parquet') else self.read_arrow_stream)(
+                    path, start_ms, end_ms, columns)
+                frame = table.to_pandas(date_as_object=False) if table is not None else pd.DataFrame()
+            if columns is not None and not frame.empty:
+                frame = frame[[name for name in columns if name in frame.columns]]
+            frames.append(frame)
+        return frames
+
+    def books(self, exchange, symbol, start=None, end=None, columns=None):
+        # Every stored level row of one market between start and end (inclusive), Timestamp in epoch ms.
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        frames = []
+        for _, partition_symbol, _, paths in self.partitions(exchange, symbol, start_ms, end_ms):
+            frames.extend(self.read_partition(partition_symbol, paths, start_ms, end_ms, columns))
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        frame = pd.concat(frames, ignore_index=True)
+        if 'Timestamp' in frame.columns:
+            frame = frame.sort_values('Timestamp', kind='stable', ignore_index=True)
+        return frame
+
+    def spread_series(self, symbol, start=None, end=None, exchanges=None):
+        # One row per stored snapshot of the market on every exchange that has it.
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        frames = []
+        for exchange in sorted({partition[0] for partition in self.partitions(None, symbol, start_ms, end_ms)}):
+            if exchanges is not None and exchange not in exchanges:
+                continue
+            frame = self.books(exchange, symbol, start_ms, end_ms, columns=SPREAD_COLUMNS)
+            if not frame.empty:
+                frame = frame.drop_duplicates('Timestamp')
+                frame.insert(0, 'Exchange', exchange)
+                frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['Exchange'] + SPREAD_COLUMNS)
+        return pd.concat(frames, ignore_index=True).sort_values(['Timestamp', 'Exchange'], ignore_index=True)
+
+    def rollups(self, exchange, resolution='1h', start=None, end=None, symbols=None):
+        # Pre-aggregated OHLC and depth rows (see rollups.py); a day of them is kilobytes.
+        return read_rollups(exchange, resolution, start, end, items=symbols, root=self.root)
+
+    def build_indexes(self, exchange=None, symbol=None):
+        count = 0
+        for _, _, _, paths in self.partitions(exchange, symbol):
+            for path in paths:
+                if path.endswith('.csv'):
+                    self.csv_index(path).refresh()
+                    count += 1
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query stored order books by time range.")
+    parser.add_argument('symbol', nargs='?', help="Market, e.g. BTC-USDT; BTCUSDT and BTC_USDT match too.")
+    parser.add_argument('start', nargs='?', help="UTC start, e.g. 2024-12-29T10:00.")
+    parser.add_argument('end', nargs='?', help="UTC end, inclusive.")
+    parser.add_argument('--exchange', help="Only this exchange; required unless --spread is given.")
+    parser.add_argument('--spread', action='store_true', help="Spread series across exchanges instead of books.")
+    parser.add_argument('--root', default=os.getenv("STORAGE_ROOT", "order_book_data"))
+    parser.add_argument('--build-index', action='store_true', help="Index every CSV file under root and exit.")
+    parser.add_argument('--output', help="Write the result to this CSV file instead of printing it.")
+    args = parser.parse_args()
+
+    query = HistoryQuery(args.root)
+    if args.build_index:
+        print(f"Indexed {query.build_indexes(args.exchange, args.symbol)} CSV files under {args.root}.")
+        return
+    if not args.symbol or (not args.spread and not args.exchange):
+        parser.error("a symbol and --exchange (or --spread) are required")
+
+    if args.spread:
+        result = query.spread_series(args.symbol, args.start, args.end,
+                                     exchanges=[args.exchange] if args.exchange else None)
+    else:
+        result = query.books(args.exchange, args.symbol, args.start, args.end)
+    if args.output:
+        result.to_csv(args.output, index=False)
+    else:
+        print(result.to_string(max_rows=40))
+
+
+if __name__ == '__main__':
+    main()
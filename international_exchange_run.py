@@ -1,9 +1,12 @@
-from threading import Thread
 import os
 from dotenv import load_dotenv
-from binance_orderbook import OrderBookCollectorBinance, OrderBookManagerBinance
-from coinex_orderbook_btc_eth import OrderBookCollectorCoinex, OrderBookManagerCoinex
-from okx_order_book import OrderBookCollectorOKX, OrderBookManagerOKX
+from async_engine import AsyncCollectionEngine
+from binance_depth_stream import BinanceDepthStream
+from binance_orderbook import OrderBookCollectorBinance
+from coinex_orderbook_btc_eth import OrderBookCollectorCoinex
+from okx_books_stream import OKXBooksStream
+from okx_order_book import OrderBookCollectorOKX
+from symbol_universe import concurrency_caps, load_universe, raise_open_file_limit, universe_symbols
 
 # Load environment variables
 load_dotenv()
@@ -11,71 +14,73 @@ load_dotenv()
 # Fetch variables from the environment
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TICK_INTERVAL_SECONDS = float(os.getenv("TICK_INTERVAL_SECONDS", "15"))
+BINANCE_DEPTH_STREAM = os.getenv("BINANCE_DEPTH_STREAM", "false").lower() == "true"
+OKX_BOOKS_STREAM = os.getenv("OKX_BOOKS_STREAM", "false").lower() == "true"
+EXCHANGE_PROXY_URL = os.getenv("EXCHANGE_PROXY_URL", "socks5://127.0.0.1:2080") or None
+UNIVERSE = load_universe()
 
 # Ensure the variables are set
 if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
     raise ValueError("TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID is not set in the environment variables.")
 
-# Define Binance Manager
-def run_binance():
-    binance_btc_collector = OrderBookCollectorBinance(
-        token="BTCUSDT",
-        telegram_bot_token=TELEGRAM_BOT_TOKEN,
-        telegram_chat_id=TELEGRAM_CHAT_ID
-    )
-    binance_eth_collector = OrderBookCollectorBinance(
-        token="ETHUSDT",
-        telegram_bot_token=TELEGRAM_BOT_TOKEN,
-        telegram_chat_id=TELEGRAM_CHAT_ID
-    )
-    binance_manager = OrderBookManagerBinance([binance_btc_collector, binance_eth_collector])
-    binance_manager.start()
+# Define Binance collectors
+def binance_collectors():
+    tokens = universe_symbols(UNIVERSE, "binance")
+    depth_stream = None
+    if BINANCE_DEPTH_STREAM:
+        depth_stream = BinanceDepthStream(tokens, proxy=EXCHANGE_PROXY_URL)
 
-# Define CoinEx Manager
-def run_coinex():
-    coinex_btc_collector = OrderBookCollectorCoinex(
-        token="BTCUSDT",
-        telegram_bot_token=TELEGRAM_BOT_TOKEN,
-        telegram_chat_id=TELEGRAM_CHAT_ID
-    )
-    coinex_eth_collector = OrderBookCollectorCoinex(
-        token="ETHUSDT",
-        telegram_bot_token=TELEGRAM_BOT_TOKEN,
-        telegram_chat_id=TELEGRAM_CHAT_ID
-    )
-    coinex_manager = OrderBookManagerCoinex([coinex_btc_collector, coinex_eth_collector])
-    coinex_manager.start()
-
-# Define OKX Manager
-def run_okx():
-    okx_btc_collector = OrderBookCollectorOKX(
-        token="BTC-USDT",
-        telegram_bot_token=TELEGRAM_BOT_TOKEN,
-        telegram_chat_id=TELEGRAM_CHAT_ID
-    )
-    okx_eth_collector = OrderBookCollectorOKX(
-        token="ETH-USDT",
-        telegram_bot_token=TELEGRAM_BOT_TOKEN,
-        telegram_chat_id=TELEGRAM_CHAT_ID
-    )
-    okx_manager = OrderBookManagerOKX([okx_btc_collector, okx_eth_collector])
-    okx_manager.start()
+    return [
+        OrderBookCollectorBinance(
+            token=token,
+            telegram_bot_token=TELEGRAM_BOT_TOKEN,
+            telegram_chat_id=TELEGRAM_CHAT_ID,
+            interval_seconds=TICK_INTERVAL_SECONDS,
+            depth_stream=depth_stream
+        )
+        for token in tokens
+    ]
 
-# Main function to run all managers concurrently
-def main():
-    threads = [
-        Thread(target=run_binance, name="BinanceThread"),
-        Thread(target=run_coinex, name="CoinExThread"),
-        Thread(target=run_okx, name="OKXThread"),
+# Define CoinEx collectors
+def coinex_collectors():
+    return [
+        OrderBookCollectorCoinex(
+            token=token,
+            telegram_bot_token=TELEGRAM_BOT_TOKEN,
+            telegram_chat_id=TELEGRAM_CHAT_ID,
+            interval_seconds=TICK_INTERVAL_SECONDS
+        )
+        for token in universe_symbols(UNIVERSE, "coinex")
     ]
 
-    # Start all threads
-    for thread in threads:
-        thread.start()
+# Define OKX collectors
+def okx_collectors():
+    tokens = universe_symbols(UNIVERSE, "okx")
+    depth_stream = None
+    if OKX_BOOKS_STREAM:
+        depth_stream = OKXBooksStream(tokens, proxy=EXCHANGE_PROXY_URL)
+
+    return [
+        OrderBookCollectorOKX(
+            token=token,
+            telegram_bot_token=TELEGRAM_BOT_TOKEN,
+            telegram_chat_id=TELEGRAM_CHAT_ID,
+            interval_seconds=TICK_INTERVAL_SECONDS,
+            depth_stream=depth_stream
+        )
+        for token in tokens
+    ]
 
-    # Wait for all threads to finish
-    for thread in threads:
-        thread.join()
+# Main function to run all collectors on one event loop
+def main():
+    raise_open_file_limit()
+    engine = AsyncCollectionEngine(
+        binance_collectors() + coinex_collectors() + okx_collectors(),
+        interval_seconds=TICK_INTERVAL_SECONDS,
+        concurrency_caps=concurrency_caps(UNIVERSE)
+    )
+    engine.start()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,45 @@
+from bisect import bisect_left, insort
+
+
+class LocalOrderBook:
+    def __init__(self):
+        self.levels = {'bids': {}, 'asks': {}}
+        self.prices = {'bids': [], 'asks': []}
+
+    def clear(self):
+        for side in ('bids', 'asks'):
+            self.levels[side].clear()
+            self.prices[side].clear()
+
+    def set_level(self, side, price, quantity):
+        key = float(price)
+        levels = self.levels[side]
+        prices = self.prices[side]
+
+        if float(quantity) == 0:
+            if levels.pop(key, None) is not None:
+                del prices[bisect_left(prices, key)]
+            return
+
+        if key not in levels:
+            insort(prices, key)
+        levels[key] = (price, quantity)
+
+    def load(self, bids, asks):
+        self.clear()
+        for price, quantity in bids:
+            self.set_level('bids', price, quantity)
+        for price, quantity in asks:
+            self.set_level('asks', price, quantity)
+
+    def top(self, side, depth=None):
+        prices = self.prices[side]
+        if side == 'bids':
+            keys = prices[:-depth - 1:-1] if depth else prices[::-1]
+        else:
+            keys = prices[:depth] if depth else prices
+        levels = self.levels[side]
+        return [list(levels[key]) for key in keys]
+
+    def is_empty(self):
+        return not self.prices['bids'] or not self.prices['asks']
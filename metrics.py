@@ -0,0 +1,251 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+import bisect
+import os
+import time
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    def __init__(self, name, kind, help_text, buckets=None):
+        # values maps a sorted tuple of (label, value) pairs to a number, or for histograms to
+        # [bucket counts..., sum, count]. Observations take one lock and one dict lookup.
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.buckets = tuple(buckets) if buckets else None
+        self.values = {}
+        self.lock = Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def drain(self):
+        with self.lock:
+            values, self.values = self.values, {}
+        return values
+
+    def merge(self, values):
+        with self.lock:
+            for key, value in values.items():
+                if self.kind == 'histogram':
+                    state = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0, 0])
+                    for index, amount in enumerate(value):
+                        state[index] += amount
+                elif self.kind == 'counter':
+                    self.values[key] = self.values.get(key, 0) + value
+                else:
+                    self.values[key] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            values = {key: list(value) if isinstance(value, list) else value for key, value in self.values.items()}
+
+        for key, value in sorted(values.items()):
+            if self.kind != 'histogram':
+                lines.append(f"{self.name}{format_labels(key)} {format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), value):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {format_value(value[-2])}")
+            lines.append(f"{self.name}_count{format_labels(key)} {value[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.callbacks = []
+        self.lock = Lock()
+
+    def metric(self, name, kind, help_text, buckets=None):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(name, Metric(name, kind, help_text, buckets))
+        return metric
+
+    def counter(self, name, help_text):
+        return self.metric(name, 'counter', help_text)
+
+    def gauge(self, name, help_text):
+        return self.metric(name, 'gauge', help_text)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self.metric(name, 'histogram', help_text, buckets)
+
+    def register_callback(self, callback):
+        # Callbacks run on every scrape and set gauges from live state (queue depths, store sizes),
+        # so nothing is paid for that state on the hot path.
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def drain(self):
+        # Observations made in an analytics worker process travel back to the parent with the result.
+        return {name: (metric.kind, metric.help_text, metric.buckets, metric.drain())
+                for name, metric in list(self.metrics.items())}
+
+    def merge(self, drained):
+        for name, (kind, help_text, buckets, values) in drained.items():
+            if values:
+                self.metric(name, kind, help_text, buckets).merge(values)
+
+    def render(self):
+        for callback in list(self.callbacks):
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"Metrics callback failed: {e}")
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+FETCH_SECONDS = REGISTRY.histogram('orderbook_fetch_seconds', 'HTTP order book fetch latency.')
+FETCH_BYTES = REGISTRY.counter('orderbook_fetch_bytes_total', 'Order book response bytes received.')
+FETCH_ERRORS = REGISTRY.counter('orderbook_fetch_errors_total', 'Failed or non-2xx order book fetches.')
+STAGE_SECONDS = REGISTRY.histogram('orderbook_stage_seconds', 'Time spent in each parsing, analytics or export stage.')
+TICKS = REGISTRY.counter('orderbook_ticks_total', 'Ticks fired by each scheduler.')
+MISSED_TICKS = REGISTRY.counter('orderbook_missed_ticks_total', 'Ticks skipped because the previous one overran.')
+TICK_LATENESS = REGISTRY.histogram('orderbook_tick_lateness_seconds', 'Delay between a tick deadline and its start.')
+
+
+def observe_fetch(exchange, symbol, started, size=None, status=None):
+    labels = {'exchange': exchange, 'symbol': symbol}
+    FETCH_SECONDS.observe(time.perf_counter() - started, **labels)
+    if size is not None:
+        FETCH_BYTES.inc(size, **labels)
+    if status is None or status >= 400:
+        FETCH_ERRORS.inc(**labels)
+
+
+@contextmanager
+def stage_timer(exchange, stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, exchange=exchange, stage=stage)
+
+
+def call_with_metrics(function, *args):
+    # Runs in a worker process: returns the result together with the metrics it recorded.
+    REGISTRY.drain()
+    result = function(*args)
+    return result, REGISTRY.drain()
+
+
+class MetricsServer:
+    def __init__(self, registry=REGISTRY, host='127.0.0.1', port=9108, dump_path=None, dump_seconds=60.0):
+        self.registry = registry
+        self.dump_path = dump_path
+        self.dump_seconds = dump_seconds
+        self.server = ThreadingHTTPServer((host, port), self.handler_class()) if port is not None else None
+        if self.server is not None:
+            self.server.daemon_threads = True
+
+    def handler_class(self):
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+    def dump(self):
+        # Written to a temporary file first so readers never see a half-written dump.
+        temporary_path = f"{self.dump_path}.tmp"
+        directory = os.path.dirname(self.dump_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(temporary_path, 'w') as target:
+            target.write(self.registry.render())
+        os.replace(temporary_path, self.dump_path)
+
+    def dump_forever(self):
+        while True:
+            time.sleep(self.dump_seconds)
+            try:
+                self.dump()
+            except Exception as e:
+                print(f"Failed to dump metrics to {self.dump_path}: {e}")
+
+    def start(self):
+        if self.server is not None:
+            Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.dump_path:
+            Thread(target=self.dump_forever, daemon=True).start()
+        return self
+
+
+METRICS_SERVER = None
+
+
+def start_metrics():
+    # METRICS_PORT (default 9108, empty disables) serves /metrics; METRICS_FILE is rewritten every
+    # METRICS_DUMP_SECONDS. Safe to call more than once.
+    global METRICS_SERVER
+    if METRICS_SERVER is None:
+        port = os.getenv("METRICS_PORT", "9108")
+        try:
+            METRICS_SERVER = MetricsServer(
+                host=os.getenv("METRICS_HOST", "127.0.0.1"),
+                port=int(port) if port else None,
+                dump_path=os.getenv("METRICS_FILE"),
+                dump_seconds=float(os.getenv("METRICS_DUMP_SECONDS", "60"))
+            ).start()
+        except OSError as e:
+            print(f"Failed to start the metrics endpoint on port {port}: {e}")
+    return METRICS_SERVER
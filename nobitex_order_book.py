@@ -1,186 +1,222 @@
-from threading import Thread
 from datetime import datetime
+import os
 import pytz
-import requests
+import numpy as np
 import pandas as pd
-from telegram import Bot
-import time
-import io
+from metrics import stage_timer
+from tick_scheduler import is_last_tick_of_hour
+from order_book_arrays import OrderBookArrays, band_depth_frame
+from slippage import SLIPPAGE_COLUMNS, quote_slippage_frame
+from snapshot_store import SnapshotStore
+from snapshot_wal import open_wal
+from rolling_stats import RollingStats
+from rollups import get_rollups
+from telegram_export import TelegramExporter, create_bot
+from storage import get_storage
+
+
+SPREAD_COLUMNS = [('Item', 'symbol'), ('Date', 'date'), ('DateTime', 'datetime'), ('Timestamp', 'f8'),
+                  ('Reference_Price', 'f8'), ('Best_Ask_Price', 'f8'), ('Best_Bid_Price', 'f8'), ('Spread', 'f8')]
+DEPTH_COLUMNS = [('Item', 'symbol'), ('Date', 'date'), ('DateTime', 'datetime'), ('Timestamp', 'f8'),
+                 ('Reference_Price', 'f8'), ('Total_Bid_Volume', 'f8'), ('Total_Ask_Volume', 'f8'),
+                 ('Percentage', 'f8')]
+UNCHANGED_COLUMNS = [('Item', 'symbol'), ('Timestamp', 'f8'), ('Poll_Timestamp', 'f8')]
 
 
 class OrderBookCollectorNobitex:
-    def __init__(self, telegram_bot_token, telegram_chat_id, interval_seconds=10):
-        self.URL_ORDERBOOK_BTCUSDT_NOBITEX = 'https://api.nobitex.ir/v3/orderbook/BTCUSDT'
-        self.URL_ORDERBOOK_ETHUSDT_NOBITEX = 'https://api.nobitex.ir/v3/orderbook/ETHUSDT'
-        self.URL_ORDERBOOK_NOBITEX_ALL = "https://api.nobitex.ir/v3/orderbook/all"
+    def __init__(self, telegram_bot_token, telegram_chat_id, interval_seconds=15):
+        self.api_url = os.getenv("NOBITEX_API_URL", "https://api.nobitex.ir").rstrip('/')
+        self.URL_ORDERBOOK_BTCUSDT_NOBITEX = f'{self.api_url}/v3/orderbook/BTCUSDT'
+        self.URL_ORDERBOOK_ETHUSDT_NOBITEX = f'{self.api_url}/v3/orderbook/ETHUSDT'
+        self.URL_ORDERBOOK_NOBITEX_ALL = f"{self.api_url}/v3/orderbook/all"
 
         self.LIST_COLUMN_NAME_INTERCEPT = ['Item', 'Date', 'DateTime', 'Timestamp', 'Reference_Price']
 
-        self.telegram_bot = Bot(token=telegram_bot_token)
+        self.telegram_bot = create_bot(telegram_bot_token)
         self.telegram_chat_id = telegram_chat_id
+        self.exporter = TelegramExporter(self.telegram_bot, telegram_chat_id)
 
         self.interval_seconds = interval_seconds
         self.current_date = datetime.now(pytz.utc).date()
-        self.data_list_spread = []
-        self.data_list_depth = []
+        self.storage = get_storage()
+        self.store_spread = SnapshotStore(SPREAD_COLUMNS, timestamp_unit='ms', wal=open_wal("nobitex_df_spread"))
+        self.store_depth = SnapshotStore(DEPTH_COLUMNS, timestamp_unit='ms', wal=open_wal("nobitex_depth_all"))
+        self.store_unchanged = SnapshotStore(UNCHANGED_COLUMNS, timestamp_unit='ms', wal=open_wal("nobitex_unchanged"))
+        self.store_slippage = SnapshotStore(SLIPPAGE_COLUMNS, timestamp_unit='ms', wal=open_wal("nobitex_slippage"))
+        self.last_updates = {}
+        self.consolidated_book = None
+        self.rolling_stats = RollingStats()
+        self.rollups = get_rollups("nobitex")
 
 
-    def fetch_market_depth_url(self, url):
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print("Failed to fetch data:", response.status_code)
-            return {}
+    def save_orderbook_files(self, df, filename):
+        self.storage.write('nobitex', filename, df)
 
-    def extract_ask_bid(self, data):
-        rows = []
-        last_update = []
-
-        for key, value in data.items():
-            last_update.append(value['lastUpdate'])
-            for bid, ask in zip(value['bids'], value['asks']):
-                row = {
-                    'Item': key,
-                    'Timestamp': value['lastUpdate'],
-                    'Reference_Price': value['lastTradePrice'],
-                    'Bid_Price': float(bid[0]),
-                    'Bid_Volume': float(bid[1]),
-                    'Ask_Price': float(ask[0]),
-                    'Ask_Volume': float(ask[1])
-                }
-                rows.append(row)
-
-        return pd.DataFrame(rows), last_update
-
-
-    def dataset_preparation(self, result_df):
-        result_df.fillna({'Bid_Price': 0, 'Bid_Volume': 0, 'Ask_Price': 0, 'Ask_Volume': 0, 'LastTradePrice': 0},
-                         inplace=True)
-        result_df['DateTime'] = pd.to_datetime(result_df['Timestamp'], unit='ms')
-        result_df['FormattedDateTime'] = result_df['DateTime'].dt.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]
-        result_df['Date'] = result_df['DateTime'].dt.date
-        result_df['DateTime'] = result_df['FormattedDateTime']
-
-        return result_df
-
-    def spread_calculation(self, result_df):
-        spread_data = result_df.groupby(self.LIST_COLUMN_NAME_INTERCEPT).agg(
-            {'Ask_Price': 'max', 'Bid_Price': 'min'}).rename(
-                columns={'Ask_Price': 'Best_Ask_Price', 'Bid_Price': 'Best_Bid_Price'}
-            ).reset_index()
+    def order_book_url(self):
+        return self.URL_ORDERBOOK_NOBITEX_ALL
 
+    def extract_ask_bid(self, data):
+        names = list(data)
+        arrays = OrderBookArrays.from_level_lists(
+            names,
+            [data[name]['bids'] for name in names],
+            [data[name]['asks'] for name in names]
+        )
+
+        last_updates = [data[name]['lastUpdate'] for name in names]
+        date_times = pd.to_datetime(last_updates, unit='ms')
+        markets = pd.DataFrame({
+            'Item': names,
+            'Date': date_times.date,
+            'DateTime': date_times.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3],
+            'Timestamp': last_updates,
+            'Reference_Price': pd.to_numeric([data[name]['lastTradePrice'] for name in names], errors='coerce')
+        })
+
+        return arrays, markets
+
+    def spread_calculation(self, arrays, markets):
+        best_bid, best_ask = arrays.best_prices()
+
+        spread_data = markets[self.LIST_COLUMN_NAME_INTERCEPT].reset_index(drop=True)
+        spread_data['Best_Ask_Price'] = best_ask
+        spread_data['Best_Bid_Price'] = best_bid
         spread_data['Spread'] = (spread_data['Best_Ask_Price'] - spread_data['Best_Bid_Price'])
 
         return spread_data
 
-    def calculate_depth_with_percentages(self, df, percentages=[0, 2, 5, 10]):
-        combined_depth_df = pd.DataFrame(columns=self.LIST_COLUMN_NAME_INTERCEPT)
-        ALTERNATE_COLUMN_NAME_INTERCEPT = self.LIST_COLUMN_NAME_INTERCEPT.copy()
-
-        def calculate_depth(percentage):
-            depth_df = df.groupby(ALTERNATE_COLUMN_NAME_INTERCEPT).agg(
-                Total_Bid_Volume=('Bid_Volume', 'sum'),
-                Total_Ask_Volume=('Ask_Volume', 'sum'),
-            ).reset_index()
-
-            depth_df['Percentage'] = percentage
-            return depth_df
+    def calculate_depth_with_percentages(self, arrays, markets, percentages=[0, 2, 5, 10]):
+        return band_depth_frame(arrays, markets[self.LIST_COLUMN_NAME_INTERCEPT], percentages)
 
-        depth_dfs = [calculate_depth(percentage) for percentage in percentages]
+    def split_changed_markets(self, data):
+        changed = {}
+        unchanged = []
 
-        for df in depth_dfs:
-            combined_depth_df = pd.concat([combined_depth_df, df], ignore_index=True)
-
-        return combined_depth_df
+        for key, value in data.items():
+            if self.last_updates.get(key) == value['lastUpdate']:
+                unchanged.append((key, value['lastUpdate']))
+            else:
+                changed[key] = value
 
-    def process_data(self, url):
-        data = self.fetch_market_depth_url(url)
-        data.pop("status", None)
-        result_df, last_update = self.extract_ask_bid(data)
-        item_date, last_item_str = pd.to_datetime(last_update[-1], unit='ms').date(), last_update[-1]
-        result_df = self.dataset_preparation(result_df)
-        spread_df = self.spread_calculation(result_df)
-        depth_df_with_percentages = self.calculate_depth_with_percentages(result_df)
-        return result_df, spread_df, depth_df_with_percentages, item_date, last_item_str
+        unchanged_df = pd.DataFrame(unchanged, columns=['Item', 'Timestamp'])
+        unchanged_df['Poll_Timestamp'] = datetime.now(pytz.utc).timestamp()
 
-    def collect_data(self, url):
+        return changed, unchanged_df
 
-        result_df, spread_df, depth_df, item_date, last_item_str = self.process_data(url)
+    def analyze_markets(self, changed):
+        with stage_timer("nobitex", 'extract_ask_bid'):
+            arrays, markets = self.extract_ask_bid(changed)
+        with stage_timer("nobitex", 'spread_calculation'):
+            spread_df = self.spread_calculation(arrays, markets)
+        with stage_timer("nobitex", 'depth'):
+            depth_df_with_percentages = self.calculate_depth_with_percentages(arrays, markets)
+        with stage_timer("nobitex", 'slippage'):
+            slippage_df = quote_slippage_frame(arrays, markets)
 
-        return spread_df, depth_df
+        return spread_df, depth_df_with_percentages, slippage_df, arrays
 
     def send_to_telegram(self):
         try:
-            csv_buffer = io.BytesIO()
-            spread_df = pd.concat(self.data_list_spread, ignore_index=True)
-            spread_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-            csv_buffer.seek(0)
-
-            file_name_spread = f"nobitex_df_spread_{datetime.now(pytz.utc).strftime('%Y-%m-%d')}.csv"
-            self.telegram_bot.send_document(
-                chat_id=self.telegram_chat_id,
-                document=csv_buffer,
-                filename=file_name_spread
-            )
-
-            csv_buffer = io.BytesIO()
-            csv_buffer.seek(0)
-
-            depth_df = pd.concat(self.data_list_depth, ignore_index=True)
-
-            depth_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-            csv_buffer.seek(0)
-
-            file_name_depth = f"nobitex_depth_all_{datetime.now(pytz.utc).strftime('%Y-%m-%d')}.csv"
-            self.telegram_bot.send_document(
-                chat_id=self.telegram_chat_id,
-                document=csv_buffer,
-                filename=file_name_depth
-            )
+            date = str(self.current_date)
+            self.exporter.export("nobitex_df_spread", self.store_spread, date)
+            self.exporter.export("nobitex_depth_all", self.store_depth, date)
+            self.exporter.export("nobitex_unchanged", self.store_unchanged, date)
+            self.exporter.export("nobitex_slippage", self.store_slippage, date)
+            self.store_spread.compact()
+            self.store_depth.compact()
+            self.store_unchanged.compact()
+            self.store_slippage.compact()
 
         except Exception as e:
             print(f"Failed to send data to Telegram: {e}")
 
-    def start(self):
-        self.data_list_spread = []
-        self.data_list_depth = []
-        while True:
-            try:
-                now = datetime.now(pytz.utc)
-
-                if now.second % 15 == 0:
-                    if now.date() != self.current_date:
-                        print(f"New day detected: {now.date()}. Resetting data.")
-                        self.current_date = now.date()
-
-                    df_slippage_spread_all, df_depth_all = self.collect_data(self.URL_ORDERBOOK_NOBITEX_ALL)
-
-                    self.data_list_spread.append(df_slippage_spread_all)
-                    self.data_list_depth.append(df_depth_all)
-
-                    if now.minute == 59 and now.second >= (60 - self.interval_seconds):
-                        self.send_to_telegram()
-
-                time.sleep(1)
-            except Exception as e:
-                print(f"An error occurred: {e}")
-                time.sleep(1)
-
+    def send_daily_to_telegram(self):
+        try:
+            date = str(self.current_date)
+            self.exporter.export_daily("nobitex_df_spread", self.store_spread, date)
+            self.exporter.export_daily("nobitex_depth_all", self.store_depth, date)
+            self.exporter.export_daily("nobitex_unchanged", self.store_unchanged, date)
+            self.exporter.export_daily("nobitex_slippage", self.store_slippage, date)
 
-class OrderBookManagerNobitex:
-    def __init__(self, collectors):
-        self.collectors = collectors
+        except Exception as e:
+            print(f"Failed to send daily data to Telegram: {e}")
+
+    def restored_last_updates(self):
+        # The newest lastUpdate stored per market, changed or not, so markets that have not moved since
+        # the restart are not analyzed and stored a second time.
+        last_updates = {}
+        for store in (self.store_spread, self.store_unchanged):
+            rows = store.view()
+            if not len(rows):
+                continue
+            items = np.asarray(store.symbols, dtype=object)[rows['Item']]
+            for item, timestamp in pd.Series(rows['Timestamp']).groupby(items).max().items():
+                if timestamp > last_updates.get(item, float('-inf')):
+                    last_updates[item] = int(timestamp)
+        return last_updates
+
+    def restore(self):
+        self.store_spread.restore()
+        self.store_depth.restore()
+        self.store_unchanged.restore()
+        self.store_slippage.restore()
+        self.last_updates = self.restored_last_updates()
+        last_ingest_time = self.store_spread.last_ingest_time()
+        if last_ingest_time is not None:
+            self.current_date = datetime.fromtimestamp(last_ingest_time, pytz.utc).date()
+            print(f"Restored {len(self.store_spread)} spread rows for Nobitex from the write-ahead log.")
+
+    def __getstate__(self):
+        # Only configuration crosses into the analytics process pool, never the stores or the bot.
+        return {'LIST_COLUMN_NAME_INTERCEPT': self.LIST_COLUMN_NAME_INTERCEPT}
+
+    def prepare(self, now, data):
+        if now.date() != self.current_date:
+            print(f"New day detected: {now.date()}. Resetting data.")
+            self.send_daily_to_telegram()
+            self.current_date = now.date()
+            self.store_spread.clear()
+            self.store_depth.clear()
+            self.store_unchanged.clear()
+            self.store_slippage.clear()
 
-    def start(self):
-        threads = []
-        try:
-            for collector in self.collectors:
-                thread = Thread(target=collector.start)
-                threads.append(thread)
-                thread.start()
-
-            for thread in threads:
-                thread.join()
-        except KeyboardInterrupt:
-            print("Data collection interrupted by user.")
+        data.pop("status", None)
+        return self.split_changed_markets(data)
+
+    def analyze(self, changed, unchanged_df):
+        if not changed:
+            return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), unchanged_df, {}, None
+
+        spread_df, depth_df, slippage_df, arrays = self.analyze_markets(changed)
+        last_updates = {key: value['lastUpdate'] for key, value in changed.items()}
+        return spread_df, depth_df, slippage_df, unchanged_df, last_updates, arrays
+
+    def complete(self, now, result):
+        df_slippage_spread_all, df_depth_all, df_slippage, df_unchanged, last_updates, arrays = result
+        self.last_updates.update(last_updates)
+
+        if self.consolidated_book is not None:
+            if arrays is not None:
+                self.consolidated_book.update_arrays("nobitex", arrays)
+            self.consolidated_book.touch("nobitex", df_unchanged['Item'])
+
+        self.save_orderbook_files(df_slippage_spread_all, "df_spread_all")
+        self.save_orderbook_files(df_depth_all, "depth_all")
+        self.save_orderbook_files(df_slippage, "slippage")
+        self.store_spread.append_frame(df_slippage_spread_all)
+        self.store_depth.append_frame(df_depth_all)
+        self.store_unchanged.append_frame(df_unchanged)
+        self.store_slippage.append_frame(df_slippage)
+        self.rolling_stats.update_frame(df_slippage_spread_all, now.timestamp())
+        if self.rollups is not None:
+            self.rollups.update_frame(df_slippage_spread_all, now.timestamp())
+            self.rollups.update_depth(df_depth_all, now.timestamp())
+        if not df_depth_all.empty:
+            widest = df_depth_all[df_depth_all['Percentage'] == df_depth_all['Percentage'].max()]
+            self.rolling_stats.update_frame(widest[['Item', 'Total_Bid_Volume', 'Total_Ask_Volume']], now.timestamp())
+
+        if is_last_tick_of_hour(now, self.interval_seconds):
+            self.send_to_telegram()
+
+    def run_iteration(self, now, data):
+        self.complete(now, self.analyze(*self.prepare(now, data)))
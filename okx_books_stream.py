@@ -0,0 +1,140 @@
+import asyncio
+import json
+import zlib
+from threading import Thread, Lock
+import aiohttp
+from aiohttp_socks import ProxyConnector
+from local_order_book import LocalOrderBook
+
+
+def okx_checksum(book, levels=25):
+    bids = book.top('bids', levels)
+    asks = book.top('asks', levels)
+    parts = []
+    for i in range(max(len(bids), len(asks))):
+        if i < len(bids):
+            parts.extend(bids[i])
+        if i < len(asks):
+            parts.extend(asks[i])
+    checksum = zlib.crc32(':'.join(parts).encode())
+    return checksum - (1 << 32) if checksum >= (1 << 31) else checksum
+
+
+class OKXBooksStream:
+    def __init__(self, symbols, ws_url="wss://ws.okx.com:8443/ws/v5/public", proxy=None,
+                 channel="books", ping_seconds=20, reconnect_seconds=5):
+        self.symbols = list(symbols)
+        self.ws_url = ws_url
+        self.proxy = proxy
+        self.channel = channel
+        self.ping_seconds = ping_seconds
+        self.reconnect_seconds = reconnect_seconds
+
+        self.books = {symbol: LocalOrderBook() for symbol in self.symbols}
+        self.seq_id = {symbol: None for symbol in self.symbols}
+        self.timestamps = {symbol: None for symbol in self.symbols}
+        self.checksum_failures = {symbol: 0 for symbol in self.symbols}
+        self.resubscribing = set()
+        self.lock = Lock()
+        self.running = False
+
+    def get_order_book(self, symbol, depth=10):
+        with self.lock:
+            book = self.books.get(symbol)
+            if book is None or self.seq_id[symbol] is None or book.is_empty():
+                return None
+            return {
+                "code": "0",
+                "data": [{
+                    "asks": book.top('asks', depth),
+                    "bids": book.top('bids', depth),
+                    "ts": self.timestamps[symbol],
+                }],
+            }
+
+    def subscription(self, op, symbols):
+        return json.dumps({"op": op, "args": [{"channel": self.channel, "instId": symbol} for symbol in symbols]})
+
+    def apply_message(self, symbol, action, data):
+        book = self.books[symbol]
+        if action == 'snapshot':
+            book.clear()
+        elif self.seq_id[symbol] is None or data.get('prevSeqId', self.seq_id[symbol]) != self.seq_id[symbol]:
+            return False
+
+        for level in data.get('bids', []):
+            book.set_level('bids', level[0], level[1])
+        for level in data.get('asks', []):
+            book.set_level('asks', level[0], level[1])
+
+        if 'checksum' in data and okx_checksum(book) != data['checksum']:
+            return False
+
+        self.seq_id[symbol] = data.get('seqId', 0)
+        self.timestamps[symbol] = data.get('ts')
+        return True
+
+    async def resubscribe(self, ws, symbol):
+        self.checksum_failures[symbol] += 1
+        self.resubscribing.add(symbol)
+        print(f"Order book checksum or sequence check failed for {symbol}. Resubscribing.")
+        await ws.send_str(self.subscription('unsubscribe', [symbol]))
+        await ws.send_str(self.subscription('subscribe', [symbol]))
+
+    async def handle_message(self, ws, payload):
+        symbol = payload.get('arg', {}).get('instId')
+        if symbol not in self.books or 'data' not in payload:
+            return
+
+        action = payload.get('action')
+        if symbol in self.resubscribing:
+            if action != 'snapshot':
+                return
+            self.resubscribing.discard(symbol)
+
+        with self.lock:
+            in_sync = all(self.apply_message(symbol, action, data) for data in payload['data'])
+            if not in_sync:
+                self.seq_id[symbol] = None
+                self.books[symbol].clear()
+
+        if not in_sync:
+            await self.resubscribe(ws, symbol)
+
+    async def keepalive(self, ws):
+        while not ws.closed:
+            await asyncio.sleep(self.ping_seconds)
+            await ws.send_str('ping')
+
+    async def run(self):
+        self.running = True
+        connector = ProxyConnector.from_url(self.proxy) if self.proxy else aiohttp.TCPConnector()
+        async with aiohttp.ClientSession(connector=connector) as session:
+            while True:
+                try:
+                    async with session.ws_connect(self.ws_url) as ws:
+                        await ws.send_str(self.subscription('subscribe', self.symbols))
+                        ping_task = asyncio.create_task(self.keepalive(ws))
+                        try:
+                            async for message in ws:
+                                if message.type == aiohttp.WSMsgType.TEXT and message.data != 'pong':
+                                    await self.handle_message(ws, json.loads(message.data))
+                                elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                    break
+                        finally:
+                            ping_task.cancel()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    print(f"OKX books stream disconnected: {e}")
+
+                with self.lock:
+                    for symbol in self.symbols:
+                        self.seq_id[symbol] = None
+                self.resubscribing.clear()
+                await asyncio.sleep(self.reconnect_seconds)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        thread = Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        thread.start()
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_PERCENTAGES = [0, 2, 5, 10]
+
+
+def segment_offsets(codes, count):
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=count), out=offsets[1:])
+    return offsets
+
+
+def sort_segments(offsets, prices, volumes, descending):
+    codes = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    keys = -prices if descending else prices
+    same_segment = codes[1:] == codes[:-1]
+    if not np.any(same_segment & (keys[1:] < keys[:-1])):
+        return offsets, prices, volumes
+
+    order = np.lexsort((keys, codes))
+    return offsets, prices[order], volumes[order]
+
+
+class OrderBookArrays:
+    def __init__(self, items, bid_offsets, bid_prices, bid_volumes, ask_offsets, ask_prices, ask_volumes):
+        # Levels of market i live in prices[offsets[i]:offsets[i + 1]], bids best-first (descending)
+        # and asks best-first (ascending).
+        self.items = list(items)
+        self.bid_offsets = bid_offsets
+        self.bid_prices = bid_prices
+        self.bid_volumes = bid_volumes
+        self.ask_offsets = ask_offsets
+        self.ask_prices = ask_prices
+        self.ask_volumes = ask_volumes
+
+    @classmethod
+    def from_frame(cls, df, group_columns=('Item',), bid_price_column='Bid_Price', bid_volume_column='Bid_Volume',
+                   ask_price_column='Ask_Price', ask_volume_column='Ask_Volume'):
+        group_columns = list(group_columns)
+        codes = df.groupby(group_columns, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+        items = df.drop_duplicates(group_columns)[group_columns[0]]
+
+        def side(price_column, volume_column, descending):
+            prices = df[price_column].to_numpy(dtype=np.float64, na_value=np.nan)
+            volumes = df[volume_column].to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = (prices > 0) & (volumes > 0) & (codes >= 0)
+            levels = pd.DataFrame({'code': codes[valid], 'price': prices[valid], 'volume': volumes[valid]})
+            levels = levels.drop_duplicates()
+            order = np.lexsort((-levels['price'].to_numpy() if descending else levels['price'].to_numpy(),
+                                levels['code'].to_numpy()))
+            return (segment_offsets(levels['code'].to_numpy()[order], len(items)),
+                    levels['price'].to_numpy()[order], levels['volume'].to_numpy()[order])
+
+        bid_offsets, bid_prices, bid_volumes = side(bid_price_column, bid_volume_column, True)
+        ask_offsets, ask_prices, ask_volumes = side(ask_price_column, ask_volume_column, False)
+        return cls(items, bid_offsets, bid_prices, bid_volumes, ask_offsets, ask_prices, ask_volumes)
+
+    @classmethod
+    def from_level_lists(cls, items, bids, asks, price_key=0, volume_key=1):
+        def side(levels, descending):
+            counts = np.fromiter((len(market) for market in levels), dtype=np.int64, count=len(levels))
+            offsets = np.zeros(len(levels) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            prices = np.fromiter((float(level[price_key]) for market in levels for level in market),
+                                 dtype=np.float64, count=offsets[-1])
+            volumes = np.fromiter((float(level[volume_key]) for market in levels for level in market),
+                                  dtype=np.float64, count=offsets[-1])
+            return sort_segments(offsets, prices, volumes, descending)
+
+        bid_offsets, bid_prices, bid_volumes = side(bids, True)
+        ask_offsets, ask_prices, ask_volumes = side(asks, False)
+        return cls(items, bid_offsets, bid_prices, bid_volumes, ask_offsets, ask_prices, ask_volumes)
+
+    def take(self, indices):
+        # The markets at indices, in that order, with their levels copied into new flat arrays.
+        indices = np.asarray(indices, dtype=np.int64)
+
+        def side(offsets, prices, volumes):
+            counts = np.diff(offsets)[indices]
+            new_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+            np.cumsum(counts, out=new_offsets[1:])
+            positions = np.repeat(offsets[:-1][indices] - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+            return new_offsets, prices[positions], volumes[positions]
+
+        bid_offsets, bid_prices, bid_volumes = side(self.bid_offsets, self.bid_prices, self.bid_volumes)
+        ask_offsets, ask_prices, ask_volumes = side(self.ask_offsets, self.ask_prices, self.ask_volumes)
+        items = [self.items[index] for index in indices]
+        return OrderBookArrays(items, bid_offsets, bid_prices, bid_volumes, ask_offsets, ask_prices, ask_volumes)
+
+    def market_count(self):
+        return len(self.items)
+
+    def best_prices(self):
+        best_bid = np.full(len(self.items), np.nan)
+        best_ask = np.full(len(self.items), np.nan)
+
+        has_bids = self.bid_offsets[1:] > self.bid_offsets[:-1]
+        has_asks = self.ask_offsets[1:] > self.ask_offsets[:-1]
+        best_bid[has_bids] = self.bid_prices[self.bid_offsets[:-1][has_bids]]
+        best_ask[has_asks] = self.ask_prices[self.ask_offsets[:-1][has_asks]]
+        return best_bid, best_ask
+
+    def mid_prices(self):
+        best_bid, best_ask = self.best_prices()
+        return (best_bid + best_ask) / 2
+
+    def side_depth(self, offsets, prices, volumes, mid, percentages, is_bid):
+        count = len(self.items)
+        codes = np.repeat(np.arange(count), np.diff(offsets))
+
+        # Distance from mid grows along each best-first segment, so a single sorted key
+        # (market index * 4 + clipped distance) lets one searchsorted find every band edge.
+        level_mid = mid[codes]
+        distance = (level_mid - prices) / level_mid if is_bid else (prices - level_mid) / level_mid
+        distance = np.clip(np.nan_to_num(distance, nan=0.0), -1.0, 1.0)
+        keys = codes * 4.0 + distance + 1.0
+
+        bands = np.minimum(np.asarray(percentages, dtype=np.float64) / 100.0, 1.0)
+        thresholds = np.arange(count)[:, None] * 4.0 + bands[None, :] + 1.0
+        ends = np.searchsorted(keys, thresholds.ravel(), side='right').reshape(count, len(bands))
+
+        starts = offsets[:-1][:, None]
+        non_empty = offsets[1:] > offsets[:-1]
+        # A 0% band is reported as the volume at the touch.
+        touch = (bands == 0)[None, :] & non_empty[:, None]
+        ends = np.where(touch, np.maximum(ends, starts + 1), ends)
+
+        cumulative = np.concatenate(([0.0], np.cumsum(volumes)))
+        depth = cumulative[ends] - cumulative[starts]
+        depth[np.isnan(mid)] = 0.0
+        return depth
+
+    def depth_within_bands(self, percentages=DEFAULT_PERCENTAGES):
+        mid = self.mid_prices()
+        bid_depth = self.side_depth(self.bid_offsets, self.bid_prices, self.bid_volumes, mid, percentages, True)
+        ask_depth = self.side_depth(self.ask_offsets, self.ask_prices, self.ask_volumes, mid, percentages, False)
+        return bid_depth, ask_depth
+
+
+def band_depth_frame(arrays, markets, percentages=DEFAULT_PERCENTAGES):
+    bid_depth, ask_depth = arrays.depth_within_bands(percentages)
+    count = arrays.market_count()
+
+    depth_df = markets.iloc[np.tile(np.arange(count), len(percentages))].reset_index(drop=True)
+    depth_df['Total_Bid_Volume'] = bid_depth.T.ravel()
+    depth_df['Total_Ask_Volume'] = ask_depth.T.ravel()
+    depth_df['Percentage'] = np.repeat(percentages, count)
+    return depth_df
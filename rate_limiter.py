@@ -0,0 +1,143 @@
+from threading import Lock
+from urllib.parse import parse_qsl, urlsplit
+import asyncio
+import os
+import time
+from metrics import REGISTRY
+
+
+RATE_LIMIT_WAIT = REGISTRY.histogram('orderbook_rate_limit_wait_seconds', 'Time a request waited for rate limit tokens.')
+RATE_LIMIT_SKIPS = REGISTRY.counter('orderbook_rate_limit_skips_total', 'Requests skipped because the wait exceeded a tick.')
+COALESCED_REQUESTS = REGISTRY.counter('orderbook_coalesced_requests_total', 'Requests served by an identical in-flight request.')
+
+
+def binance_weight(url):
+    # GET /api/v3/depth costs 5 up to 100 levels, 25 up to 500, 50 up to 1000 and 250 up to 5000.
+    parts = urlsplit(url)
+    if not parts.path.endswith('/api/v3/depth'):
+        return 1
+    limit = int(dict(parse_qsl(parts.query)).get('limit', 100))
+    return 5 if limit <= 100 else 25 if limit <= 500 else 50 if limit <= 1000 else 250
+
+
+# exchange -> (capacity, window seconds, weight of a URL, header reporting the weight already used)
+# Binance and OKX are their documented public limits; the others are conservative guesses.
+# RATE_LIMIT_<EXCHANGE>=capacity/window overrides the first two, e.g. RATE_LIMIT_BITPIN=30/1.
+EXCHANGE_LIMITS = {
+    'binance': (6000, 60, binance_weight, 'X-MBX-USED-WEIGHT-1M'),
+    'okx': (40, 2, None, None),
+    'coinex': (20, 1, None, None),
+    'bitpin': (10, 1, None, None),
+    'nobitex': (300, 60, None, None),
+    'wallex': (60, 60, None, None),
+}
+
+
+class TokenBucket:
+    def __init__(self, capacity, window_seconds):
+        # Tokens are reserved up front and may go negative; the caller then sleeps off the deficit,
+        # so concurrent callers queue up in reservation order without holding the lock while waiting.
+        self.capacity = capacity
+        self.rate = capacity / window_seconds
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, weight, max_wait=None):
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            wait = max(self.blocked_until - now, (weight - self.tokens) / self.rate, 0.0)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= weight
+            return wait
+
+    def set_used(self, used):
+        # Server feedback wins over the local estimate when it reports more weight used.
+        with self.lock:
+            self.refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - used)
+
+    def block(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class ExchangeLimiter:
+    def __init__(self, name, capacity, window_seconds, weight=None, used_weight_header=None):
+        self.name = name
+        self.bucket = TokenBucket(capacity, window_seconds)
+        self.weight = weight or (lambda url: 1)
+        self.used_weight_header = used_weight_header
+        self.in_flight_async = {}
+
+    def reserve(self, url, max_wait):
+        wait = self.bucket.reserve(self.weight(url), max_wait)
+        if wait is None:
+            RATE_LIMIT_SKIPS.inc(exchange=self.name)
+        else:
+            RATE_LIMIT_WAIT.observe(wait, exchange=self.name)
+        return wait
+
+    async def acquire_async(self, url, max_wait=None):
+        wait = self.reserve(url, max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def feedback(self, status, headers):
+        used = headers.get(self.used_weight_header) if self.used_weight_header else None
+        if used is not None:
+            self.bucket.set_used(int(used))
+        # 429 asks us to back off; Binance answers 418 once the IP is banned for ignoring it.
+        if status in (418, 429):
+            retry_after = float(headers.get('Retry-After') or 60)
+            self.bucket.block(retry_after)
+            print(f"{self.name}: rate limited with HTTP {status}, pausing requests for {retry_after:g}s.")
+
+    async def coalesce_async(self, key, request):
+        future = self.in_flight_async.get(key)
+        if future is not None:
+            COALESCED_REQUESTS.inc(exchange=self.name)
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight_async[key] = future
+        try:
+            result = await request()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self.in_flight_async[key]
+
+
+LIMITERS = {}
+LIMITERS_LOCK = Lock()
+
+
+def get_limiter(exchange):
+    # One limiter per exchange and process, shared by the async engine and the depth streams.
+    with LIMITERS_LOCK:
+        limiter = LIMITERS.get(exchange)
+        if limiter is None:
+            capacity, window_seconds, weight, header = EXCHANGE_LIMITS.get(exchange, (10, 1, None, None))
+            override = os.getenv(f"RATE_LIMIT_{exchange.upper()}")
+            if override:
+                capacity, window_seconds = (float(value) for value in override.split('/'))
+            limiter = LIMITERS[exchange] = ExchangeLimiter(exchange, capacity, window_seconds, weight, header)
+        return limiter
@@ -0,0 +1,146 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qsl, urlsplit
+import argparse
+import bisect
+import signal
+import time
+from capture import capture_files, read_capture
+
+
+API_URL_VARIABLES = ['BINANCE_API_URL', 'OKX_API_URL', 'COINEX_API_URL', 'BITPIN_API_URL', 'NOBITEX_API_URL',
+                     'WALLEX_API_URL']
+
+
+def request_key(url):
+    # Captures are served by path and query, so every exchange can share one server port.
+    parts = urlsplit(url)
+    return parts.path, tuple(sorted(parse_qsl(parts.query)))
+
+
+class ReplayServer:
+    def __init__(self, records, speed=1.0, host='127.0.0.1', port=8090, loop=False):
+        # Capture time advances speed times faster than wall time from the moment the server starts;
+        # each request gets the latest response recorded for its URL at the current capture time.
+        if not records:
+            raise ValueError("No captured responses to replay.")
+        self.speed = speed
+        self.loop = loop
+        self.start_time = records[0]['received_at']
+        self.end_time = records[-1]['received_at']
+
+        self.responses = {}
+        for record in records:
+            times, responses = self.responses.setdefault(request_key(record['url']), ([], []))
+            times.append(record['received_at'])
+            responses.append((record['status'], record['body'].encode()))
+
+        self.lock = Lock()
+        self.stats = {'requests': 0, 'bytes': 0, 'misses': 0}
+        self.started_at = None
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @classmethod
+    def from_directory(cls, directory, **kwargs):
+        return cls(read_capture(capture_files(directory)), **kwargs)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def capture_time(self):
+        elapsed = (time.monotonic() - self.started_at) * self.speed
+        duration = self.end_time - self.start_time
+        if self.loop and duration > 0:
+            elapsed %= duration
+        return self.start_time + elapsed
+
+    def finished(self):
+        return not self.loop and self.started_at is not None and self.capture_time() > self.end_time
+
+    def response(self, url):
+        entry = self.responses.get(request_key(url))
+        if entry is None:
+            return None
+        times, responses = entry
+        # Before a URL's first capture its first response is served; after the last one the last.
+        return responses[max(bisect.bisect_right(times, self.capture_time()) - 1, 0)]
+
+    def handler_class(self):
+        replay = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                response = replay.response(self.path)
+                if response is None:
+                    status, body = 404, b'{"error": "no captured response for this url"}'
+                else:
+                    status, body = response
+                with replay.lock:
+                    replay.stats['requests'] += 1
+                    replay.stats['bytes'] += len(body)
+                    replay.stats['misses'] += response is None
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return ReplayHandler
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started_at
+        with self.lock:
+            stats = dict(self.stats)
+        stats['wall_seconds'] = elapsed
+        stats['capture_seconds'] = min(self.capture_time(), self.end_time) - self.start_time
+        stats['requests_per_second'] = stats['requests'] / elapsed if elapsed else 0.0
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve captured exchange responses under their real URL paths.")
+    parser.add_argument('directory', help="Directory written by a collector run with CAPTURE_DIR set")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay speed, e.g. 96 plays a day in 15 minutes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--loop', action='store_true', help="Start over at the end of the capture")
+    args = parser.parse_args()
+
+    replay = ReplayServer.from_directory(args.directory, speed=args.speed, host=args.host, port=args.port,
+                                         loop=args.loop).start()
+    print(f"Replaying {args.directory} at {args.speed:g}x on {replay.url}. Point the collectors at it with:")
+    for variable in API_URL_VARIABLES:
+        print(f"  export {variable}={replay.url}")
+    print(f"  export EXCHANGE_PROXY_URL= BINANCE_DEPTH_STREAM=false OKX_BOOKS_STREAM=false "
+          f"TICK_INTERVAL_SECONDS={15 / args.speed:g}")
+
+    signal.signal(signal.SIGTERM, lambda *args: replay.server.shutdown())
+    try:
+        while replay.thread.is_alive() and not replay.finished():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    replay.stop()
+    print(f"Replay summary: {replay.summary()}")
+
+
+if __name__ == '__main__':
+    main()
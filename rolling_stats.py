@@ -0,0 +1,233 @@
+"""Rolling per-symbol statistics over fixed time windows: moments, extremes, EWMA and t-digest quantiles.
+
+Memory is bounded per symbol and does not grow with uptime. Each (metric, window) pair is a ring that
+is allocated the first time the metric gets a value, and costs RollingStats.ring_bytes() per symbol:
+2,856 bytes with the defaults (12 buckets, 24 centroids). With all 5 metrics over the 4 default
+windows that is 57,120 bytes (about 56 KB) per symbol, or about 28 MB for 500 markets. The symbol
+capacity doubles when it fills, so up to twice that may be allocated.
+"""
+from threading import Lock
+import time
+import numpy as np
+import pandas as pd
+
+
+STAT_METRICS = ['Spread', 'Best_Bid_Price', 'Best_Ask_Price', 'Total_Bid_Volume', 'Total_Ask_Volume']
+DEFAULT_WINDOWS = {'1m': 60, '15m': 900, '1h': 3600, '1d': 86400}
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def compress_digests(means, weights):
+    # Frees one slot per row by merging the adjacent centroid pair that is cheapest under the
+    # t-digest size bound q(1-q), so the tails keep their resolution and the middle absorbs merges.
+    order = np.argsort(means, axis=1)
+    means = np.take_along_axis(means, order, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+
+    cumulative = np.cumsum(weights, axis=1)
+    total = cumulative[:, -1:]
+    q = cumulative[:, :-1] / total
+    cost = (weights[:, :-1] + weights[:, 1:]) / (q * (1 - q) + 1 / total)
+    pair = np.argmin(cost, axis=1)
+
+    rows = np.arange(len(means))
+    merged_weight = weights[rows, pair] + weights[rows, pair + 1]
+    means[rows, pair] = (means[rows, pair] * weights[rows, pair]
+                         + means[rows, pair + 1] * weights[rows, pair + 1]) / merged_weight
+    weights[rows, pair] = merged_weight
+    weights[rows, pair + 1] = 0
+    return means, weights
+
+
+class WindowRing:
+    def __init__(self, buckets, centroids, capacity):
+        # A ring of buckets for one metric and one window; bucket b holds the values whose
+        # floor(t / width) == epoch[:, b]. Moments are kept relative to a per-symbol shift.
+        # Counts and centroids fit in float32; moments, extremes and EWMA keep float64.
+        shape = (capacity, buckets)
+        self.epoch = np.full(shape, -1, dtype=np.int64)
+        self.count = np.zeros(shape, dtype=np.float32)
+        self.total = np.zeros(shape)
+        self.total_squares = np.zeros(shape)
+        self.minimum = np.full(shape, np.inf)
+        self.maximum = np.full(shape, -np.inf)
+        self.centroid_means = np.zeros(shape + (centroids,), dtype=np.float32)
+        self.centroid_weights = np.zeros(shape + (centroids,), dtype=np.float32)
+        self.ewma = np.full(capacity, np.nan)
+        self.ewma_time = np.full(capacity, np.nan)
+        self.shift = np.full(capacity, np.nan)
+
+    def grow(self, capacity):
+        for name, values in vars(self).items():
+            grown = np.empty((capacity,) + values.shape[1:], dtype=values.dtype)
+            grown[:len(values)] = values
+            grown[len(values):] = {'epoch': -1, 'minimum': np.inf, 'maximum': -np.inf}.get(
+                name, np.nan if name in ('ewma', 'ewma_time', 'shift') else 0)
+            setattr(self, name, grown)
+
+
+class RollingStats:
+    def __init__(self, metrics=STAT_METRICS, windows=DEFAULT_WINDOWS, buckets=12, centroids=24,
+                 initial_symbols=8):
+        # Memory is fixed per symbol however long the process runs (see ring_bytes); every update
+        # is O(1) per symbol and vectorized over the symbols of a tick.
+        self.metrics = list(metrics)
+        self.windows = dict(windows)
+        self.buckets = buckets
+        self.centroids = centroids
+
+        self.lock = Lock()
+        self.symbols = []
+        self.symbol_ids = {}
+        self.capacity = initial_symbols
+        # One ring per (metric, window), allocated when the metric first gets a value.
+        self.rings = {}
+
+    def ring_bytes(self):
+        # Bytes one symbol costs in one ring: the int64 epoch and five scalars per bucket (float32
+        # count, float64 total, squares, min, max), float32 centroid means and weights, and the
+        # float64 EWMA, its time and the shift.
+        return self.buckets * (8 + 4 + 4 * 8 + 2 * 4 * self.centroids) + 3 * 8
+
+    def ring(self, metric, window):
+        ring = self.rings.get((metric, window))
+        if ring is None:
+            ring = self.rings[(metric, window)] = WindowRing(self.buckets, self.centroids, self.capacity)
+        return ring
+
+    def symbol_indexes(self, symbols):
+        indexes = np.empty(len(symbols), dtype=np.int64)
+        for position, symbol in enumerate(symbols):
+            index = self.symbol_ids.get(symbol)
+            if index is None:
+                index = len(self.symbols)
+                self.symbol_ids[symbol] = index
+                self.symbols.append(symbol)
+            indexes[position] = index
+
+        if len(self.symbols) > self.capacity:
+            self.capacity = max(len(self.symbols), 2 * self.capacity)
+            for ring in self.rings.values():
+                ring.grow(self.capacity)
+        return indexes
+
+    def update_ring(self, ring, seconds, indexes, values, timestamp):
+        width = seconds / self.buckets
+        epoch = int(np.floor(timestamp / width))
+        cells = (indexes, epoch % self.buckets)
+
+        # A bucket whose epoch has moved on is recycled before use.
+        stale = indexes[ring.epoch[cells] != epoch]
+        if len(stale):
+            stale_cells = (stale, epoch % self.buckets)
+            ring.epoch[stale_cells] = epoch
+            ring.count[stale_cells] = 0
+            ring.total[stale_cells] = 0
+            ring.total_squares[stale_cells] = 0
+            ring.minimum[stale_cells] = np.inf
+            ring.maximum[stale_cells] = -np.inf
+            ring.centroid_weights[stale_cells] = 0
+
+        new_shift = np.isnan(ring.shift[indexes])
+        ring.shift[indexes[new_shift]] = values[new_shift]
+        shifted = values - ring.shift[indexes]
+        ring.count[cells] += 1
+        ring.total[cells] += shifted
+        ring.total_squares[cells] += shifted * shifted
+        ring.minimum[cells] = np.minimum(ring.minimum[cells], values)
+        ring.maximum[cells] = np.maximum(ring.maximum[cells], values)
+
+        means = ring.centroid_means[cells]
+        weights = ring.centroid_weights[cells]
+        full = ~(weights == 0).any(axis=1)
+        if full.any():
+            means[full], weights[full] = compress_digests(means[full], weights[full])
+        slot = np.argmax(weights == 0, axis=1)
+        means[np.arange(len(means)), slot] = values
+        weights[np.arange(len(weights)), slot] = 1
+        ring.centroid_means[cells] = means
+        ring.centroid_weights[cells] = weights
+
+        previous = ring.ewma_time[indexes]
+        alpha = np.where(np.isnan(previous), 1.0, 1 - np.exp(-np.maximum(timestamp - previous, 0) / seconds))
+        current = ring.ewma[indexes]
+        ring.ewma[indexes] = np.where(np.isnan(current), values, current + alpha * (values - current))
+        ring.ewma_time[indexes] = timestamp
+
+    def update(self, symbols, values, timestamp=None):
+        # values maps metric name to one value per symbol; NaNs are skipped.
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            indexes = self.symbol_indexes(list(symbols))
+            for metric, metric_values in values.items():
+                if metric not in self.metrics:
+                    continue
+                metric_values = np.asarray(metric_values, dtype=np.float64)
+                valid = ~np.isnan(metric_values)
+                if valid.any():
+                    for window, seconds in self.windows.items():
+                        self.update_ring(self.ring(metric, window), seconds, indexes[valid],
+                                         metric_values[valid], timestamp)
+
+    def update_frame(self, df, timestamp=None):
+        # Level frames repeat the per-snapshot metrics on every level row, so one row per Item is enough.
+        if df is None or df.empty or 'Item' not in df.columns:
+            return
+        df = df.drop_duplicates('Item')
+        self.update(df['Item'].astype(str).tolist(),
+                    {metric: df[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+                     for metric in self.metrics if metric in df.columns},
+                    timestamp)
+
+    def window_summary(self, ring, index, window, now, quantiles):
+        if ring is None:
+            return {'count': 0}
+        epochs = ring.epoch[index]
+        current = np.floor(now / (self.windows[window] / self.buckets))
+        live = (epochs > current - self.buckets) & (epochs <= current) & (ring.count[index] > 0)
+        count = int(ring.count[index][live].sum())
+        summary = {'count': count}
+        if not count:
+            return summary
+
+        total = ring.total[index][live].sum()
+        total_squares = ring.total_squares[index][live].sum()
+        summary['mean'] = float(total / count + ring.shift[index])
+        summary['variance'] = float(max(total_squares - total * total / count, 0.0) / (count - 1)) if count > 1 else 0.0
+        summary['std'] = float(np.sqrt(summary['variance']))
+        summary['min'] = float(ring.minimum[index][live].min())
+        summary['max'] = float(ring.maximum[index][live].max())
+        summary['ewma'] = float(ring.ewma[index])
+
+        means = ring.centroid_means[index][live].ravel().astype(np.float64)
+        weights = ring.centroid_weights[index][live].ravel().astype(np.float64)
+        order = np.argsort(means[weights > 0])
+        means, weights = means[weights > 0][order], weights[weights > 0][order]
+        positions = np.cumsum(weights) - weights / 2
+        for quantile in quantiles:
+            value = np.interp(quantile * weights.sum(), positions, means)
+            summary[f'p{quantile * 100:g}'] = float(np.clip(value, summary['min'], summary['max']))
+        return summary
+
+    def query(self, symbol, window='1h', metric=None, quantiles=DEFAULT_QUANTILES, now=None):
+        now = time.time() if now is None else now
+        if window not in self.windows:
+            raise ValueError(f"Unknown window {window!r}")
+        with self.lock:
+            index = self.symbol_ids.get(symbol)
+            if index is None:
+                return {}
+            metrics = [metric] if metric else self.metrics
+            return {name: self.window_summary(self.rings.get((name, window)), index, window, now, quantiles)
+                    for name in metrics}
+
+    def frame(self, window='1h', quantiles=DEFAULT_QUANTILES, now=None):
+        rows = []
+        for symbol in list(self.symbols):
+            for metric, summary in self.query(symbol, window, quantiles=quantiles, now=now).items():
+                if summary.get('count'):
+                    rows.append(dict(summary, Item=symbol, Metric=metric, Window=window))
+        return pd.DataFrame(rows)
+
+    def memory_usage(self):
+        return sum(values.nbytes for ring in self.rings.values() for values in vars(ring).values())
@@ -0,0 +1,201 @@
+from threading import Lock
+import atexit
+import glob
+import os
+import numpy as np
+import pandas as pd
+
+
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+KEYS = ['Item', 'Band', 'Bucket_Start']
+BOOK_BAND = 'book'
+PARTIAL_COLUMNS = KEYS + [
+    'Count', 'Open_Time', 'Close_Time',
+    'Mid_Open', 'Mid_High', 'Mid_Low', 'Mid_Close',
+    'Spread_Open', 'Spread_High', 'Spread_Low', 'Spread_Close',
+    'Depth_Count', 'Bid_Depth_Sum', 'Bid_Depth_Max', 'Ask_Depth_Sum', 'Ask_Depth_Max',
+]
+
+
+def merge_partials(partials):
+    # Rollup rows are partial aggregates that combine associatively: counts and sums add, highs and lows
+    # take the extreme, opens come from the earliest and closes from the latest contribution. A single
+    # snapshot is a partial of one, so late snapshots and repeated flushes are merged the same way.
+    if partials.empty:
+        return partials.reindex(columns=PARTIAL_COLUMNS)
+    grouped = partials.groupby(KEYS, sort=True)
+    merged = grouped.agg(
+        Count=('Count', 'sum'), Open_Time=('Open_Time', 'min'), Close_Time=('Close_Time', 'max'),
+        Mid_High=('Mid_High', 'max'), Mid_Low=('Mid_Low', 'min'),
+        Spread_High=('Spread_High', 'max'), Spread_Low=('Spread_Low', 'min'),
+        Depth_Count=('Depth_Count', 'sum'),
+        Bid_Depth_Sum=('Bid_Depth_Sum', 'sum'), Bid_Depth_Max=('Bid_Depth_Max', 'max'),
+        Ask_Depth_Sum=('Ask_Depth_Sum', 'sum'), Ask_Depth_Max=('Ask_Depth_Max', 'max'),
+    )
+    opens = partials.sort_values('Open_Time', kind='stable').groupby(KEYS, sort=True)[
+        ['Mid_Open', 'Spread_Open']].first()
+    closes = partials.sort_values('Close_Time', kind='stable').groupby(KEYS, sort=True)[
+        ['Mid_Close', 'Spread_Close']].last()
+    return merged.join(opens).join(closes).reset_index()[PARTIAL_COLUMNS]
+
+
+def snapshot_partials(items, band, timestamp, mid=None, spread=None, bid_depth=None, ask_depth=None):
+    count = len(items)
+
+    def column(values):
+        return np.full(count, np.nan) if values is None else np.asarray(values, dtype=np.float64)
+
+    mid, spread, bid_depth, ask_depth = column(mid), column(spread), column(bid_depth), column(ask_depth)
+    has_depth = ~np.isnan(bid_depth) | ~np.isnan(ask_depth)
+    return pd.DataFrame({
+        'Item': np.asarray(items, dtype=object), 'Band': band, 'Bucket_Start': 0,
+        'Count': 1, 'Open_Time': timestamp, 'Close_Time': timestamp,
+        'Mid_Open': mid, 'Mid_High': mid, 'Mid_Low': mid, 'Mid_Close': mid,
+        'Spread_Open': spread, 'Spread_High': spread, 'Spread_Low': spread, 'Spread_Close': spread,
+        'Depth_Count': has_depth.astype(np.int64),
+        'Bid_Depth_Sum': np.nan_to_num(bid_depth), 'Bid_Depth_Max': bid_depth,
+        'Ask_Depth_Sum': np.nan_to_num(ask_depth), 'Ask_Depth_Max': ask_depth,
+    })
+
+
+def bucket_date(bucket_start):
+    return pd.DatetimeIndex(pd.to_datetime(np.atleast_1d(bucket_start), unit='s')).strftime('%Y-%m-%d')
+
+
+class Rollups:
+    def __init__(self, exchange, root='order_book_data', resolutions=RESOLUTIONS):
+        # Snapshots are buffered in memory and, whenever the minute turns, folded into partial 1m/1h/1d
+        # rows appended to small per-day files under <root>/rollups/<exchange>/<resolution>/. Readers
+        # merge partials on the fly; a day's files are compacted once the next day starts. A snapshot
+        # that arrives late for a closed bucket or day just appends one more partial.
+        self.exchange = exchange.lower()
+        self.root = root
+        self.resolutions = dict(resolutions)
+        self.lock = Lock()
+        self.pending = []
+        self.pending_minute = None
+        self.current_date = None
+
+    def path(self, resolution, date):
+        return rollup_path(self.root, self.exchange, resolution, date)
+
+    def add(self, partials, timestamp):
+        minute = int(timestamp // 60)
+        with self.lock:
+            if self.pending_minute is not None and minute != self.pending_minute:
+                self.flush_pending()
+            self.pending_minute = minute
+            self.pending.append(partials)
+
+    def update_frame(self, df, timestamp):
+        # Level or spread frames: one snapshot per Item with Best_Bid/Ask_Price, Spread and, for
+        # level frames, the whole fetched book's Total_Bid/Ask_Volume.
+        if df is None or df.empty or not {'Item', 'Best_Bid_Price', 'Best_Ask_Price'}.issubset(df.columns):
+            return
+        df = df.drop_duplicates('Item')
+        best_bid = df['Best_Bid_Price'].to_numpy(dtype=np.float64, na_value=np.nan)
+        best_ask = df['Best_Ask_Price'].to_numpy(dtype=np.float64, na_value=np.nan)
+        spread = df['Spread'] if 'Spread' in df.columns else best_ask - best_bid
+        self.add(snapshot_partials(
+            df['Item'].astype(str).to_numpy(), BOOK_BAND, timestamp, mid=(best_bid + best_ask) / 2, spread=spread,
+            bid_depth=df['Total_Bid_Volume'] if 'Total_Bid_Volume' in df.columns else None,
+            ask_depth=df['Total_Ask_Volume'] if 'Total_Ask_Volume' in df.columns else None
+        ), timestamp)
+
+    def update_depth(self, df, timestamp):
+        # Price-band depth frames (Item, Percentage, Total_Bid_Volume, Total_Ask_Volume): one band per Percentage.
+        if df is None or df.empty:
+            return
+        bands = df['Percentage'].map(lambda percentage: f"{percentage:g}%")
+        for band, rows in df.groupby(bands, sort=False):
+            self.add(snapshot_partials(rows['Item'].astype(str).to_numpy(), band, timestamp,
+                                       bid_depth=rows['Total_Bid_Volume'], ask_depth=rows['Total_Ask_Volume']),
+                     timestamp)
+
+    def flush_pending(self):
+        if not self.pending:
+            return
+        snapshots = pd.concat(self.pending, ignore_index=True)
+        self.pending = []
+        for resolution, seconds in self.resolutions.items():
+            partials = snapshots.assign(
+                Bucket_Start=(snapshots['Open_Time'] // seconds * seconds).astype(np.int64))
+            partials = merge_partials(partials)
+            for date, rows in partials.groupby(bucket_date(partials['Bucket_Start']), sort=False):
+                path = self.path(resolution, date)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                rows.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+        today = bucket_date(self.pending_minute * 60)[0]
+        if self.current_date is not None and today > self.current_date:
+            for resolution in self.resolutions:
+                self.compact_file(self.path(resolution, self.current_date))
+        self.current_date = today
+
+    def compact_file(self, path):
+        if not os.path.exists(path):
+            return
+        try:
+            merged = merge_partials(pd.read_csv(path))
+            temporary_path = f"{path}.tmp"
+            merged.to_csv(temporary_path, index=False)
+            os.replace(temporary_path, path)
+        except Exception as e:
+            print(f"Failed to compact rollups in {path}: {e}")
+
+    def compact(self, date):
+        with self.lock:
+            for resolution in self.resolutions:
+                self.compact_file(self.path(resolution, date))
+
+    def flush(self):
+        with self.lock:
+            self.flush_pending()
+
+    def close(self):
+        self.flush()
+
+
+def rollup_path(root, exchange, resolution, date):
+    return os.path.join(root, 'rollups', exchange.lower(), resolution, f"rollup_{exchange.lower()}_{resolution}_{date}.csv")
+
+
+def read_rollups(exchange, resolution='1h', start=None, end=None, items=None, root=None):
+    # Merged rollup rows of one exchange for the days between start and end (UTC dates or timestamps).
+    root = root or os.getenv("STORAGE_ROOT", "order_book_data")
+    first_date = pd.Timestamp(start).strftime('%Y-%m-%d') if start is not None else None
+    last_date = pd.Timestamp(end).strftime('%Y-%m-%d') if end is not None else None
+    frames = []
+    for path in sorted(glob.glob(rollup_path(root, exchange, resolution, '*'))):
+        date = os.path.basename(path)[-len('YYYY-MM-DD.csv'):-len('.csv')]
+        if (first_date is None or date >= first_date) and (last_date is None or date <= last_date):
+            frames.append(pd.read_csv(path, dtype={'Item': str, 'Band': str}))
+    if not frames:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+
+    partials = pd.concat(frames, ignore_index=True)
+    if items is not None:
+        partials = partials[partials['Item'].isin(list(items))]
+    merged = merge_partials(partials)
+    depth_count = merged['Depth_Count'].where(merged['Depth_Count'] > 0)
+    merged['Bid_Depth_Mean'] = merged['Bid_Depth_Sum'] / depth_count
+    merged['Ask_Depth_Mean'] = merged['Ask_Depth_Sum'] / depth_count
+    merged.insert(3, 'DateTime', pd.to_datetime(merged['Bucket_Start'], unit='s', utc=True))
+    return merged
+
+
+ROLLUPS = {}
+ROLLUPS_LOCK = Lock()
+
+
+def get_rollups(exchange):
+    # One writer per exchange and process, shared by all of its collectors; ROLLUPS_ENABLED=false turns
+    # rollups off. Files live next to the raw data under STORAGE_ROOT.
+    if os.getenv("ROLLUPS_ENABLED", "true").lower() != "true":
+        return None
+    with ROLLUPS_LOCK:
+        rollups = ROLLUPS.get(exchange)
+        if rollups is None:
+            rollups = ROLLUPS[exchange] = Rollups(exchange, os.getenv("STORAGE_ROOT", "order_book_data"))
+            atexit.register(rollups.close)
+        return rollups
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from order_book_arrays import OrderBookArrays
+
+
+DEFAULT_ORDER_SIZES = [1_000, 10_000, 50_000, 100_000]
+SLIPPAGE_COLUMNS = [('Item', 'symbol'), ('Date', 'date'), ('DateTime', 'datetime'), ('Timestamp', 'f8'),
+                    ('Side', 'symbol'), ('Order_Size', 'f8'), ('VWAP', 'f8'), ('Slippage_Bps', 'f8'),
+                    ('Levels_Consumed', 'i4'), ('Filled_Size', 'f8'), ('Complete', '?')]
+
+
+def side_fills(offsets, prices, volumes, sizes, unit):
+    # Volumes are positive, so the running total over every level of every market is one sorted
+    # array. Market i's fill for size s ends at the first level whose running total reaches
+    # total[start_i] + s, so a single searchsorted covers all markets and all sizes.
+    notional = prices * volumes
+    cumulative_base = np.concatenate(([0.0], np.cumsum(volumes)))
+    cumulative_quote = np.concatenate(([0.0], np.cumsum(notional)))
+    cumulative = cumulative_quote if unit == 'quote' else cumulative_base
+
+    starts = offsets[:-1]
+    ends = offsets[1:]
+    targets = cumulative[starts][:, None] + sizes[None, :]
+    fill_level = np.searchsorted(cumulative[1:], targets, side='left')
+    complete = fill_level < ends[:, None]
+    last = np.minimum(fill_level, np.maximum(ends - 1, starts)[:, None])
+    last = np.minimum(last, max(len(prices) - 1, 0))
+
+    base_before = cumulative_base[last] - cumulative_base[starts][:, None]
+    quote_before = cumulative_quote[last] - cumulative_quote[starts][:, None]
+    level_price = prices[last] if len(prices) else np.full(last.shape, np.nan)
+    level_volume = volumes[last] if len(volumes) else np.zeros(last.shape)
+
+    if unit == 'quote':
+        remainder = np.where(complete, (sizes[None, :] - quote_before) / level_price, level_volume)
+        filled_base = base_before + remainder
+        filled_quote = np.where(complete, sizes[None, :], quote_before + remainder * level_price)
+        filled = filled_quote
+    else:
+        remainder = np.where(complete, sizes[None, :] - base_before, level_volume)
+        filled_base = np.where(complete, sizes[None, :], base_before + remainder)
+        filled_quote = quote_before + remainder * level_price
+        filled = filled_base
+
+    empty = (ends == starts)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vwap = np.where(empty, np.nan, filled_quote / filled_base)
+    levels = np.where(empty, 0, last - starts[:, None] + 1)
+    filled = np.where(empty, 0.0, filled)
+    return vwap, levels, filled, complete & ~empty
+
+
+def slippage(arrays, sizes=DEFAULT_ORDER_SIZES, unit='quote'):
+    # Buys walk the asks and sells walk the bids. sizes are USDT notional (unit='quote') or base
+    # quantity (unit='base'). Every result is a (markets, sizes) array.
+    if unit not in ('quote', 'base'):
+        raise ValueError(f"Unknown order size unit: {unit}")
+    sizes = np.asarray(sizes, dtype=np.float64)
+    mid = arrays.mid_prices()[:, None]
+
+    buy_vwap, buy_levels, buy_filled, buy_complete = side_fills(
+        arrays.ask_offsets, arrays.ask_prices, arrays.ask_volumes, sizes, unit)
+    sell_vwap, sell_levels, sell_filled, sell_complete = side_fills(
+        arrays.bid_offsets, arrays.bid_prices, arrays.bid_volumes, sizes, unit)
+
+    return {
+        'buy': {'vwap': buy_vwap, 'slippage_bps': (buy_vwap - mid) / mid * 10_000,
+                'levels': buy_levels, 'filled': buy_filled, 'complete': buy_complete},
+        'sell': {'vwap': sell_vwap, 'slippage_bps': (mid - sell_vwap) / mid * 10_000,
+                 'levels': sell_levels, 'filled': sell_filled, 'complete': sell_complete},
+    }
+
+
+def slippage_frame(arrays, markets, sizes=DEFAULT_ORDER_SIZES, unit='quote'):
+    # Size-major rows per side, like band_depth_frame: markets repeated once per order size.
+    result = slippage(arrays, sizes, unit)
+    count = arrays.market_count()
+    sizes = np.asarray(sizes, dtype=np.float64)
+
+    frames = []
+    for side, values in result.items():
+        frame = markets.iloc[np.tile(np.arange(count), len(sizes))].reset_index(drop=True)
+        frame['Side'] = side
+        frame['Order_Size'] = np.repeat(sizes, count)
+        frame['Size_Unit'] = unit
+        frame['VWAP'] = values['vwap'].T.ravel()
+        frame['Slippage_Bps'] = values['slippage_bps'].T.ravel()
+        frame['Levels_Consumed'] = values['levels'].T.ravel()
+        frame['Filled_Size'] = values['filled'].T.ravel()
+        frame['Complete'] = values['complete'].T.ravel()
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def quote_slippage_frame(arrays, markets, quote_asset='USDT', sizes=DEFAULT_ORDER_SIZES):
+    # Order sizes are notional in quote_asset, so only the markets quoted in it are walked; an IRT or
+    # TMN market would read the same numbers as a few rials.
+    indices = np.flatnonzero([str(item).endswith(quote_asset) for item in arrays.items])
+    return slippage_frame(arrays.take(indices), markets.iloc[indices].reset_index(drop=True), sizes, 'quote')
+
+
+def store_slippage_frame(store, quote_asset='USDT', sizes=DEFAULT_ORDER_SIZES):
+    # Every (Item, Timestamp) snapshot in a level store becomes one market of a single batch, so a
+    # whole day of one symbol is walked in one call.
+    df = store.to_frame()
+    if df.empty:
+        return pd.DataFrame()
+    group_columns = ['Item', 'Timestamp']
+    arrays = OrderBookArrays.from_frame(df, group_columns=group_columns)
+    markets = df.drop_duplicates(group_columns)[['Item', 'Date', 'DateTime', 'Timestamp']].reset_index(drop=True)
+    return quote_slippage_frame(arrays, markets, quote_asset, sizes)
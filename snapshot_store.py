@@ -0,0 +1,157 @@
+import time
+import numpy as np
+import pandas as pd
+
+
+LEVEL_COLUMNS = [
+    ('Item', 'symbol'),
+    ('Timestamp', 'f8'),
+    ('DateTime', 'datetime'),
+    ('Date', 'date'),
+    ('Ask_Price', 'f8'),
+    ('Ask_Volume', 'f8'),
+    ('Bid_Price', 'f8'),
+    ('Bid_Volume', 'f8'),
+    ('Total_Ask_Volume', 'f8'),
+    ('Total_Bid_Volume', 'f8'),
+    ('Best_Bid_Price', 'f8'),
+    ('Best_Ask_Price', 'f8'),
+    ('Spread', 'f8'),
+    ('Reference_Price', 'f8'),
+]
+
+DERIVED_KINDS = ('datetime', 'date')
+
+
+class SnapshotStore:
+    def __init__(self, columns, timestamp_unit='s', datetime_format='%Y-%m-%dT%H:%M:%S.%f',
+                 initial_capacity=1024, wal=None):
+        # Rows live in one growable NumPy structured array. Symbols are interned to int32 ids and
+        # DateTime/Date columns are derived from Timestamp at export instead of being stored.
+        # Ingest_Time is a hidden append time used by exporters as a high-water mark.
+        # With a SnapshotWAL attached every append is also logged so restore() can rebuild the store.
+        self.columns = list(columns)
+        self.timestamp_unit = timestamp_unit
+        self.datetime_format = datetime_format
+        self.dtype = np.dtype([
+            (name, 'i4' if kind == 'symbol' else kind)
+            for name, kind in self.columns if kind not in DERIVED_KINDS
+        ] + [('Ingest_Time', 'f8')])
+        self.symbol_columns = [name for name, kind in self.columns if kind == 'symbol']
+
+        self.rows = np.empty(initial_capacity, dtype=self.dtype)
+        self.size = 0
+        self.symbols = []
+        self.symbol_ids = {}
+        self.wal = wal
+
+    def __len__(self):
+        return self.size
+
+    def symbol_id(self, symbol):
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbol_ids[symbol] = symbol_id
+            self.symbols.append(symbol)
+            if self.wal is not None:
+                self.wal.append_symbol(self, symbol_id, symbol)
+        return symbol_id
+
+    def reserve(self, count):
+        required = self.size + count
+        if required <= len(self.rows):
+            return
+        capacity = max(required, 2 * len(self.rows))
+        rows = np.empty(capacity, dtype=self.dtype)
+        rows[:self.size] = self.rows[:self.size]
+        self.rows = rows
+
+    def append_row(self, **values):
+        self.reserve(1)
+        row = self.rows[self.size]
+        values.setdefault('Ingest_Time', time.time())
+        for name in self.dtype.names:
+            value = values.get(name, np.nan)
+            row[name] = self.symbol_id(value) if name in self.symbol_columns else value
+        self.size += 1
+        if self.wal is not None:
+            self.wal.append_rows(self, self.rows[self.size - 1:self.size])
+
+    def append_columns(self, columns, length):
+        self.reserve(length)
+        block = self.rows[self.size:self.size + length]
+        columns.setdefault('Ingest_Time', time.time())
+        for name in self.dtype.names:
+            values = columns.get(name, np.nan)
+            if name in self.symbol_columns and np.ndim(values) == 0:
+                values = self.symbol_id(values)
+            elif name in self.symbol_columns:
+                codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+                values = np.asarray([self.symbol_id(symbol) for symbol in uniques], dtype=np.int32)[codes]
+            block[name] = values
+        self.size += length
+        if self.wal is not None:
+            self.wal.append_rows(self, block)
+        return block
+
+    def append_frame(self, df):
+        if df is None or df.empty:
+            return None
+        columns = {name: df[name].to_numpy() for name in self.dtype.names if name in df.columns}
+        return self.append_columns(columns, len(df))
+
+    def index_after(self, ingest_time):
+        return int(np.searchsorted(self.rows['Ingest_Time'][:self.size], ingest_time, side='right'))
+
+    def last_ingest_time(self):
+        return float(self.rows['Ingest_Time'][self.size - 1]) if self.size else None
+
+    def view(self, start=0, stop=None):
+        return self.rows[start:self.size if stop is None else min(stop, self.size)]
+
+    def to_frame(self, start=0, stop=None):
+        # The numeric columns are views into the store, so export the frame before clearing it.
+        rows = self.view(start, stop)
+        frame = {}
+        timestamps = None
+        for name, kind in self.columns:
+            if kind == 'symbol':
+                frame[name] = pd.Categorical.from_codes(rows[name], categories=pd.Index(self.symbols, dtype=object))
+            elif kind in DERIVED_KINDS:
+                # Levels of one snapshot share a timestamp, so format each distinct value once.
+                if timestamps is None:
+                    codes, uniques = pd.factorize(rows['Timestamp'], use_na_sentinel=False)
+                    timestamps = pd.to_datetime(uniques, unit=self.timestamp_unit)
+                if kind == 'datetime':
+                    frame[name] = timestamps.strftime(self.datetime_format).to_numpy(dtype=object)[codes]
+                else:
+                    frame[name] = timestamps.strftime('%Y-%m-%d').to_numpy(dtype=object)[codes]
+            else:
+                frame[name] = rows[name]
+        return pd.DataFrame(frame, copy=False)
+
+    def save(self, path, start=0, stop=None):
+        np.savez(path, rows=self.view(start, stop), symbols=np.asarray(self.symbols, dtype=str))
+
+    def restore(self):
+        if self.wal is None:
+            return 0
+        return self.wal.replay(self)
+
+    def compact(self):
+        if self.wal is not None:
+            self.wal.compact(self)
+
+    def clear(self):
+        self.size = 0
+        self.compact()
+
+    def memory_usage(self):
+        return {
+            'rows': self.size,
+            'capacity': len(self.rows),
+            'bytes_per_row': self.dtype.itemsize,
+            'bytes_used': self.size * self.dtype.itemsize,
+            'bytes_allocated': self.rows.nbytes,
+        }
@@ -0,0 +1,173 @@
+from threading import Lock
+import glob
+import json
+import os
+import struct
+import time
+import zlib
+import numpy as np
+
+
+RECORD_HEADER = struct.Struct('<BII')
+SYMBOL_HEADER = struct.Struct('<i')
+
+SCHEMA = 1
+SYMBOL = 2
+ROWS = 3
+RESET = 4
+
+
+def dtype_descr(dtype):
+    return json.loads(json.dumps(dtype.descr))
+
+
+class SnapshotWAL:
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, fsync_seconds=1.0):
+        # Segments are append-only files of [type u8][length u32][crc32 u32][payload] records.
+        # Records are flushed to the OS on every append and fsynced at most every fsync_seconds.
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_seconds = fsync_seconds
+
+        self.lock = Lock()
+        self.file = None
+        self.path = None
+        self.dtype = None
+        self.last_fsync = time.monotonic()
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.wal")))
+
+    def next_segment_path(self):
+        segments = self.segments()
+        sequence = int(os.path.basename(segments[-1])[8:-4]) + 1 if segments else 0
+        return os.path.join(self.directory, f"segment-{sequence:08d}.wal")
+
+    def write_record(self, kind, payload):
+        self.file.write(RECORD_HEADER.pack(kind, len(payload), zlib.crc32(payload)))
+        self.file.write(payload)
+
+    def open_segment(self, store, reset=False):
+        os.makedirs(self.directory, exist_ok=True)
+        self.close_segment()
+        self.path = self.next_segment_path()
+        self.file = open(self.path, 'ab')
+        self.dtype = store.dtype
+        self.write_record(SCHEMA, json.dumps(dtype_descr(store.dtype)).encode())
+        if reset:
+            self.write_record(RESET, b'')
+            for symbol_id, symbol in enumerate(store.symbols):
+                self.write_record(SYMBOL, SYMBOL_HEADER.pack(symbol_id) + symbol.encode())
+
+    def close_segment(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+    def commit(self, store):
+        self.file.flush()
+        now = time.monotonic()
+        if now - self.last_fsync >= self.fsync_seconds:
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+        if self.file.tell() >= self.segment_bytes:
+            self.open_segment(store, reset=False)
+
+    def append_symbol(self, store, symbol_id, symbol):
+        with self.lock:
+            if self.file is None:
+                self.open_segment(store, reset=True)
+            else:
+                self.write_record(SYMBOL, SYMBOL_HEADER.pack(symbol_id) + symbol.encode())
+            self.file.flush()
+
+    def append_rows(self, store, rows):
+        with self.lock:
+            if self.file is None:
+                self.open_segment(store, reset=True)
+            self.write_record(ROWS, np.ascontiguousarray(rows).tobytes())
+            self.commit(store)
+
+    def read_segment(self, path):
+        with open(path, 'rb') as segment:
+            data = segment.read()
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            kind, length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                print(f"Truncated write-ahead log record in {path} at byte {offset}; ignoring the rest.")
+                return
+            yield kind, payload
+            offset = start + length
+
+    def replay(self, store):
+        # Rebuild the store from every segment, then continue logging in a fresh segment.
+        with self.lock:
+            store.size = 0
+            store.symbols = []
+            store.symbol_ids = {}
+
+            for path in self.segments():
+                compatible = True
+                for kind, payload in self.read_segment(path):
+                    if kind == SCHEMA:
+                        compatible = np.dtype([tuple(field) for field in json.loads(payload)]) == store.dtype
+                        if not compatible:
+                            print(f"Skipping write-ahead log segment {path} written with a different schema.")
+                    elif not compatible:
+                        continue
+                    elif kind == RESET:
+                        store.size = 0
+                        store.symbols = []
+                        store.symbol_ids = {}
+                    elif kind == SYMBOL:
+                        symbol_id, = SYMBOL_HEADER.unpack_from(payload)
+                        symbol = payload[SYMBOL_HEADER.size:].decode()
+                        if symbol_id != len(store.symbols):
+                            print(f"Unexpected symbol id {symbol_id} in {path}.")
+                        store.symbol_ids[symbol] = len(store.symbols)
+                        store.symbols.append(symbol)
+                    elif kind == ROWS:
+                        rows = np.frombuffer(payload, dtype=store.dtype)
+                        store.reserve(len(rows))
+                        store.rows[store.size:store.size + len(rows)] = rows
+                        store.size += len(rows)
+
+        self.compact(store)
+        return store.size
+
+    def compact(self, store):
+        # Write the current contents as one checkpoint segment, then drop every older segment.
+        # A crash between the two steps is harmless because the checkpoint starts with a RESET.
+        with self.lock:
+            old_segments = self.segments()
+            self.open_segment(store, reset=True)
+            if store.size:
+                self.write_record(ROWS, store.view().tobytes())
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.last_fsync = time.monotonic()
+
+            for path in old_segments:
+                if path != self.path:
+                    os.remove(path)
+
+    def close(self):
+        with self.lock:
+            self.close_segment()
+
+
+def open_wal(name):
+    # WAL_ENABLED=false turns the log off; segments live under WAL_ROOT/<name>/.
+    if os.getenv("WAL_ENABLED", "true").lower() != "true":
+        return None
+    return SnapshotWAL(
+        os.path.join(os.getenv("WAL_ROOT", "order_book_data/wal"), name),
+        segment_bytes=int(os.getenv("WAL_SEGMENT_MB", "16")) * 1024 * 1024,
+        fsync_seconds=float(os.getenv("WAL_FSYNC_SECONDS", "1.0"))
+    )
@@ -0,0 +1,268 @@
+from datetime import datetime
+from threading import Lock
+import atexit
+import glob
+import os
+import numpy as np
+import pandas as pd
+import pytz
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from delta_codec import DeltaDecoder, DeltaEncoder
+
+
+def timestamp_ms(values):
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    # Collectors write epoch seconds (Binance, Bitpin, Wallex) or milliseconds (OKX, CoinEx, Nobitex).
+    if len(finite) and np.median(finite) < 1e11:
+        values = values * 1000
+    return np.round(values).astype(np.int64)
+
+
+def arrow_table(df, string_columns=('Item', 'Side', 'Size_Unit')):
+    columns = {}
+    milliseconds = timestamp_ms(df['Timestamp']) if 'Timestamp' in df.columns else None
+
+    for name in df.columns:
+        if name in string_columns:
+            columns[name] = pa.array(df[name].astype(str).to_numpy(dtype=object), pa.string()).dictionary_encode()
+        elif name == 'Timestamp':
+            columns[name] = pa.array(milliseconds, pa.int64())
+        elif name == 'DateTime' and milliseconds is not None:
+            columns[name] = pa.array(milliseconds, pa.int64()).cast(pa.timestamp('ms', tz='UTC'))
+        elif name == 'Date' and milliseconds is not None:
+            columns[name] = pa.array(milliseconds // 86_400_000, pa.int64()).cast(pa.int32()).cast(pa.date32())
+        elif pd.api.types.is_bool_dtype(df[name]):
+            columns[name] = pa.array(df[name].to_numpy(dtype=bool), pa.bool_())
+        else:
+            values = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+            columns[name] = pa.array(values, pa.float64())
+
+    return pa.table(columns)
+
+
+class CsvStorage:
+    def __init__(self, root='order_book_data'):
+        self.root = root
+        self.lock = Lock()
+
+    def path(self, exchange, symbol, date):
+        exchange = exchange.lower()
+        return os.path.join(self.root, exchange, f"order_book_{exchange}_{symbol}_{date}.csv")
+
+    def write(self, exchange, symbol, df, date=None):
+        if df is None or df.empty:
+            return
+        date = date or datetime.now(pytz.utc).strftime('%Y-%m-%d')
+        path = self.path(exchange, symbol, date)
+        with self.lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+    def read_day(self, exchange, symbol, date):
+        return pd.read_csv(self.path(exchange, symbol, date))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ArrowStorage:
+    def __init__(self, root='order_book_data', file_format='parquet', max_file_bytes=64 * 1024 * 1024,
+                 row_group_rows=10_000, compression='zstd'):
+        if file_format not in ('parquet', 'arrow'):
+            raise ValueError(f"Unknown storage format: {file_format}")
+
+        self.root = root
+        self.file_format = file_format
+        self.extension = 'parquet' if file_format == 'parquet' else 'arrows'
+        self.max_file_bytes = max_file_bytes
+        self.row_group_rows = row_group_rows
+        self.compression = compression
+
+        self.lock = Lock()
+        self.buffers = {}
+        self.buffered_rows = {}
+        self.writers = {}
+
+    def partition_dir(self, exchange, symbol, date):
+        return os.path.join(self.root, f"exchange={exchange.lower()}", f"symbol={symbol}", f"date={date}")
+
+    def part_files(self, directory):
+        return sorted(glob.glob(os.path.join(directory, f"part-*.{self.extension}")))
+
+    def open_writer(self, key, schema):
+        directory = self.partition_dir(*key)
+        os.makedirs(directory, exist_ok=True)
+        # Never reopen an existing part: after a restart or rollover writing continues in a new file.
+        path = os.path.join(directory, f"part-{len(self.part_files(directory)):05d}.{self.extension}")
+
+        if self.file_format == 'parquet':
+            sink = None
+            writer = pq.ParquetWriter(path, schema, compression=self.compression)
+        else:
+            sink = pa.OSFile(path, 'wb')
+            writer = ipc.new_stream(sink, schema, options=ipc.IpcWriteOptions(compression=self.compression))
+        self.writers[key] = (writer, path, schema, sink)
+        return writer, path
+
+    def close_writer(self, key):
+        # Closing an IPC stream writer finishes the stream but leaves the file we opened for it open.
+        writer, path, schema, sink = self.writers.pop(key)
+        writer.close()
+        if sink is not None:
+            sink.close()
+
+    def flush_partition(self, key):
+        tables = self.buffers.pop(key, [])
+        self.buffered_rows.pop(key, None)
+        if not tables:
+            return
+
+        table = pa.concat_tables(tables, promote_options='permissive').unify_dictionaries().combine_chunks()
+        if key in self.writers and not self.writers[key][2].equals(table.schema):
+            self.close_writer(key)
+        if key in self.writers:
+            writer, path, schema, sink = self.writers[key]
+        else:
+            writer, path = self.open_writer(key, table.schema)
+
+        if self.file_format == 'parquet':
+            writer.write_table(table, row_group_size=len(table))
+        else:
+            writer.write_table(table)
+
+        if os.path.getsize(path) >= self.max_file_bytes:
+            self.close_writer(key)
+
+    def write(self, exchange, symbol, df, date=None):
+        if df is None or df.empty:
+            return
+        date = date or datetime.now(pytz.utc).strftime('%Y-%m-%d')
+        key = (exchange, symbol, date)
+        table = arrow_table(df)
+
+        with self.lock:
+            self.buffers.setdefault(key, []).append(table)
+            self.buffered_rows[key] = self.buffered_rows.get(key, 0) + len(table)
+            if self.buffered_rows[key] >= self.row_group_rows:
+                self.flush_partition(key)
+
+            for open_key in [open_key for open_key in self.writers if open_key[2] != date]:
+                self.flush_partition(open_key)
+                if open_key in self.writers:
+                    self.close_writer(open_key)
+
+    def read_day(self, exchange, symbol, date):
+        paths = self.part_files(self.partition_dir(exchange, symbol, date))
+        if self.file_format == 'parquet':
+            tables = [pq.read_table(path) for path in paths]
+        else:
+            tables = []
+            for path in paths:
+                with pa.memory_map(path) as source:
+                    tables.append(ipc.open_stream(source).read_all())
+        if not tables:
+            return pd.DataFrame()
+        return pa.concat_tables(tables, promote_options='permissive').to_pandas(date_as_object=False)
+
+    def flush(self):
+        with self.lock:
+            for key in list(self.buffers):
+                self.flush_partition(key)
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            for key in list(self.writers):
+                self.close_writer(key)
+
+
+class DeltaStorage:
+    LEVEL_COLUMNS = ['Item', 'Timestamp', 'Ask_Price', 'Ask_Volume', 'Bid_Price', 'Bid_Volume']
+
+    def __init__(self, root='order_book_data', keyframe_interval=240, fallback=None):
+        # Order book level frames are delta-encoded per market (see delta_codec); every other frame,
+        # such as Wallex's spread table, goes to the fallback storage.
+        self.root = root
+        self.keyframe_interval = keyframe_interval
+        self.fallback = fallback or ArrowStorage(root)
+        self.lock = Lock()
+        self.encoders = {}
+
+    def path(self, exchange, item, date):
+        return os.path.join(self.root, f"exchange={exchange.lower()}", f"symbol={item}", f"date={date}", "book.obd")
+
+    def write(self, exchange, symbol, df, date=None):
+        if df is None or df.empty:
+            return
+        if not all(column in df.columns for column in self.LEVEL_COLUMNS):
+            self.fallback.write(exchange, symbol, df, date)
+            return
+        date = date or datetime.now(pytz.utc).strftime('%Y-%m-%d')
+        milliseconds = timestamp_ms(df['Timestamp'])
+
+        with self.lock:
+            written = {}
+            for (item, timestamp), rows in df.groupby([df['Item'].astype(str), milliseconds], sort=False):
+                key = (exchange, item, date)
+                encoder = self.encoders.get(key)
+                if encoder is None:
+                    encoder = self.encoders[key] = DeltaEncoder(self.path(*key), self.keyframe_interval)
+                encoder.append(timestamp, rows['Bid_Price'], rows['Bid_Volume'], rows['Ask_Price'], rows['Ask_Volume'])
+                written[key] = encoder
+
+            # Every write reaches disk before it returns: the open block of each market it touched
+            # is rewritten to its tail, while sealed blocks stay one per keyframe interval.
+            for encoder in written.values():
+                encoder.write_tail()
+
+            for open_key in [open_key for open_key in self.encoders if open_key[2] != date]:
+                self.encoders.pop(open_key).close()
+
+    def read_day(self, exchange, symbol, date):
+        path = self.path(exchange, symbol, date)
+        if not os.path.exists(path):
+            return self.fallback.read_day(exchange, symbol, date)
+        return DeltaDecoder(path).to_frame(symbol)
+
+    def flush(self):
+        # Open blocks are already on disk in their tails; sealing them early would only shorten them.
+        self.fallback.flush()
+
+    def close(self):
+        with self.lock:
+            for encoder in self.encoders.values():
+                encoder.close()
+            self.encoders = {}
+        self.fallback.close()
+
+
+STORAGE = None
+STORAGE_LOCK = Lock()
+
+
+def get_storage():
+    # STORAGE_BACKEND selects csv (default), parquet, arrow or delta; one instance is shared per process.
+    global STORAGE
+    with STORAGE_LOCK:
+        if STORAGE is None:
+            backend = os.getenv("STORAGE_BACKEND", "csv").lower()
+            root = os.getenv("STORAGE_ROOT", "order_book_data")
+            if backend == 'csv':
+                STORAGE = CsvStorage(root)
+            elif backend == 'delta':
+                STORAGE = DeltaStorage(root, keyframe_interval=int(os.getenv("DELTA_KEYFRAME_INTERVAL", "240")))
+            else:
+                STORAGE = ArrowStorage(
+                    root,
+                    file_format=backend,
+                    max_file_bytes=int(os.getenv("STORAGE_MAX_FILE_MB", "64")) * 1024 * 1024,
+                    row_group_rows=int(os.getenv("STORAGE_ROW_GROUP_ROWS", "10000"))
+                )
+            atexit.register(STORAGE.close)
+        return STORAGE
@@ -0,0 +1,64 @@
+import copy
+import os
+import resource
+import yaml
+
+
+# What the runners tracked before the universe became configurable. Nobitex and Wallex always
+# poll their /all endpoints, so they only take `enabled`.
+DEFAULT_UNIVERSE = {
+    'binance': {'symbols': ['BTCUSDT', 'ETHUSDT']},
+    'okx': {'symbols': ['BTC-USDT', 'ETH-USDT']},
+    'coinex': {'symbols': ['BTCUSDT', 'ETHUSDT']},
+    'bitpin': {'symbols': ['BTC_USDT', 'ETH_USDT']},
+    'nobitex': {},
+    'wallex': {},
+}
+
+
+def load_universe(path=None):
+    # SYMBOLS_CONFIG names a YAML file (default symbols.yaml) of the form
+    #   exchanges:
+    #     binance: {symbols: [BTCUSDT, ETHUSDT], concurrency: 2}
+    #     okx: {enabled: false}
+    # and <EXCHANGE>_SYMBOLS=A,B,C overrides one exchange's symbols from the environment.
+    path = path or os.getenv("SYMBOLS_CONFIG", "symbols.yaml")
+    universe = copy.deepcopy(DEFAULT_UNIVERSE)
+
+    if os.path.exists(path):
+        with open(path) as config_file:
+            config = yaml.safe_load(config_file) or {}
+        for exchange, settings in (config.get('exchanges') or {}).items():
+            if exchange not in universe:
+                raise ValueError(f"Unknown exchange in {path}: {exchange}")
+            if isinstance(settings, list):
+                settings = {'symbols': settings}
+            universe[exchange].update(settings or {})
+
+    for exchange, settings in universe.items():
+        override = os.getenv(f"{exchange.upper()}_SYMBOLS")
+        if override:
+            settings['symbols'] = [symbol.strip() for symbol in override.split(',') if symbol.strip()]
+        if 'symbols' in settings and len(set(settings['symbols'])) != len(settings['symbols']):
+            raise ValueError(f"Duplicate symbols configured for {exchange}.")
+
+    return {exchange: settings for exchange, settings in universe.items() if settings.get('enabled', True)}
+
+
+def universe_symbols(universe, exchange):
+    return list(universe.get(exchange, {}).get('symbols', []))
+
+
+def concurrency_caps(universe):
+    return {exchange: settings['concurrency'] for exchange, settings in universe.items() if 'concurrency' in settings}
+
+
+def raise_open_file_limit():
+    # Every symbol keeps a write-ahead log segment open, so hundreds of symbols per exchange can pass
+    # the common soft limit of 1024 descriptors. The soft limit may be raised up to the hard one.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as e:
+            print(f"Could not raise the open file limit from {soft}: {e}")
@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+import fcntl
+import gzip
+import io
+import json
+import os
+import tempfile
+import pytz
+from telegram import Bot
+from telegram.utils.request import Request
+from metrics import stage_timer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+STATE_LOCK = Lock()
+
+
+BOTS = {}
+BOTS_LOCK = Lock()
+
+
+def create_bot(telegram_bot_token):
+    # One Bot per token and process, shared by every collector: each Bot holds its own connection pool,
+    # so a Bot per symbol would open hundreds of them. TELEGRAM_CONNECTIONS sizes the shared pool.
+    # TELEGRAM_API_URL points the bot at a stand-in Bot API server, e.g. http://127.0.0.1:8081/bot
+    base_url = os.getenv("TELEGRAM_API_URL")
+    with BOTS_LOCK:
+        bot = BOTS.get((telegram_bot_token, base_url))
+        if bot is None:
+            request = Request(con_pool_size=int(os.getenv("TELEGRAM_CONNECTIONS", "8")))
+            bot = BOTS[(telegram_bot_token, base_url)] = Bot(token=telegram_bot_token, base_url=base_url,
+                                                             request=request)
+        return bot
+
+
+class TelegramExporter:
+    def __init__(self, telegram_bot, telegram_chat_id, mode=None, compression=None, daily_file=None,
+                 state_path=None):
+        self.telegram_bot = telegram_bot
+        self.telegram_chat_id = telegram_chat_id
+        self.mode = mode or os.getenv("TELEGRAM_EXPORT_MODE", "delta")
+        self.compression = compression or os.getenv("TELEGRAM_EXPORT_COMPRESSION", "gzip")
+        if daily_file is None:
+            daily_file = os.getenv("TELEGRAM_DAILY_FILE", "true").lower() == "true"
+        self.daily_file = daily_file
+        self.state_path = state_path or os.getenv("TELEGRAM_EXPORT_STATE", "order_book_data/telegram_export_state.json")
+
+        if self.mode not in ("delta", "full"):
+            raise ValueError(f"Unknown Telegram export mode: {self.mode}")
+        if self.compression not in ("none", "gzip", "zstd"):
+            raise ValueError(f"Unknown Telegram export compression: {self.compression}")
+        if self.compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package.")
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as state_file:
+                return json.load(state_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_state(self, state):
+        # A temp file of its own per write, so a concurrent writer never replaces or truncates ours.
+        directory, file_name = os.path.split(self.state_path)
+        with tempfile.NamedTemporaryFile('w', dir=directory or '.', prefix=f"{file_name}.",
+                                         suffix='.tmp', delete=False) as state_file:
+            json.dump(state, state_file)
+        os.replace(state_file.name, self.state_path)
+
+    @contextmanager
+    def locked_state(self):
+        # STATE_LOCK orders this process's threads; flock on a sidecar file orders the processes sharing
+        # the state file, e.g. the local and international containers, so neither loses the other's marks.
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with STATE_LOCK, open(f"{self.state_path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield self.load_state()
+
+    def high_water_mark(self, name, date):
+        with STATE_LOCK:
+            entry = self.load_state().get(name)
+        if entry and entry['date'] == date:
+            return entry['ingest_time']
+        return None
+
+    def set_high_water_mark(self, name, date, ingest_time):
+        with self.locked_state() as state:
+            state[name] = {'date': date, 'ingest_time': ingest_time}
+            self.save_state(state)
+
+    def compress(self, payload):
+        if self.compression == "gzip":
+            return gzip.compress(payload, compresslevel=6), ".csv.gz"
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=6).compress(payload), ".csv.zst"
+        return payload, ".csv"
+
+    def send_frame(self, df, file_stem):
+        csv_buffer = io.BytesIO()
+        df.to_csv(csv_buffer, index=False, encoding='utf-8')
+        payload, extension = self.compress(csv_buffer.getvalue())
+
+        self.telegram_bot.send_document(
+            chat_id=self.telegram_chat_id,
+            document=io.BytesIO(payload),
+            filename=f"{file_stem}{extension}"
+        )
+
+    def export(self, name, store, date=None):
+        date = date or datetime.now(pytz.utc).strftime('%Y-%m-%d')
+        start = 0
+        if self.mode == "delta":
+            high_water_mark = self.high_water_mark(name, date)
+            if high_water_mark is not None:
+                start = store.index_after(high_water_mark)
+
+        if start >= len(store):
+            return False
+
+        last_ingest_time = store.last_ingest_time()
+        if self.mode == "delta":
+            file_stem = f"{name}_{date}_{datetime.now(pytz.utc).strftime('%H%M')}"
+        else:
+            file_stem = f"{name}_{date}"
+
+        with stage_timer(name.split('_')[0], 'export'):
+            self.send_frame(store.to_frame(start), file_stem)
+        self.set_high_water_mark(name, date, last_ingest_time)
+        return True
+
+    def export_daily(self, name, store, date):
+        if self.mode != "delta" or not self.daily_file or not len(store):
+            return False
+
+        self.send_frame(store.to_frame(), f"{name}_{date}_daily")
+        return True
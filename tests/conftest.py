@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import storage
+
+
+@pytest.fixture
+def collector_env(monkeypatch, tmp_path):
+    # Collectors built in a test write under tmp_path, without a write-ahead log or rollups, through
+    # a storage instance of their own.
+    monkeypatch.setenv("WAL_ENABLED", "false")
+    monkeypatch.setenv("ROLLUPS_ENABLED", "false")
+    monkeypatch.setenv("STORAGE_ROOT", str(tmp_path / 'order_book_data'))
+    monkeypatch.setenv("TELEGRAM_EXPORT_STATE", str(tmp_path / 'telegram_export_state.json'))
+    monkeypatch.setattr(storage, 'STORAGE', None)
+    yield tmp_path / 'order_book_data'
+    if storage.STORAGE is not None:
+        storage.STORAGE.close()
@@ -0,0 +1,134 @@
+import asyncio
+import json
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from binance_depth_stream import BinanceDepthStream
+
+
+SYMBOL = 'BTCUSDT'
+
+
+class StandIn:
+    # A local Binance: /stream pushes whatever events the test queues and /api/v3/depth answers with the
+    # next scripted snapshot, optionally holding it back until the test opens the gate.
+    def __init__(self, snapshots):
+        self.snapshots = list(snapshots)
+        self.snapshot_requests = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.events = asyncio.Queue()
+        self.app = web.Application()
+        self.app.router.add_get('/stream', self.stream)
+        self.app.router.add_get('/api/v3/depth', self.depth)
+        self.server = TestServer(self.app)
+
+    async def stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        while True:
+            event = await self.events.get()
+            await ws.send_str(json.dumps({'stream': f"{SYMBOL.lower()}@depth@100ms", 'data': event}))
+
+    async def depth(self, request):
+        self.snapshot_requests += 1
+        await self.gate.wait()
+        return web.json_response(self.snapshots.pop(0))
+
+    def push(self, first_id, final_id, bids=(), asks=()):
+        self.events.put_nowait({'e': 'depthUpdate', 's': SYMBOL, 'U': first_id, 'u': final_id,
+                                'b': [list(level) for level in bids], 'a': [list(level) for level in asks]})
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Timed out waiting for the depth stream")
+        await asyncio.sleep(0.01)
+
+
+def run_against_stand_in(snapshots, scenario):
+    async def main():
+        stand_in = StandIn(snapshots)
+        await stand_in.server.start_server()
+        url = str(stand_in.server.make_url(''))
+        stream = BinanceDepthStream([SYMBOL], ws_url=url, rest_url=url, reconnect_seconds=0.01)
+        task = asyncio.create_task(stream.run())
+        try:
+            await scenario(stand_in, stream)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await stand_in.server.close()
+
+    asyncio.run(main())
+
+
+def test_buffers_until_snapshot_then_applies_in_sequence():
+    snapshots = [
+        {'lastUpdateId': 100, 'bids': [['99.00', '1']], 'asks': [['101.00', '1']]},
+        {'lastUpdateId': 112, 'bids': [['95.00', '1']], 'asks': [['105.00', '1']]},
+    ]
+
+    async def scenario(stand_in, stream):
+        stand_in.gate.clear()
+        stand_in.push(90, 95, bids=[('98.00', '5')])
+        stand_in.push(96, 102, bids=[('99.00', '2')])
+        stand_in.push(103, 105, asks=[('101.00', '0'), ('102.00', '3')])
+
+        # Events that arrive before the snapshot are buffered and the book is not served yet.
+        await wait_for(lambda: len(stream.buffers[SYMBOL]) == 3)
+        assert stream.last_update_id[SYMBOL] is None
+        assert stream.get_order_book(SYMBOL) is None
+
+        # The event with u <= lastUpdateId is dropped; the first applied one has U <= lastUpdateId + 1 <= u.
+        stand_in.gate.set()
+        await wait_for(lambda: stream.last_update_id[SYMBOL] == 105)
+        book = stream.get_order_book(SYMBOL)
+        assert book['bids'] == [['99.00', '2']]
+        assert book['asks'] == [['102.00', '3']]
+        assert stream.buffers[SYMBOL] == []
+
+        # Once in sync, stale events are ignored and the next one in sequence is applied.
+        stand_in.push(104, 105, bids=[('97.00', '1')])
+        stand_in.push(106, 107, bids=[('98.50', '4')])
+        await wait_for(lambda: stream.last_update_id[SYMBOL] == 107)
+        assert stream.get_order_book(SYMBOL)['bids'] == [['99.00', '2'], ['98.50', '4']]
+
+        # A gap in update ids triggers a resync from a fresh snapshot.
+        stand_in.push(110, 111, bids=[('96.00', '1')])
+        await wait_for(lambda: stream.last_update_id[SYMBOL] == 112)
+        await wait_for(lambda: not stream.resync_tasks)
+        assert stand_in.snapshot_requests == 2
+        assert stream.resync_count[SYMBOL] == 2
+        assert stream.get_order_book(SYMBOL) == {
+            'lastUpdateId': 112, 'bids': [['95.00', '1']], 'asks': [['105.00', '1']]}
+
+    run_against_stand_in(snapshots, scenario)
+
+
+def test_resync_recovers_from_malformed_and_stale_snapshots():
+    snapshots = [
+        {'bids': []},
+        {'lastUpdateId': 10, 'bids': [['99.00', '1']], 'asks': [['101.00', '1']]},
+        {'lastUpdateId': 62, 'bids': [['99.00', '1']], 'asks': [['101.00', '1']]},
+    ]
+
+    async def scenario(stand_in, stream):
+        # A malformed snapshot must not leave the symbol stuck with a dead resync task.
+        stand_in.push(50, 60, bids=[('98.00', '1')])
+        await wait_for(lambda: stand_in.snapshot_requests == 1 and not stream.resync_tasks)
+        assert stream.last_update_id[SYMBOL] is None
+
+        # The next event schedules another attempt. That snapshot is older than the buffered events
+        # (U > lastUpdateId + 1), so it is thrown away and a third one is fetched.
+        stand_in.push(61, 62, bids=[('97.00', '1')])
+        await wait_for(lambda: stream.last_update_id[SYMBOL] == 62)
+        await wait_for(lambda: not stream.resync_tasks)
+        assert stand_in.snapshot_requests == 3
+
+        stand_in.push(63, 64, asks=[('102.00', '2')])
+        await wait_for(lambda: stream.last_update_id[SYMBOL] == 64)
+        assert stream.get_order_book(SYMBOL)['asks'] == [['101.00', '1'], ['102.00', '2']]
+
+    run_against_stand_in(snapshots, scenario)
@@ -0,0 +1,65 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import pytz
+from consolidated_book import ConsolidatedBook
+from order_book_arrays import OrderBookArrays
+
+
+RECEIVED_AT = 1735689600.0
+
+
+@pytest.fixture
+def book(collector_env):
+    return ConsolidatedBook(max_age_seconds=30)
+
+
+def level_rows(item, bids, asks):
+    # The per-level frame of the Binance/OKX/CoinEx/Bitpin collectors, the shorter side padded with NaN.
+    levels = max(len(bids), len(asks))
+    bids = bids + [(np.nan, np.nan)] * (levels - len(bids))
+    asks = asks + [(np.nan, np.nan)] * (levels - len(asks))
+    return pd.DataFrame({
+        'Item': item,
+        'Timestamp': RECEIVED_AT,
+        'Bid_Price': [price for price, _ in bids],
+        'Bid_Volume': [volume for _, volume in bids],
+        'Ask_Price': [price for price, _ in asks],
+        'Ask_Volume': [volume for _, volume in asks],
+    })
+
+
+def test_merges_every_level_of_two_books(book):
+    book.update_frame('binance', level_rows('BTCUSDT', [(99.0, 1.0), (98.0, 2.0), (97.0, 1.0)],
+                                            [(101.0, 1.0), (102.0, 1.0), (103.0, 2.0), (0.0, 5.0)]), RECEIVED_AT)
+    book.update_arrays('nobitex', OrderBookArrays.from_level_lists(
+        ['BTC-USDT'], [[['97.5', '3'], ['99.5', '1']]], [[['100.5', '2'], ['102.5', '1'], ['104', '1']]]),
+        RECEIVED_AT)
+
+    bids, asks = book.merged_levels(book.fresh_venues('BTCUSDT', RECEIVED_AT)[0])
+    assert bids == [(99.5, 1.0, 'nobitex'), (99.0, 1.0, 'binance'), (98.0, 2.0, 'binance'),
+                    (97.5, 3.0, 'nobitex'), (97.0, 1.0, 'binance')]
+    assert asks == [(100.5, 2.0, 'nobitex'), (101.0, 1.0, 'binance'), (102.0, 1.0, 'binance'),
+                    (102.5, 1.0, 'nobitex'), (103.0, 2.0, 'binance'), (104.0, 1.0, 'nobitex')]
+
+    row = book.tick(datetime.fromtimestamp(RECEIVED_AT, pytz.utc)).iloc[0]
+    assert row['Item'] == 'BTCUSDT'
+    assert (row['Best_Bid_Price'], row['Best_Bid_Venue']) == (99.5, 'nobitex')
+    assert (row['Best_Ask_Price'], row['Best_Ask_Venue']) == (100.5, 'nobitex')
+    assert row['Reference_Price'] == 100.0
+    assert row['Arbitrage_Spread'] == -1.0
+    # Around a reference of 100: the touch, then levels within 2%, 5% and 10% of it on every venue.
+    assert [row[f'Total_Bid_Volume_{percentage}'] for percentage in (0, 2, 5, 10)] == [1.0, 4.0, 8.0, 8.0]
+    assert [row[f'Total_Ask_Volume_{percentage}'] for percentage in (0, 2, 5, 10)] == [2.0, 4.0, 8.0, 8.0]
+
+
+def test_stale_venues_leave_the_merge(book):
+    book.update_frame('binance', level_rows('BTCUSDT', [(99.0, 1.0)], [(101.0, 1.0)]), RECEIVED_AT - 60)
+    book.update_frame('okx', level_rows('BTC-USDT', [(98.0, 1.0), (97.0, 1.0)], [(102.0, 1.0)]), RECEIVED_AT)
+
+    row = book.tick(datetime.fromtimestamp(RECEIVED_AT, pytz.utc)).iloc[0]
+    assert (row['Venue_Count'], row['Stale_Venue_Count']) == (1, 1)
+    assert (row['Best_Bid_Price'], row['Best_Ask_Price']) == (98.0, 102.0)
+    assert row['Total_Bid_Volume_2'] == 1.0
+    assert row['Total_Bid_Volume_5'] == 2.0
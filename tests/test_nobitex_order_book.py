@@ -0,0 +1,59 @@
+from datetime import datetime
+import pytest
+import pytz
+from nobitex_order_book import OrderBookCollectorNobitex
+
+
+LAST_UPDATE = 1735689600000
+
+
+@pytest.fixture
+def collector(collector_env):
+    return OrderBookCollectorNobitex('123456:stand-in-token', '42')
+
+
+def uneven_payload():
+    # Three asks against two bids: every level of the deeper side has to count.
+    return {
+        'status': 'ok',
+        'BTCUSDT': {
+            'lastUpdate': LAST_UPDATE,
+            'lastTradePrice': '100',
+            'asks': [['101', '1'], ['102', '2'], ['103', '1']],
+            'bids': [['99', '1'], ['98', '1']],
+        },
+    }
+
+
+def analyze(collector, payload):
+    return collector.analyze(*collector.prepare(datetime.now(pytz.utc), payload))
+
+
+def test_depth_counts_every_level_of_the_deeper_side(collector):
+    spread_df, depth_df, slippage_df, unchanged_df, last_updates, arrays = analyze(collector, uneven_payload())
+
+    assert arrays.ask_prices.tolist() == [101.0, 102.0, 103.0]
+    assert arrays.bid_prices.tolist() == [99.0, 98.0]
+    assert spread_df[['Item', 'Best_Bid_Price', 'Best_Ask_Price', 'Spread', 'Reference_Price']].values.tolist() == [
+        ['BTCUSDT', 99.0, 101.0, 2.0, 100.0]]
+    assert spread_df['DateTime'].tolist() == ['2025-01-01T00:00:00.000']
+
+    depth = depth_df.set_index('Percentage')
+    assert depth.loc[10, 'Total_Ask_Volume'] == 4.0
+    assert depth.loc[10, 'Total_Bid_Volume'] == 2.0
+    assert depth.loc[0, 'Total_Ask_Volume'] == 1.0
+    assert last_updates == {'BTCUSDT': LAST_UPDATE}
+
+
+def test_slippage_walks_every_level_of_the_deeper_side(collector):
+    slippage_df = analyze(collector, uneven_payload())[2]
+
+    buy = slippage_df[(slippage_df['Side'] == 'buy') & (slippage_df['Order_Size'] == 1000)].iloc[0]
+    assert buy['Filled_Size'] == 101 + 2 * 102 + 103 == 408
+    assert buy['Levels_Consumed'] == 3
+    assert buy['VWAP'] == 408 / 4
+    assert not buy['Complete']
+
+    sell = slippage_df[(slippage_df['Side'] == 'sell') & (slippage_df['Order_Size'] == 1000)].iloc[0]
+    assert sell['Filled_Size'] == 99 + 98
+    assert sell['Levels_Consumed'] == 2
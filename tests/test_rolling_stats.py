@@ -0,0 +1,35 @@
+import numpy as np
+from rolling_stats import RollingStats, STAT_METRICS
+
+
+START = 1735689600.0
+
+
+def test_rings_are_allocated_for_the_metrics_that_get_values():
+    stats = RollingStats(initial_symbols=1)
+    assert stats.memory_usage() == 0
+
+    stats.update(['BTCUSDT'], {'Spread': [2.0], 'Best_Bid_Price': [np.nan]}, START)
+    assert sorted(stats.rings) == sorted(('Spread', window) for window in stats.windows)
+    assert stats.memory_usage() == len(stats.windows) * stats.ring_bytes()
+
+
+def test_memory_per_symbol_stays_within_the_documented_bound():
+    stats = RollingStats()
+    symbols = [f"MARKET{index}" for index in range(500)]
+    values = np.random.default_rng(0).normal(100.0, 1.0, (300, len(symbols)))
+    for tick, row in enumerate(values):
+        stats.update(symbols, {metric: row for metric in STAT_METRICS}, START + 15 * tick)
+
+    assert stats.ring_bytes() == 2856
+    assert stats.memory_usage() == stats.capacity * len(STAT_METRICS) * len(stats.windows) * 2856
+    assert stats.memory_usage() / len(symbols) <= 57_120
+
+    # An hour of 15 s ticks: 240 values, summarized from the float32 digests without losing the moments.
+    summary = stats.query('MARKET7', '1h', 'Spread', now=START + 15 * 299)['Spread']
+    recent = values[-240:, 7]
+    assert summary['count'] == 240
+    assert np.isclose(summary['mean'], recent.mean())
+    assert np.isclose(summary['std'], recent.std(ddof=1))
+    assert summary['min'] == recent.min() and summary['max'] == recent.max()
+    assert abs(summary['p50'] - np.median(recent)) < 0.2
@@ -0,0 +1,127 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytz
+from binance_orderbook import OrderBookCollectorBinance
+from snapshot_store import LEVEL_COLUMNS, SnapshotStore
+from snapshot_wal import SnapshotWAL
+
+
+def level_frame(item, timestamp, levels=3):
+    prices = np.arange(levels, dtype=np.float64)
+    return pd.DataFrame({
+        'Item': item,
+        'Timestamp': timestamp,
+        'DateTime': 'ignored, derived from Timestamp',
+        'Date': 'ignored',
+        'Ask_Price': 101.0 + prices,
+        'Ask_Volume': 1.0 + prices,
+        'Bid_Price': 99.0 - prices,
+        'Bid_Volume': 2.0 + prices,
+        'Total_Ask_Volume': 6.0,
+        'Total_Bid_Volume': 9.0,
+        'Best_Bid_Price': 99.0,
+        'Best_Ask_Price': 101.0,
+        'Spread': 2.0,
+        'Reference_Price': 100.0,
+    })
+
+
+def test_level_schema_bytes_per_row():
+    # int32 symbol id, eleven float64 level columns and the hidden float64 Ingest_Time;
+    # DateTime and Date take no space because they are derived at export.
+    store = SnapshotStore(LEVEL_COLUMNS)
+    usage = store.memory_usage()
+    assert usage['bytes_per_row'] == 4 + 11 * 8 + 8 == 100
+    assert store.dtype.names.count('DateTime') == 0
+    assert store.dtype.names.count('Date') == 0
+
+
+def test_allocation_doubles_when_full():
+    store = SnapshotStore(LEVEL_COLUMNS, initial_capacity=4)
+    store.append_frame(level_frame('BTCUSDT', 1735603200.0, levels=4))
+    assert store.memory_usage() == {'rows': 4, 'capacity': 4, 'bytes_per_row': 100, 'bytes_used': 400,
+                                    'bytes_allocated': 400}
+
+    store.append_frame(level_frame('BTCUSDT', 1735603215.0, levels=1))
+    usage = store.memory_usage()
+    assert usage['capacity'] == 8
+    assert usage['bytes_allocated'] == 800
+    assert usage['bytes_used'] == 500
+
+
+def test_symbols_are_interned():
+    store = SnapshotStore(LEVEL_COLUMNS)
+    store.append_frame(level_frame('BTCUSDT', 1735603200.0))
+    store.append_frame(level_frame('ETHUSDT', 1735603200.0))
+    store.append_frame(level_frame('BTCUSDT', 1735603215.0))
+    store.append_row(Item='ETHUSDT', Timestamp=1735603230.0, Spread=1.5)
+
+    assert store.symbols == ['BTCUSDT', 'ETHUSDT']
+    assert store.view()['Item'].dtype == np.int32
+    assert store.view()['Item'].tolist() == [0, 0, 0, 1, 1, 1, 0, 0, 0, 1]
+
+
+def test_to_frame_derives_datetime_and_date():
+    store = SnapshotStore(LEVEL_COLUMNS, timestamp_unit='ms')
+    store.append_frame(level_frame('BTCUSDT', 1735689599123))
+    store.append_frame(level_frame('ETHUSDT', 1735689600000))
+
+    frame = store.to_frame()
+    assert list(frame.columns) == [name for name, _ in LEVEL_COLUMNS]
+    assert isinstance(frame['Item'].dtype, pd.CategoricalDtype)
+    assert frame['Item'].astype(str).tolist() == ['BTCUSDT'] * 3 + ['ETHUSDT'] * 3
+    assert frame['DateTime'].tolist() == ['2024-12-31T23:59:59.123000'] * 3 + ['2025-01-01T00:00:00.000000'] * 3
+    assert frame['Date'].tolist() == ['2024-12-31'] * 3 + ['2025-01-01'] * 3
+    assert frame['Ask_Price'].tolist() == [101.0, 102.0, 103.0] * 2
+    assert frame.loc[1:4, 'Timestamp'].tolist() == [1735689599123, 1735689599123, 1735689600000, 1735689600000]
+
+
+def test_save_and_restore_round_trip(tmp_path):
+    wal = SnapshotWAL(str(tmp_path / 'wal'), fsync_seconds=0)
+    store = SnapshotStore(LEVEL_COLUMNS, initial_capacity=2, wal=wal)
+    store.append_frame(level_frame('BTCUSDT', 1735603200.0))
+    store.append_frame(level_frame('ETHUSDT', 1735603200.0))
+    store.append_row(Item='SOLUSDT', Timestamp=1735603215.0, Best_Bid_Price=190.0, Best_Ask_Price=190.1)
+    expected = store.to_frame()
+
+    store.save(str(tmp_path / 'rows.npz'))
+    saved = np.load(str(tmp_path / 'rows.npz'))
+    assert saved['symbols'].tolist() == ['BTCUSDT', 'ETHUSDT', 'SOLUSDT']
+    assert saved['rows'].dtype == store.dtype
+    assert saved['rows'].tobytes() == store.view().tobytes()
+    wal.close()
+
+    restored = SnapshotStore(LEVEL_COLUMNS, wal=SnapshotWAL(str(tmp_path / 'wal')))
+    assert restored.restore() == 7
+    assert restored.symbols == store.symbols
+    assert restored.last_ingest_time() == store.last_ingest_time()
+    pd.testing.assert_frame_equal(restored.to_frame(), expected)
+
+    # Symbols interned after the restart continue the restored ids.
+    restored.append_frame(level_frame('ETHUSDT', 1735603230.0, levels=1))
+    restored.append_frame(level_frame('XRPUSDT', 1735603230.0, levels=1))
+    assert restored.symbols == ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT']
+    assert restored.view()['Item'][-2:].tolist() == [1, 3]
+
+
+def test_collector_stores_every_level_of_a_snapshot(collector_env):
+    collector = OrderBookCollectorBinance('BTCUSDT', '123456:stand-in-token', '42')
+    payload = {
+        'lastUpdateId': 1,
+        'bids': [['99.0', '2.0'], ['98.0', '3.0'], ['97.0', '4.0']],
+        'asks': [['101.0', '1.0'], ['102.0', '2.0']],
+    }
+
+    # Mid-hour, so complete does not export to Telegram.
+    now = datetime.now(pytz.utc).replace(minute=30)
+    collector.complete(now, collector.analyze(*collector.prepare(now, payload)))
+
+    frame = collector.store.to_frame()
+    assert len(frame) == 3
+    assert frame['Item'].astype(str).tolist() == ['BTCUSDT'] * 3
+    assert frame['Timestamp'].nunique() == 1
+    assert frame['Bid_Price'].tolist() == [99.0, 98.0, 97.0]
+    assert frame['Bid_Volume'].tolist() == [2.0, 3.0, 4.0]
+    assert frame['Ask_Price'].tolist()[:2] == [101.0, 102.0]
+    assert np.isnan(frame['Ask_Price'].iloc[2])
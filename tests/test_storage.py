@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import pytz
+from binance_orderbook import OrderBookCollectorBinance
+from delta_codec import DeltaDecoder
+from nobitex_order_book import OrderBookCollectorNobitex
+from okx_order_book import OrderBookCollectorOKX
+from storage import ArrowStorage, DeltaStorage, get_storage
+
+
+DATE = '2025-01-01'
+
+
+def open_descriptors():
+    return len(os.listdir('/proc/self/fd'))
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason="needs /proc/self/fd")
+def test_arrow_rollover_closes_each_part(tmp_path):
+    storage = ArrowStorage(str(tmp_path), file_format='arrow', max_file_bytes=1, row_group_rows=1)
+    before = open_descriptors()
+    for index in range(20):
+        storage.write('okx', 'BTC-USDT', pd.DataFrame({'Item': ['BTC-USDT'], 'Timestamp': [1735689600000 + index],
+                                                       'Spread': [0.1]}), date=DATE)
+
+    # Every write fills a part past max_file_bytes, so each one is rolled over and closed at once.
+    assert open_descriptors() == before
+    assert len(storage.part_files(storage.partition_dir('okx', 'BTC-USDT', DATE))) == 20
+    assert storage.read_day('okx', 'BTC-USDT', DATE)['Timestamp'].tolist() == [1735689600000 + i for i in range(20)]
+
+
+@pytest.mark.parametrize('backend', ['csv', 'parquet', 'arrow'])
+def test_collector_complete_writes_to_storage(collector_env, monkeypatch, backend):
+    monkeypatch.setenv("STORAGE_BACKEND", backend)
+    collector = OrderBookCollectorNobitex('123456:stand-in-token', '42')
+    payload = {
+        'status': 'ok',
+        'BTCUSDT': {'lastUpdate': 1735689600000, 'lastTradePrice': '100',
+                    'asks': [['101', '1'], ['102', '2']], 'bids': [['99', '1'], ['98', '3']]},
+        'USDTIRT': {'lastUpdate': 1735689600000, 'lastTradePrice': '820000',
+                    'asks': [['820100', '10']], 'bids': [['819900', '12']]},
+    }
+
+    now = datetime.now(pytz.utc).replace(minute=30)
+    collector.complete(now, collector.analyze(*collector.prepare(now, payload)))
+    # A Parquet part gets its footer when closed, so finish the parts before reading the day back.
+    storage = get_storage()
+    storage.close()
+
+    date = now.strftime('%Y-%m-%d')
+    spread = storage.read_day('nobitex', 'df_spread_all', date)
+    assert spread['Item'].astype(str).tolist() == ['BTCUSDT', 'USDTIRT']
+    assert spread['Spread'].tolist() == [2.0, 200.0]
+    assert len(storage.read_day('nobitex', 'depth_all', date)) == 2 * 4
+
+    slippage = storage.read_day('nobitex', 'slippage', date)
+    assert set(slippage['Item'].astype(str)) == {'BTCUSDT'}
+    assert slippage['Side'].astype(str).tolist() == ['buy'] * 4 + ['sell'] * 4
+    assert slippage['Complete'].tolist() == [False] * 8
+
+
+def test_day_rollover_saves_the_days_slippage(collector_env, monkeypatch):
+    monkeypatch.setenv("TELEGRAM_DAILY_FILE", "false")
+    collector = OrderBookCollectorOKX('BTC-USDT', '123456:stand-in-token', '42')
+    now = datetime.now(pytz.utc).replace(hour=12, minute=30)
+    for tick in range(2):
+        payload = {'data': [{'ts': str(int(now.timestamp() * 1000) + tick * 15_000),
+                             'asks': [['101', '1', '0', '1'], ['102', '2', '0', '1'], ['103', '1', '0', '1']],
+                             'bids': [['99', '1', '0', '1'], ['98', '1', '0', '1']]}]}
+        collector.complete(now, collector.analyze(*collector.prepare(now, payload)))
+
+    collector.prepare(now + timedelta(days=1), None)
+    assert len(collector.store) == 0
+
+    slippage = get_storage().read_day('OKX', 'BTC-USDT_slippage', now.strftime('%Y-%m-%d'))
+    assert len(slippage) == 2 * 2 * 4
+    buy = slippage[(slippage['Side'] == 'buy') & (slippage['Order_Size'] == 1000)]
+    assert buy['Filled_Size'].tolist() == [408.0, 408.0]
+    assert buy['Levels_Consumed'].tolist() == [3, 3]
+
+
+def binance_books(ticks):
+    # Depth responses as Binance sends them: decimal strings, levels resized, cancelled and added
+    # from tick to tick, and the two sides of uneven length.
+    rng = np.random.default_rng(7)
+    bids = {9500000 - step: rng.integers(1, 90000) for step in range(1, 13)}
+    asks = {9500000 + step: rng.integers(1, 90000) for step in range(1, 10)}
+    for _ in range(ticks):
+        for side in (bids, asks):
+            for price in rng.choice(list(side), size=3, replace=False):
+                side[int(price)] = rng.integers(1, 90000)
+            side.pop(int(rng.choice(list(side))))
+        bids[min(bids) - 1] = rng.integers(1, 90000)
+        asks[max(asks) + 1] = rng.integers(1, 90000)
+        yield {'lastUpdateId': 1,
+               'bids': [[f"{price / 100:.8f}", f"{bids[price] / 100000:.8f}"] for price in sorted(bids, reverse=True)],
+               'asks': [[f"{price / 100:.8f}", f"{asks[price] / 100000:.8f}"] for price in sorted(asks)]}
+
+
+def test_delta_storage_round_trips_level_frames_across_a_restart(collector_env):
+    collector = OrderBookCollectorBinance('BTCUSDT', '123456:stand-in-token', '42')
+    frames = []
+    for tick, book in enumerate(binance_books(8)):
+        frame = collector.process_order_book_data('BTCUSDT', book)
+        frame['Timestamp'] = 1735689600.0 + 15 * tick
+        frames.append(frame)
+    columns = ['Item', 'Timestamp', 'Ask_Price', 'Ask_Volume', 'Bid_Price', 'Bid_Volume', 'Total_Ask_Volume',
+               'Total_Bid_Volume', 'Best_Bid_Price', 'Best_Ask_Price', 'Spread', 'Reference_Price']
+
+    def expected(count):
+        frame = pd.concat(frames[:count], ignore_index=True)[columns]
+        return frame.assign(Timestamp=(frame['Timestamp'] * 1000).astype('int64'))
+
+    root = str(collector_env)
+    storage = DeltaStorage(root, keyframe_interval=3)
+    for frame in frames[:5]:
+        storage.write('binance', 'BTCUSDT', frame, date=DATE)
+
+    # One sealed block and the open one, which is on disk from its first write.
+    path = storage.path('binance', 'BTCUSDT', DATE)
+    assert os.path.exists(f"{path}.tail")
+    pd.testing.assert_frame_equal(storage.read_day('binance', 'BTCUSDT', DATE)[columns], expected(5))
+
+    # The process stops without closing; the next one seals the open block and carries on.
+    restarted = DeltaStorage(root, keyframe_interval=3)
+    for frame in frames[5:]:
+        restarted.write('binance', 'BTCUSDT', frame, date=DATE)
+    pd.testing.assert_frame_equal(restarted.read_day('binance', 'BTCUSDT', DATE)[columns], expected(8))
+
+    restarted.close()
+    assert not os.path.exists(f"{path}.tail")
+    # Reads did not cut blocks short; only the restart did.
+    assert [block[2] for block in DeltaDecoder(path).blocks] == [3, 2, 3]
+    pd.testing.assert_frame_equal(restarted.read_day('binance', 'BTCUSDT', DATE)[columns], expected(8))
@@ -0,0 +1,180 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import gzip
+import io
+import json
+import multiprocessing
+import re
+import pandas as pd
+import pytest
+import zstandard
+from telegram.error import NetworkError
+from snapshot_store import SnapshotStore
+from telegram_export import TelegramExporter, create_bot
+
+
+TOKEN = '123456:stand-in-token'
+CHAT_ID = '42'
+NAME = 'wallex_df_spread'
+DATE = '2025-01-01'
+COLUMNS = [('Item', 'symbol'), ('Timestamp', 'f8'), ('DateTime', 'datetime'), ('Spread', 'f8')]
+
+
+class BotAPI(BaseHTTPRequestHandler):
+    # A stand-in for the Bot API's sendDocument: records every upload, or fails while fail_sends is set.
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        if server.fail_sends:
+            server.failures += 1
+            self.reply(500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'})
+            return
+
+        document = {'path': self.path}
+        boundary = self.headers['Content-Type'].split('boundary=')[1].strip('"').encode()
+        for part in body.split(b'--' + boundary)[1:-1]:
+            head, _, content = part.partition(b'\r\n\r\n')
+            name = re.search(rb'name="([^"]+)"', head).group(1).decode()
+            filename = re.search(rb'filename="([^"]+)"', head)
+            document[name] = content[:-2] if filename else content[:-2].decode()
+            if filename:
+                document['filename'] = filename.group(1).decode()
+        server.documents.append(document)
+        self.reply(200, {'ok': True, 'result': {'message_id': len(server.documents), 'date': 0,
+                                                'chat': {'id': int(CHAT_ID), 'type': 'private'}}})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def bot_api(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BotAPI)
+    server.documents = []
+    server.fail_sends = False
+    server.failures = 0
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("TELEGRAM_API_URL", f"http://127.0.0.1:{server.server_address[1]}/bot")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def exporter(tmp_path, compression='none'):
+    return TelegramExporter(create_bot(TOKEN), CHAT_ID, mode='delta', compression=compression,
+                            state_path=str(tmp_path / 'telegram_export_state.json'))
+
+
+def append(store, items, ingest_time):
+    store.append_frame(pd.DataFrame({
+        'Item': items,
+        'Timestamp': [1735689600.0 + index for index in range(len(items))],
+        'Spread': [0.5] * len(items),
+        'Ingest_Time': ingest_time,
+    }))
+
+
+def sent_frame(document):
+    return pd.read_csv(io.BytesIO(document['document']))
+
+
+def test_sends_only_rows_past_the_high_water_mark(bot_api, tmp_path):
+    store = SnapshotStore(COLUMNS)
+    append(store, ['BTCUSDT', 'ETHUSDT'], 1000.0)
+    assert exporter(tmp_path).export(NAME, store, DATE)
+
+    append(store, ['BTCUSDT', 'ETHUSDT', 'SOLUSDT'], 1015.0)
+    assert exporter(tmp_path).export(NAME, store, DATE)
+    assert not exporter(tmp_path).export(NAME, store, DATE)
+
+    assert len(bot_api.documents) == 2
+    first, second = bot_api.documents
+    assert first['path'] == f"/bot{TOKEN}/sendDocument"
+    assert first['chat_id'] == CHAT_ID
+    assert re.fullmatch(rf"{NAME}_{DATE}_\d{{4}}\.csv", first['filename'])
+    assert sent_frame(first)['Item'].tolist() == ['BTCUSDT', 'ETHUSDT']
+    assert sent_frame(second)['Item'].tolist() == ['BTCUSDT', 'ETHUSDT', 'SOLUSDT']
+
+
+def test_high_water_mark_survives_a_restart(bot_api, tmp_path):
+    store = SnapshotStore(COLUMNS)
+    append(store, ['BTCUSDT', 'ETHUSDT'], 1000.0)
+    assert exporter(tmp_path).export(NAME, store, DATE)
+
+    # After a restart the write-ahead log brings back the rows already sent; only new ones go out.
+    restarted = SnapshotStore(COLUMNS)
+    append(restarted, ['BTCUSDT', 'ETHUSDT'], 1000.0)
+    append(restarted, ['XRPUSDT'], 1030.0)
+    assert exporter(tmp_path).export(NAME, restarted, DATE)
+    assert sent_frame(bot_api.documents[-1])['Item'].tolist() == ['XRPUSDT']
+
+    # The mark belongs to its day, so the next day's store is sent from the start.
+    next_day = SnapshotStore(COLUMNS)
+    append(next_day, ['BTCUSDT'], 900.0)
+    assert exporter(tmp_path).export(NAME, next_day, '2025-01-02')
+    assert len(bot_api.documents) == 3
+
+
+def test_failed_send_does_not_advance_the_mark(bot_api, tmp_path):
+    store = SnapshotStore(COLUMNS)
+    append(store, ['BTCUSDT'], 1000.0)
+    assert exporter(tmp_path).export(NAME, store, DATE)
+    state_before = (tmp_path / 'telegram_export_state.json').read_text()
+
+    append(store, ['ETHUSDT'], 1015.0)
+    bot_api.fail_sends = True
+    with pytest.raises(NetworkError):
+        exporter(tmp_path).export(NAME, store, DATE)
+    assert bot_api.failures == 1
+    assert (tmp_path / 'telegram_export_state.json').read_text() == state_before
+
+    # The next export retries the rows the failed one did not deliver, together with newer ones.
+    bot_api.fail_sends = False
+    append(store, ['SOLUSDT'], 1030.0)
+    assert exporter(tmp_path).export(NAME, store, DATE)
+    assert sent_frame(bot_api.documents[-1])['Item'].tolist() == ['ETHUSDT', 'SOLUSDT']
+
+
+@pytest.mark.parametrize('compression, extension, decompress', [
+    ('gzip', '.csv.gz', gzip.decompress),
+    ('zstd', '.csv.zst', lambda payload: zstandard.ZstdDecompressor().decompressobj().decompress(payload)),
+])
+def test_compressed_payloads_decompress_to_the_csv(bot_api, tmp_path, compression, extension, decompress):
+    store = SnapshotStore(COLUMNS)
+    append(store, ['BTCUSDT', 'ETHUSDT', 'SOLUSDT'] * 50, 1000.0)
+    assert exporter(tmp_path, compression).export(NAME, store, DATE)
+
+    document = bot_api.documents[-1]
+    assert document['filename'].endswith(extension)
+    assert decompress(document['document']) == store.to_frame().to_csv(index=False).encode()
+    assert len(document['document']) < len(store.to_frame().to_csv(index=False))
+
+
+def mark_many(state_path, name, count):
+    exporter = TelegramExporter(None, CHAT_ID, state_path=state_path)
+    for ingest_time in range(count):
+        exporter.set_high_water_mark(name, DATE, float(ingest_time))
+
+
+def test_processes_sharing_the_state_file_keep_each_others_marks(tmp_path):
+    # The local and international containers mount the same state file and update it concurrently.
+    state_path = tmp_path / 'telegram_export_state.json'
+    names = ['nobitex_df_spread', 'binance_order_book_BTCUSDT', 'okx_order_book_BTC-USDT']
+    processes = [multiprocessing.Process(target=mark_many, args=(str(state_path), name, 200)) for name in names]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0] * len(names)
+    assert json.loads(state_path.read_text()) == {name: {'date': DATE, 'ingest_time': 199.0} for name in names}
+    assert not list(tmp_path.glob('*.tmp'))
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta
+import time
+import pytz
+from metrics import MISSED_TICKS, TICK_LATENESS, TICKS
+
+
+def is_last_tick_of_hour(now, interval_seconds):
+    return (now + timedelta(seconds=interval_seconds)).hour != now.hour
+
+
+def stagger_offsets(count, spread_seconds=1.0):
+    if count <= 1:
+        return [0.0] * count
+    return [i * spread_seconds / count for i in range(count)]
+
+
+class TickScheduler:
+    def __init__(self, interval_seconds=15, offset_seconds=0.0, name="scheduler"):
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be positive.")
+
+        self.interval_seconds = interval_seconds
+        self.offset_seconds = offset_seconds
+        self.name = name
+        self.next_deadline = None
+        self.tick_count = 0
+        self.missed_ticks = 0
+        self.max_lateness = 0.0
+
+    def first_deadline(self):
+        wait = (self.offset_seconds - time.time()) % self.interval_seconds
+        return time.monotonic() + wait
+
+    def advance(self):
+        if self.next_deadline is None:
+            self.next_deadline = self.first_deadline()
+            return self.next_deadline
+
+        self.next_deadline += self.interval_seconds
+        now = time.monotonic()
+        if now > self.next_deadline:
+            missed = int((now - self.next_deadline) // self.interval_seconds) + 1
+            self.missed_ticks += missed
+            MISSED_TICKS.inc(missed, scheduler=self.name)
+            self.next_deadline += missed * self.interval_seconds
+            print(f"{self.name}: missed {missed} tick(s), {self.missed_ticks} in total.")
+        return self.next_deadline
+
+    def fire(self):
+        self.tick_count += 1
+        lateness = time.monotonic() - self.next_deadline
+        self.max_lateness = max(self.max_lateness, lateness)
+        TICKS.inc(scheduler=self.name)
+        TICK_LATENESS.observe(max(lateness, 0.0), scheduler=self.name)
+        return datetime.now(pytz.utc)
+
+    def wait(self):
+        deadline = self.advance()
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return self.fire()
+
+    async def wait_async(self):
+        deadline = self.advance()
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self.fire()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'interval_seconds': self.interval_seconds,
+            'ticks': self.tick_count,
+            'missed_ticks': self.missed_ticks,
+            'max_lateness_seconds': self.max_lateness,
+        }
+
+    def __iter__(self):
+        while True:
+            yield self.wait()
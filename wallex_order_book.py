@@ -1,292 +1,180 @@
-from threading import Thread
 from datetime import datetime
+import os
 import pytz
-import requests
 import pandas as pd
-from telegram import Bot
-import time
-import io
+from metrics import stage_timer
+from tick_scheduler import is_last_tick_of_hour
+from order_book_arrays import OrderBookArrays, band_depth_frame
+from slippage import SLIPPAGE_COLUMNS, quote_slippage_frame
+from snapshot_store import SnapshotStore
+from snapshot_wal import open_wal
+from rolling_stats import RollingStats
+from rollups import get_rollups
+from telegram_export import TelegramExporter, create_bot
+from storage import get_storage
+
+
+SPREAD_COLUMNS = [('Item', 'symbol'), ('Date', 'date'), ('DateTime', 'datetime'), ('Timestamp', 'f8'),
+                  ('Best_Ask_Price', 'f8'), ('Best_Bid_Price', 'f8'), ('Spread', 'f8'), ('Reference_Price', 'f8')]
+DEPTH_COLUMNS = [('Item', 'symbol'), ('Date', 'date'), ('DateTime', 'datetime'), ('Timestamp', 'f8'),
+                 ('Best_Bid_Price', 'f8'), ('Best_Ask_Price', 'f8'), ('Reference_Price', 'f8'),
+                 ('Total_Bid_Volume', 'f8'), ('Total_Ask_Volume', 'f8'), ('Percentage', 'f8')]
 
 
 class OrderBookCollectorWallex:
     def __init__(self, telegram_bot_token, telegram_chat_id, interval_seconds=15):
-        self.URL_ORDERBOOK_BTCUSDT_WALLEX = 'https://api.wallex.ir/v1/depth?symbol=BTCUSDT'
-        self.URL_ORDERBOOK_ETHUSDT_WALLEX = 'https://api.wallex.ir/v1/depth?symbol=ETHUSDT'
-        self.URL_ORDERBOOK_wallex_ALL = "https://api.wallex.ir/v2/depth/all"
+        self.api_url = os.getenv("WALLEX_API_URL", "https://api.wallex.ir").rstrip('/')
+        self.URL_ORDERBOOK_BTCUSDT_WALLEX = f'{self.api_url}/v1/depth?symbol=BTCUSDT'
+        self.URL_ORDERBOOK_ETHUSDT_WALLEX = f'{self.api_url}/v1/depth?symbol=ETHUSDT'
+        self.URL_ORDERBOOK_wallex_ALL = f"{self.api_url}/v2/depth/all"
 
         self.LIST_COLUMN_NAME_INTERCEPT = ['Item', 'Date', 'DateTime', 'Timestamp']
-        self.df_slippage_spread_all = pd.DataFrame(columns=['Item',
-                                                       'Date', 'DateTime', 'Timestamp',
-                                                       'Reference_Price',
-                                                       'Ask_Price', 'Bid_Price', 'Spread'
-                                                       ])
-
-        self.df_depth_all = pd.DataFrame(columns=['Item',
-                                             'Date', 'DateTime', 'Timestamp',
-                                             'Reference_Price',
-                                             'Total_Bid_Volume', 'Total_Ask_Volume',
-                                             'Percentage'
-                                             ])
-
-        self.output_dir = 'order_book_data/wallex/'
-
-        self.telegram_bot = Bot(token=telegram_bot_token)
+
+        self.telegram_bot = create_bot(telegram_bot_token)
         self.telegram_chat_id = telegram_chat_id
+        self.exporter = TelegramExporter(self.telegram_bot, telegram_chat_id)
 
         self.interval_seconds = interval_seconds
         self.current_date = datetime.now(pytz.utc).date()
-        self.data_list_spread = []
-        self.data_list_depth = []
+        self.storage = get_storage()
+        self.store_spread = SnapshotStore(SPREAD_COLUMNS, wal=open_wal("wallex_df_spread"))
+        self.store_depth = SnapshotStore(DEPTH_COLUMNS, wal=open_wal("wallex_depth_all"))
+        self.store_slippage = SnapshotStore(SLIPPAGE_COLUMNS, wal=open_wal("wallex_slippage"))
+        self.consolidated_book = None
+        self.rolling_stats = RollingStats()
+        self.rollups = get_rollups("wallex")
 
     def save_orderbook_files(self, df, filename):
+        self.storage.write('wallex', filename, df)
 
-        output_dir = 'order_book_data/wallex/'
-
-        csv_filepath = (f'{output_dir}wallex_orderbook_{filename}.csv')
-        df.to_csv(csv_filepath, index=False)
-
-    def fetch_market_depth_url(self, url):
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
-            return None
+    def order_book_url(self):
+        return self.URL_ORDERBOOK_wallex_ALL
 
     def extract_ask_bid(self, data):
-
-        all_asks = []
-        all_bids = []
-
-        for name in data['result']:
-            asks = data['result'][name]['ask']
-            bids = data['result'][name]['bid']
-
-            for ask in asks:
-                ask['name'] = name
-                ask['type'] = 'ask'
-            for bid in bids:
-                bid['name'] = name
-                bid['type'] = 'bid'
-
-            all_asks.extend(asks)
-            all_bids.extend(bids)
-
-        df_asks = pd.DataFrame(all_asks)
-        df_bids = pd.DataFrame(all_bids)
-
-        df_asks.columns = ['Ask_Price', 'Ask_Quantity', 'Ask_Sum', 'Item', 'Type']
-        df_bids.columns = ['Bid_Price', 'Bid_Quantity', 'Bid_Sum', 'Item', 'Type']
-
-        df_asks[['Ask_Sum', 'Ask_Quantity', 'Ask_Price']] = df_asks[['Ask_Sum', 'Ask_Quantity', 'Ask_Price']].astype(float)
-        df_bids[['Bid_Price', 'Bid_Quantity', 'Bid_Sum']] = df_bids[['Bid_Price', 'Bid_Quantity', 'Bid_Sum']].astype(float)
-
-        df_asks.drop('Type', inplace=True, axis=1)
-        df_bids.drop('Type', inplace=True, axis=1)
-        df = pd.merge(df_asks, df_bids, on='Item', how='outer')
-
-        all_prices = pd.concat([df['Ask_Price'], df['Bid_Price']])
-        overall_median_price = all_prices.median()
-        df['Reference_Price'] = overall_median_price
-
-        result_df = df.copy()
-        result_df.fillna({'Bid_Price': 0,
-                          'Bid_Quantity': 0,
-                          'Ask_Price': 0,
-                          'Ask_Quantity': 0,
-                          'Reference_Price': 0,
-                          },
-                         inplace=True)
-
-        result_df = result_df.replace('', 0)
+        names = list(data['result'])
+        arrays = OrderBookArrays.from_level_lists(
+            names,
+            [data['result'][name]['bid'] for name in names],
+            [data['result'][name]['ask'] for name in names],
+            price_key='price',
+            volume_key='quantity'
+        )
 
         now = datetime.now(pytz.utc)
-        timestamp = now.timestamp()
-        datetime_str = now.isoformat()
-        date_str = now.strftime('%Y-%m-%d')
-
-        result_df["Timestamp"] = timestamp
-        result_df["DateTime"] = datetime_str
-        result_df["Date"] = date_str
-
-        return result_df
+        markets = pd.DataFrame({
+            'Item': names,
+            'Date': now.strftime('%Y-%m-%d'),
+            'DateTime': now.isoformat(),
+            'Timestamp': now.timestamp()
+        })
 
-    def dataset_preparation(self, result_df):
-        result_df.fillna({'Bid_Price': 0,
-                          'Bid_Quantity': 0,
-                          'Ask_Price': 0,
-                          'Ask_Quantity': 0,
-                          'LastTradePrice': 0},
-                         inplace=True)
+        return arrays, markets
 
-        result_df = result_df.replace('', 0)
-        return result_df
-
-    def spread_calculation(self, result_df):
-        spread_data = result_df.groupby(self.LIST_COLUMN_NAME_INTERCEPT).agg(
-            {'Ask_Price': 'max', 'Bid_Price': 'min'}).rename(
-            columns={'Ask_Price': 'Best_Ask_Price', 'Bid_Price': 'Best_Bid_Price'}
-        ).reset_index()
+    def spread_calculation(self, arrays, markets):
+        best_bid, best_ask = arrays.best_prices()
 
+        spread_data = markets[self.LIST_COLUMN_NAME_INTERCEPT].copy()
+        spread_data['Best_Ask_Price'] = best_ask
+        spread_data['Best_Bid_Price'] = best_bid
         spread_data['Spread'] = (spread_data['Best_Ask_Price'] - spread_data['Best_Bid_Price'])
         spread_data['Reference_Price'] = (spread_data['Best_Ask_Price'] + spread_data['Best_Bid_Price']) / 2
 
         return spread_data
 
-    def calculate_depth_with_percentages(self, df, percentages=[0, 2, 5, 10], group_columns=['DateTime', 'Item']):
-
-        def calculate_depth(df, percentage=[0, 2, 5, 10], group_columns=['DateTime', 'Item']):
-            df_depth_group = df.groupby(group_columns).agg(
-                Best_Bid_Price=('Bid_Price', 'max'),
-                Best_Ask_Price=('Ask_Price', 'min')
-            ).reset_index()
-
-            df_with_bounds = pd.merge(df, df_depth_group, on=group_columns, how='outer')
-            df_with_bounds['Reference_Price'] = (df_with_bounds['Best_Bid_Price'] + df_with_bounds['Best_Ask_Price']) / 2
-
-            key_columns = ['Item',
-                           'Date', 'DateTime', 'Timestamp',
-                           'Best_Bid_Price', 'Best_Ask_Price', 'Reference_Price'
-                           ]
-
-            depth_df = df_with_bounds.groupby(key_columns).agg(
-                Total_Bid_Volume=('Bid_Quantity', 'sum'),
-                Total_Ask_Volume=('Ask_Quantity', 'sum'),
-            ).reset_index()
-
-            depth_df['Percentage'] = percentage
-
-            return depth_df
-
-        def combine_depth_dfs(df, percentages):
-            combined_depth_df = pd.DataFrame()
-
-            for percentage in percentages:
-                depth_df = calculate_depth(df, percentage)
-                combined_depth_df = pd.concat([combined_depth_df, depth_df], ignore_index=True)
-
-            return combined_depth_df
-
-        return combine_depth_dfs(df, percentages)
+    def calculate_depth_with_percentages(self, arrays, markets, percentages=[0, 2, 5, 10]):
+        best_bid, best_ask = arrays.best_prices()
 
+        markets = markets[['Item', 'Date', 'DateTime', 'Timestamp']].copy()
+        markets['Best_Bid_Price'] = best_bid
+        markets['Best_Ask_Price'] = best_ask
+        markets['Reference_Price'] = (best_bid + best_ask) / 2
 
-    def run_code(self, url):
-        data = self.fetch_market_depth_url(url)
-
-        if data is None:
-            return (pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), None, None)
-
-        data.pop("status", None)
-        result_df = self.extract_ask_bid(data)
-
-        result_df = self.dataset_preparation(result_df)
-        spread_df = self.spread_calculation(result_df)
-
-        depth_df_with_percentages = self.calculate_depth_with_percentages(
-            result_df, group_columns=['DateTime', 'Item']
-        )
-
-        return result_df, spread_df, depth_df_with_percentages
-
-
-    def collect_data(self, url , slippage_spread_all_df, depth_all_df, run_interval=15):
-
-        while True:
-            result_df, slippage_spread_df, depth_df  = self.run_code(url)
-
-            spread_data = result_df.groupby(self.LIST_COLUMN_NAME_INTERCEPT).agg(
-                {'Ask_Price': 'max', 'Bid_Price': 'min'}).rename(
-                columns={'Ask_Price': 'Best_Ask_Price', 'Bid_Price': 'Best_Bid_Price'}
-            ).reset_index()
-
-            spread_data['Spread'] = (spread_data['Best_Ask_Price'] - spread_data['Best_Bid_Price'])
-            spread_data['Reference_Price'] = (spread_data['Best_Ask_Price'] + spread_data['Best_Bid_Price']) / 2
-            self.save_orderbook_files(spread_data, f"df_spread_all_{datetime.now(pytz.utc).strftime('%Y-%m-%d')}")
-            slippage_spread_all_df.columns = ['Item',
-                                              'Date', 'DateTime', 'Timestamp',
-                                              'Best_Ask_Price', 'Best_Bid_Price',
-                                              'Spread',
-                                              'Reference_Price',
-                                              ]
-
-            depth_all_df = pd.concat([depth_all_df, depth_df], ignore_index=True)
-            depth_all_df = depth_all_df.drop_duplicates()
-
-            time.sleep(run_interval)
-
-            return slippage_spread_df, depth_all_df
+        return band_depth_frame(arrays, markets, percentages)
 
     def send_to_telegram(self):
         try:
-            csv_buffer = io.BytesIO()
-            spread_df = pd.concat(self.data_list_spread, ignore_index=True)
-            spread_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-            csv_buffer.seek(0)
-
-            file_name_spread = f"wallex_df_spread_{datetime.now(pytz.utc).strftime('%Y-%m-%d')}.csv"
-            self.telegram_bot.send_document(
-                chat_id=self.telegram_chat_id,
-                document=csv_buffer,
-                filename=file_name_spread
-            )
-
-            csv_buffer = io.BytesIO()
-            csv_buffer.seek(0)
-
-            depth_df = pd.concat(self.data_list_depth, ignore_index=True)
-
-            depth_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-            csv_buffer.seek(0)
-
-            file_name_depth = f"wallex_depth_all_{datetime.now(pytz.utc).strftime('%Y-%m-%d')}.csv"
-            self.telegram_bot.send_document(
-                chat_id=self.telegram_chat_id,
-                document=csv_buffer,
-                filename=file_name_depth
-            )
+            date = str(self.current_date)
+            self.exporter.export("wallex_df_spread", self.store_spread, date)
+            self.exporter.export("wallex_depth_all", self.store_depth, date)
+            self.exporter.export("wallex_slippage", self.store_slippage, date)
+            self.store_spread.compact()
+            self.store_depth.compact()
+            self.store_slippage.compact()
 
         except Exception as e:
             print(f"Failed to send data to Telegram: {e}")
 
-    def start(self):
-        self.data_list_spread = []
-        self.data_list_depth = []
-        while True:
-            try:
-                now = datetime.now(pytz.utc)
-
-                if now.second % 15 == 0:
-                    if now.date() != self.current_date:
-                        print(f"New day detected: {now.date()}. Resetting data.")
-                        self.current_date = now.date()
-
-                    df_results, df_slippage_spread_all, df_depth_all = self.run_code(self.URL_ORDERBOOK_wallex_ALL)
-
-                    self.data_list_spread.append(df_slippage_spread_all)
-                    self.data_list_depth.append(df_depth_all)
-
-                    if now.minute == 59 and now.second >= (60 - self.interval_seconds):
-                        self.send_to_telegram()
-
-                time.sleep(1)
-            except Exception as e:
-                print(f"An error occurred: {e}")
-                time.sleep(1)
+    def send_daily_to_telegram(self):
+        try:
+            date = str(self.current_date)
+            self.exporter.export_daily("wallex_df_spread", self.store_spread, date)
+            self.exporter.export_daily("wallex_depth_all", self.store_depth, date)
+            self.exporter.export_daily("wallex_slippage", self.store_slippage, date)
 
-class OrderBookManagerWallex:
-    def __init__(self, collectors):
-        self.collectors = collectors
+        except Exception as e:
+            print(f"Failed to send daily data to Telegram: {e}")
+
+    def restore(self):
+        self.store_spread.restore()
+        self.store_depth.restore()
+        self.store_slippage.restore()
+        last_ingest_time = self.store_spread.last_ingest_time()
+        if last_ingest_time is not None:
+            self.current_date = datetime.fromtimestamp(last_ingest_time, pytz.utc).date()
+            print(f"Restored {len(self.store_spread)} spread rows for Wallex from the write-ahead log.")
+
+    def __getstate__(self):
+        # Only configuration crosses into the analytics process pool, never the stores or the bot.
+        return {'LIST_COLUMN_NAME_INTERCEPT': self.LIST_COLUMN_NAME_INTERCEPT}
+
+    def prepare(self, now, data):
+        if now.date() != self.current_date:
+            print(f"New day detected: {now.date()}. Resetting data.")
+            self.send_daily_to_telegram()
+            self.current_date = now.date()
+            self.store_spread.clear()
+            self.store_depth.clear()
+            self.store_slippage.clear()
+
+        return (data,)
+
+    def analyze(self, data):
+        if data is None:
+            return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), None
 
-    def start(self):
-        threads = []
-        try:
-            for collector in self.collectors:
-                thread = Thread(target=collector.start)
-                threads.append(thread)
-                thread.start()
-
-            for thread in threads:
-                thread.join()
-        except KeyboardInterrupt:
-            print("Data collection interrupted by user.")
+        data.pop("status", None)
+        with stage_timer("wallex", 'extract_ask_bid'):
+            arrays, markets = self.extract_ask_bid(data)
+        with stage_timer("wallex", 'spread_calculation'):
+            spread_df = self.spread_calculation(arrays, markets)
+        with stage_timer("wallex", 'depth'):
+            depth_df = self.calculate_depth_with_percentages(arrays, markets)
+        with stage_timer("wallex", 'slippage'):
+            slippage_df = quote_slippage_frame(arrays, markets)
+        return spread_df, depth_df, slippage_df, arrays
+
+    def complete(self, now, result):
+        df_slippage_spread_all, df_depth_all, df_slippage, arrays = result
+
+        if self.consolidated_book is not None and arrays is not None:
+            self.consolidated_book.update_arrays("wallex", arrays)
+
+        self.save_orderbook_files(df_slippage_spread_all, "df_spread_all")
+        self.save_orderbook_files(df_depth_all, "depth_all")
+        self.save_orderbook_files(df_slippage, "slippage")
+        self.store_spread.append_frame(df_slippage_spread_all)
+        self.store_depth.append_frame(df_depth_all)
+        self.store_slippage.append_frame(df_slippage)
+        self.rolling_stats.update_frame(df_slippage_spread_all, now.timestamp())
+        if self.rollups is not None:
+            self.rollups.update_frame(df_slippage_spread_all, now.timestamp())
+            self.rollups.update_depth(df_depth_all, now.timestamp())
+        if not df_depth_all.empty:
+            widest = df_depth_all[df_depth_all['Percentage'] == df_depth_all['Percentage'].max()]
+            self.rolling_stats.update_frame(widest[['Item', 'Total_Bid_Volume', 'Total_Ask_Volume']], now.timestamp())
+
+        if is_last_tick_of_hour(now, self.interval_seconds):
+            self.send_to_telegram()
+
+    def run_iteration(self, now, data):
+        self.complete(now, self.analyze(*self.prepare(now, data)))